@@ -0,0 +1,97 @@
+"""Round-trip benchmark: JSON wire path vs the bin1 binary codec.
+
+Measures a client update (client encode -> server apply_client_message) and a
+full snapshot (server encode -> client parse_tick) for several lobby sizes.
+Stdlib only; run from the repo root:
+
+    python benchmarks/bench_codec.py
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from net.framing import encode_frame  # noqa: E402
+from net.sync import parse_tick  # noqa: E402
+from server_core.handlers import apply_client_message  # noqa: E402
+from server_core.payloads import build_broadcast_payload  # noqa: E402
+from server_core.protocol import encode_snapshot, encode_update  # noqa: E402
+from server_core.session import Session  # noqa: E402
+from server_core.players import PlayerTable  # noqa: E402
+from server_core.delta import FIELDS  # noqa: E402
+
+PLAYER_COUNTS = (2, 8, 32, 128)
+
+
+def _positions(n):
+    return [{'x': 1200 + 7 * i, 'y': 2000 + 3 * i, 'state': ('down', 'up', 'left', 'right')[i % 4],
+             'frame': i % 4, 'equip': 'None' if i % 3 else f'{64 * i}_{32 * i}', 'equip_frame': i % 4,
+             'name': f'Player{i}', 'occupied': True} for i in range(n)]
+
+
+def _per_op_ns(fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e9
+
+
+def bench_update(number=20000):
+    fields = _positions(1)[0]
+    session = Session(num_players=1, players=PlayerTable(1, default=fields))
+    upd = {k: fields[k] for k in ('x', 'y', 'state', 'frame', 'equip', 'equip_frame', 'name')}
+
+    def json_rt():
+        apply_client_message(session, 0, 'hidder', json.dumps(upd).encode('utf-8'))
+
+    def bin_rt():
+        apply_client_message(session, 0, 'hidder', encode_update(upd))
+
+    return {
+        'json': (_per_op_ns(json_rt, number), len(json.dumps(upd))),
+        'bin1': (_per_op_ns(bin_rt, number), len(encode_update(upd))),
+    }
+
+
+def bench_snapshot(n, number):
+    pos = _positions(n)
+    rows = [(i, tuple(p.get(f) for f in FIELDS), True) for i, p in enumerate(pos)]
+
+    def json_rt():
+        s = json.dumps(build_broadcast_payload(pos, None, 1700000000000, None))
+        parse_tick(s)
+
+    def bin_rt():
+        parse_tick(encode_snapshot(1, None, rows, 1700000000000, None))
+
+    # steady state on the server: unchanged players hit the record cache
+    cache = {}
+
+    def bin_cached_rt():
+        parse_tick(encode_snapshot(1, None, rows, 1700000000000, None, cache=cache))
+
+    size = len(encode_snapshot(1, None, rows, 1700000000000, None))
+    return {
+        'json': (_per_op_ns(json_rt, number), len(json.dumps(build_broadcast_payload(pos, None, 1700000000000, None)))),
+        'bin1': (_per_op_ns(bin_rt, number), size),
+        'bin1+c': (_per_op_ns(bin_cached_rt, number), size),
+    }
+
+
+def main():
+    print(f"{'case':<22}{'codec':<7}{'ns/op':>12}{'bytes':>9}{'speedup':>9}")
+    res = bench_update()
+    base = res['json'][0]
+    for codec, (ns, size) in res.items():
+        print(f"{'update':<22}{codec:<7}{ns:>12.0f}{size:>9}{base / ns:>8.2f}x")
+    for n in PLAYER_COUNTS:
+        res = bench_snapshot(n, max(50, 20000 // n))
+        base = res['json'][0]
+        for codec, (ns, size) in res.items():
+            print(f"{'snapshot/%d players' % n:<22}{codec:<7}{ns:>12.0f}{size + len(encode_frame(b'')):>9}{base / ns:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Microbenchmarks for the protocol hot paths, per lobby size.
+
+Times each step a message goes through on the way between server and
+client, for lobbies of --players sizes:
+
+  read_pos          server: parse a CSV roster, one read_pos per row
+  make_pos          server: build the legacy CSV roster ('row|row|...')
+  broadcast_json    server: build_broadcast_payload + json.dumps
+  parse_initial     client: the JSON handshake
+  parse_tick        client: a JSON keyframe tick (no delta decoder)
+  outgoing          client: build_outgoing_strings for the local player
+                    (does not depend on the lobby size; measured once)
+
+Reported per case:
+  ns/op      best of 5 timeit runs
+  blocks/op  memory blocks still held by one op's result (tracemalloc)
+  peak B/op  traced memory high-water mark during one op, above where it
+             started: what the op allocates at once, result included
+
+Stdlib only. --json saves the results (with the git commit and Python
+version) and --compare prints the ratio against such a file, so a codec or
+parsing change can be measured across commits. Run from the repo root:
+
+    python benchmarks/bench_protocol.py --json before.json
+    python benchmarks/bench_protocol.py --compare before.json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.contracts import GameState  # noqa: E402
+from net.sync import build_outgoing_strings, parse_initial, parse_tick  # noqa: E402
+from server_core.payloads import build_broadcast_payload, build_initial_payload  # noqa: E402
+from server_core.protocol import make_pos, read_pos  # noqa: E402
+
+PLAYER_COUNTS = (2, 8, 32, 128)
+ROUND_START = 1700000000000
+# calls kept alive while counting the blocks their results hold
+ALLOC_CALLS = 20
+
+
+def _positions(n):
+    return [{'x': 1200 + 7 * i, 'y': 2000 + 3 * i, 'state': ('down', 'up', 'left', 'right')[i % 4],
+             'frame': i % 4, 'equip': 'None' if i % 3 else f'{64 * i}_{32 * i}', 'equip_frame': i % 4,
+             'name': f'Player{i}', 'occupied': True} for i in range(n)]
+
+
+class _Hitbox:
+    __slots__ = ('centerx', 'centery')
+
+    def __init__(self, x, y):
+        self.centerx, self.centery = x, y
+
+
+class _Player:
+    """The Player attributes build_outgoing_strings reads."""
+
+    def __init__(self):
+        self.hitbox = _Hitbox(1272, 2018)
+        self.state = 'left'
+        self.frame_index = 2
+
+
+def cases(n):
+    """(name, fn) pairs for a lobby of n players; fn returns its result."""
+    pos = _positions(n)
+    csv_rows = [make_pos((p['x'], p['y'], p['state'], p['frame'], p['equip'], p['equip_frame'], p['name']))
+                for p in pos]
+    initial = json.dumps(build_initial_payload(pos, 1, 'hidder', ROUND_START, None, ['bin1']))
+    tick = json.dumps(build_broadcast_payload(pos, None, ROUND_START, None))
+
+    return [
+        ('read_pos', lambda: [read_pos(r) for r in csv_rows]),
+        ('make_pos', lambda: '|'.join([make_pos((p['x'], p['y'], p['state'], p['frame'], p['equip'],
+                                                 p['equip_frame'], p.get('name', ''))) for p in pos])),
+        ('broadcast_json', lambda: json.dumps(build_broadcast_payload(pos, None, ROUND_START, None))),
+        ('parse_initial', lambda: parse_initial(initial)),
+        ('parse_tick', lambda: parse_tick(tick)),
+    ]
+
+
+def outgoing_case():
+    player = _Player()
+    state = GameState(my_index=1)
+    state.ack_seq = 42
+    state.input_seq = 7
+    return 'outgoing', lambda: build_outgoing_strings(player, 'Player1', state)
+
+
+def _ns_per_op(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+
+def _allocs_per_op(fn):
+    """(blocks held by one result, peak traced bytes during one call)."""
+    fn()  # warm caches (interned strings, lazy imports) outside the trace
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak = None
+        for _ in range(5):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            result = fn()
+            p = tracemalloc.get_traced_memory()[1] - start
+            peak = p if peak is None else min(peak, p)
+            del result
+        kept = [None] * ALLOC_CALLS
+        before = tracemalloc.take_snapshot()
+        for i in range(ALLOC_CALLS):
+            kept[i] = fn()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(s.count_diff for s in after.compare_to(before, 'filename'))
+    del kept
+    return blocks / ALLOC_CALLS, peak
+
+
+def measure(name, players, fn, number):
+    ns = _ns_per_op(fn, number)
+    blocks, peak = _allocs_per_op(fn)
+    return {'case': name, 'players': players, 'ns_per_op': round(ns, 1),
+            'blocks_per_op': round(blocks, 1), 'peak_bytes_per_op': peak}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    ap.add_argument('--players', default=','.join(map(str, PLAYER_COUNTS)), help='comma-separated lobby sizes')
+    ap.add_argument('--ops', type=int, default=20000,
+                    help='player-rows per timing run (a run does ops / players calls, at least 50)')
+    ap.add_argument('--json', help='also write the results to this file')
+    ap.add_argument('--compare', help='results file of an earlier run to compare ns/op against')
+    args = ap.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['case'], r['players']): r for r in json.load(f)['results']}
+
+    sizes = [int(v) for v in args.players.split(',') if v.strip()]
+    results = []
+    name, fn = outgoing_case()
+    results.append(measure(name, 1, fn, args.ops))
+    for n in sizes:
+        for name, fn in cases(n):
+            results.append(measure(name, n, fn, max(50, args.ops // n)))
+
+    print(f"{'case':<16}{'players':>8}{'ns/op':>12}{'blocks/op':>11}{'peak B/op':>11}"
+          + (f"{'vs base':>9}" if baseline else ''))
+    for r in results:
+        line = (f"{r['case']:<16}{r['players']:>8}{r['ns_per_op']:>12.0f}{r['blocks_per_op']:>11.1f}"
+                f"{r['peak_bytes_per_op']:>11}")
+        if baseline:
+            old = baseline.get((r['case'], r['players']))
+            line += f"{old['ns_per_op'] / r['ns_per_op']:>8.2f}x" if old else f"{'-':>9}"
+        print(line)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': _git_commit(), 'python': platform.python_version(), 'args': vars(args),
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
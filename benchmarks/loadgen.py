@@ -0,0 +1,343 @@
+"""Headless bot load generator for server capacity testing.
+
+Starts server.py for each lobby size (or targets a running server with
+--host/--port), connects that many bots and lets them play for --duration
+seconds. Bots use the real client path (network.Network, net.sync
+build_outgoing / parse_tick, in the --codec they offer in their hello)
+without pygame: they walk between random
+waypoints through the map's collision model (core/simulation.py, picking a new
+waypoint when a wall stops them) or stand still (--idle), whistle and (as
+seeker) catch at the configured rates per second, and acknowledge snapshots
+so the server sends deltas. The bots' catches are random, so spawned servers
+run with --no-catch-check. Like the game client they only send when their
+state changed or the --heartbeat interval ran out.
+
+Reported per lobby size:
+  sent/s, recv/s   client updates sent and snapshots received, all bots
+  p50/p95/p99 ms   broadcast latency: a bot's update sent -> the first
+                   snapshot showing that position back to the same bot
+  server cpu %     CPU time of the server process over the run (needs Linux
+                   /proc or psutil; '-' otherwise)
+  fan-out ms       average snapshot fan-out time, read from the spawned
+                   server's control port (server_core/control.py)
+  send q ms        average time a bot's TCP frame waited in its outbound
+                   queue (net/outbound.py) before the send completed
+
+All bots run in this process; when sent/s falls short of players x --send-hz
+the load generator itself is saturated and the row understates the server.
+
+Run from the repo root:
+
+    python benchmarks/loadgen.py --players 2,8,32,128 --duration 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.contracts import GameState  # noqa: E402
+from core.simulation import Body, CollisionWorld, WORLD_TMX  # noqa: E402
+from net.sync import OutgoingTracker, build_outgoing  # noqa: E402
+from network import Network  # noqa: E402
+from settings import SEND_HEARTBEAT_S  # noqa: E402
+
+try:
+    import psutil  # optional: server CPU on platforms without /proc
+except Exception:  # pragma: no cover - optional dependency
+    psutil = None
+
+SPAWN = (1272, 2018)
+# walkable box around the spawn (the map is 52x50 tiles of 64 px)
+AREA = (200, 200, 3100, 3000)
+
+
+class _Hitbox:
+    __slots__ = ('centerx', 'centery')
+
+    def __init__(self, x, y):
+        self.centerx, self.centery = x, y
+
+
+class _BotBody:
+    """The few Player attributes build_outgoing reads, over a
+    simulation Body."""
+
+    def __init__(self, x, y):
+        self.body = Body((x, y))
+        self.hitbox = _Hitbox(*self.body.center)
+        self.state = 'down'
+        self.frame_index = 0
+        self._equipped = False
+
+    def step(self, world, dt):
+        """One movement step; False when the body could not move."""
+        before = self.body.box
+        self.body.step(world, dt)
+        self.hitbox.centerx, self.hitbox.centery = self.body.center
+        self.state = self.body.facing
+        self.frame_index = (self.frame_index + 1) % 4
+        return self.body.box != before
+
+
+_world = None
+_world_lock = threading.Lock()
+
+
+def _collision_world():
+    """The map's collision model, loaded once for all bots (None if missing)."""
+    global _world
+    with _world_lock:
+        if _world is None:
+            try:
+                _world = CollisionWorld.from_tmx(os.path.join(ROOT, WORLD_TMX))
+            except Exception:
+                _world = CollisionWorld(())
+        return _world if _world.solids else None
+
+
+class Bot(threading.Thread):
+    def __init__(self, host, port, args, stop, seed):
+        super().__init__(daemon=True)
+        self.args = args
+        self.stop = stop
+        self.rng = random.Random(seed)
+        self.net = Network(host, port, use_udp=args.udp, codecs=[args.codec])
+        resp = self.net.getPos()
+        try:
+            self.index = int(json.loads(resp).get('player_index'))
+        except Exception:
+            self.index = 0
+        self.name = f'bot{self.index}'
+        self.state = GameState(my_index=self.index)
+        self.body = _BotBody(SPAWN[0] + self.rng.randint(-40, 40), SPAWN[1] + self.rng.randint(-40, 40))
+        self.world = _collision_world()
+        self.target = self._waypoint()
+        self.idle = self.rng.random() < args.idle
+        self.tracker = OutgoingTracker(args.heartbeat)
+        self.sent = 0
+        self.received = 0
+        self.send_stats = {}
+        self.latencies = []
+        self._pending = {}
+        self._others = 0
+
+    def _waypoint(self):
+        return self.rng.uniform(AREA[0], AREA[2]), self.rng.uniform(AREA[1], AREA[3])
+
+    def _walk(self, dt):
+        if self.idle:
+            return
+        b = self.body
+        x, y = b.body.center
+        dx, dy = self.target[0] - x, self.target[1] - y
+        if math.hypot(dx, dy) <= b.body.speed * dt:
+            self.target = self._waypoint()
+            return
+        b.body.steer(dx, dy)
+        if not b.step(self.world, dt):
+            self.target = self._waypoint()
+
+    def _events(self, dt):
+        a = self.args
+        self.state.whistle_emit = self.index != 0 and self.rng.random() < a.whistle_rate * dt
+        if self.index == 0 and self._others and self.rng.random() < a.catch_rate * dt:
+            self.state.caught_target = self.rng.randint(1, self._others)
+        else:
+            self.state.caught_target = None
+
+    def _send(self):
+        if not self.tracker.due(self.body, self.name, self.state):
+            return
+        frame = build_outgoing(self.body, self.name, self.state, self.net.codec)
+        now = time.perf_counter()
+        key = (self.body.hitbox.centerx, self.body.hitbox.centery)
+        if key not in self._pending:
+            self._pending[key] = now
+        self.net.send_update(frame, reliable=self.state.whistle_emit or self.state.caught_target is not None)
+        self.sent += 1
+
+    def _receive(self, tick):
+        now = time.perf_counter()
+        positions = tick.positions
+        self.state.ack_seq = tick.seq
+        self.state.resync = tick.resync
+        if len(positions) > self.index:
+            self._others = len(positions) - 1
+            mine = positions[self.index]
+            sent_at = self._pending.pop((mine.x, mine.y), None)
+            if sent_at is not None:
+                self.latencies.append((now - sent_at) * 1000.0)
+        if len(self._pending) > 256:
+            self._pending.clear()
+
+    def run(self):
+        interval = 1.0 / self.args.send_hz
+        next_send = time.perf_counter()
+        while not self.stop.is_set():
+            now = time.perf_counter()
+            if now >= next_send:
+                self._walk(interval)
+                self._events(interval)
+                self._send()
+                next_send += interval
+                if now > next_send:
+                    next_send = now + interval
+                continue
+            tick = self.net.recv(timeout=next_send - now)
+            if tick is not None:
+                self._receive(tick)
+        self.received = self.net.ticks_decoded
+        self.send_stats = self.net.send_stats()
+        self.net.close()
+
+
+def _free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
+
+def _cpu_seconds(pid):
+    if psutil is not None:
+        try:
+            t = psutil.Process(pid).cpu_times()
+            return t.user + t.system
+        except Exception:
+            return None
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
+
+
+def _control_snapshot(port):
+    """The server's 'json' control reply, or None."""
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=2.0) as s, s.makefile('rw') as f:
+            f.write('json\n')
+            f.flush()
+            return json.loads(f.readline())
+    except Exception:
+        return None
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_load(n, args):
+    proc = control_port = server_stats = None
+    host, port = args.host, args.port
+    if args.spawn:
+        host, port, control_port = '127.0.0.1', _free_port(), _free_port()
+        cmd = [sys.executable, os.path.join(ROOT, 'server.py'), '--auto-ip', '--port', str(port),
+               '--num-players', str(n), '--engine', args.engine, '--tick-hz', str(args.tick_hz),
+               '--control-port', str(control_port), '--no-catch-check']
+        if args.aoi_radius:
+            cmd += ['--aoi-radius', str(args.aoi_radius)]
+        proc = subprocess.Popen(cmd, cwd=ROOT)
+        time.sleep(args.startup)
+    stop = threading.Event()
+    bots = []
+    try:
+        for i in range(n):
+            bots.append(Bot(host, port, args, stop, seed=args.seed + i))
+        cpu0 = _cpu_seconds(proc.pid) if proc else None
+        t0 = time.perf_counter()
+        for b in bots:
+            b.start()
+        time.sleep(args.duration)
+        stop.set()
+        elapsed = time.perf_counter() - t0
+        cpu1 = _cpu_seconds(proc.pid) if proc else None
+        if control_port:
+            server_stats = _control_snapshot(control_port)
+        for b in bots:
+            b.join(timeout=2.0)
+    finally:
+        stop.set()
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+    lat = [v for b in bots for v in b.latencies]
+    queue_ms = [b.send_stats['latency_ms_avg'] for b in bots if b.send_stats.get('sent')]
+    return {
+        'players': n,
+        'duration_s': round(elapsed, 3),
+        'sent_per_s': round(sum(b.sent for b in bots) / elapsed, 1),
+        'recv_per_s': round(sum(b.received for b in bots) / elapsed, 1),
+        'latency_ms': {'p50': round(_percentile(lat, 0.50), 2), 'p95': round(_percentile(lat, 0.95), 2),
+                       'p99': round(_percentile(lat, 0.99), 2), 'samples': len(lat)},
+        'send_queue_ms': {'avg': round(sum(queue_ms) / len(queue_ms), 3) if queue_ms else None,
+                          'max': max((b.send_stats['latency_ms_max'] for b in bots if b.send_stats.get('sent')),
+                                     default=None)},
+        'server_cpu_pct': round((cpu1 - cpu0) / elapsed * 100.0, 1) if cpu0 is not None and cpu1 is not None else None,
+        'server': server_stats,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    ap.add_argument('--players', default='2,8,32,128', help='comma-separated lobby sizes')
+    ap.add_argument('--duration', type=float, default=10.0, help='seconds of play per lobby size')
+    ap.add_argument('--send-hz', type=float, default=60.0, help='updates per second per bot (client FPS)')
+    ap.add_argument('--whistle-rate', type=float, default=0.2, help='whistles per second per hidder bot')
+    ap.add_argument('--catch-rate', type=float, default=0.05, help='catch attempts per second by the seeker bot')
+    ap.add_argument('--heartbeat', type=float, default=SEND_HEARTBEAT_S,
+                    help='seconds between sends of unchanged state (0 = send every frame)')
+    ap.add_argument('--idle', type=float, default=0.0, help='fraction of bots that stand still')
+    ap.add_argument('--codec', default='json', choices=('json', 'bin1', 'csv'),
+                    help='wire codec the bots offer in their hello')
+    ap.add_argument('--udp', action='store_true', help='send updates over the UDP state channel when offered')
+    ap.add_argument('--host', default='127.0.0.1', help='server to load (with --no-spawn)')
+    ap.add_argument('--port', type=int, default=5555, help='server port (with --no-spawn)')
+    ap.add_argument('--no-spawn', dest='spawn', action='store_false',
+                    help='load an already running server instead of starting one per lobby size')
+    ap.add_argument('--engine', default='threaded', choices=('threaded', 'asyncio'))
+    ap.add_argument('--tick-hz', type=float, default=30.0)
+    ap.add_argument('--aoi-radius', type=float, default=0.0)
+    ap.add_argument('--startup', type=float, default=0.8, help='seconds to wait for a spawned server')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--json', help='also write the results to this file')
+    args = ap.parse_args(argv)
+
+    sizes = [int(v) for v in args.players.split(',') if v.strip()]
+    print(f"{'players':>8}{'sent/s':>10}{'recv/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cpu %':>8}"
+          f"{'fan-out ms':>12}{'send q ms':>11}")
+    results = []
+    for n in sizes:
+        r = run_load(n, args)
+        results.append(r)
+        lat = r['latency_ms']
+        cpu = f"{r['server_cpu_pct']:.1f}" if r['server_cpu_pct'] is not None else '-'
+        fanout = f"{r['server']['traffic']['fanout_ms']['avg']:.3f}" if r['server'] else '-'
+        queue_ms = r['send_queue_ms']['avg']
+        queue_ms = f"{queue_ms:.3f}" if queue_ms is not None else '-'
+        print(f"{n:>8}{r['sent_per_s']:>10.0f}{r['recv_per_s']:>10.0f}{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}{cpu:>8}"
+              f"{fanout:>12}{queue_ms:>11}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
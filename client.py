@@ -16,7 +16,9 @@ from services.audio import PygameAudioService
 from services.timer import RoundTimer
 from renderers.hud import HUDRenderer
 from renderers.world import WorldRenderer
-from net.sync import parse_initial, parse_tick, build_outgoing_strings
+from net.interpolation import RenderClock
+from net.prediction import InputHistory
+from net.sync import parse_initial, build_outgoing, initial_codec, is_event_equip, OutgoingTracker
 from core.contracts import GameState
 from controllers.input import InputHandler
 
@@ -77,8 +79,9 @@ class Game:
         # Services (DIP)
         self.resource_locator = ResourceLocator()
         self.audio = PygameAudioService()
-        self.timer = RoundTimer()
-        self.network = TcpNetworkClient(server, port)
+        self.network = TcpNetworkClient(server, port, room=ROOM)
+        # round timing runs on the server's clock (ping/pong synchronized)
+        self.timer = RoundTimer(clock=self.network.server_now_ms)
         self.running = True
         # The server now sends all players' positions and metadata.
         # Parse the initial response using the sync helper.
@@ -87,8 +90,20 @@ class Game:
         # Initialize shared game state model with our player index
         idx = my_index if my_index is not None else 0
         self.state = GameState(my_index=idx)
+        # remote players are drawn INTERP_DELAY_MS behind the synchronized
+        # server clock, interpolated between snapshots
+        self.render_clock = RenderClock(INTERP_DELAY_MS, clock=self.network.server_now_ms)
+        # local inputs not yet acknowledged by the server (prediction and
+        # reconciliation of our own player)
+        self.inputs = InputHistory()
+        # the wire codec the server picked from our hello (bin1 when offered)
+        self.codec = initial_codec(initial_resp)
+        # send-on-change: unchanged state only goes out as a periodic heartbeat
+        self.outgoing = OutgoingTracker(SEND_HEARTBEAT_S)
         # Keep legacy attribute for backward-compat, but prefer self.state.my_index
         self.my_index = idx
+        # every slot (PlayerSnapshot) as the server reported it last
+        self.roster = positions_list
 
         # If server didn't send positions list, fall back to previous read_pos behavior
         if positions_list:
@@ -96,7 +111,7 @@ class Game:
             sidx = self.state.my_index if getattr(self, 'state', None) else 0
             try:
                 sp = positions_list[sidx]
-                self.start_pos = (sp[0], sp[1])
+                self.start_pos = (sp.x, sp.y)
             except Exception:
                 # fallback to a sensible default if parsing failed
                 self.start_pos = (500, 300)
@@ -201,21 +216,13 @@ class Game:
                         for idx, p in enumerate(positions_list):
                             if sidx is not None and idx == sidx:
                                 continue
-                            # support optional 'occupied' flag appended as last element
-                            try:
-                                occupied = p[7] if len(p) >= 8 else True
-                            except Exception:
-                                occupied = True
-                            if not occupied:
+                            if not p.occupied:
                                 # slot unoccupied; don't create a remote player yet
                                 continue
-                            px, py = p[0], p[1]
+                            px, py = p.x, p.y
                             is_seeker = (idx == 0)
                             # pass name if available to Player constructor or set after
-                            try:
-                                pname = p[6] if len(p) >= 7 else None
-                            except Exception:
-                                pname = None
+                            pname = p.name
                             try:
                                 from player import Seeker, Hidder
                                 remote = (Seeker if is_seeker else Hidder)((px, py), self.all_sprites, self.collision_sprites, controlled=False, name=pname)
@@ -402,8 +409,80 @@ class Game:
         except Exception:
             pass
 
+    def _apply_event(self, idx, equip_id, x, y):
+        """React to a one-shot event player idx sent at (x, y): CAUGHT:<target>
+        freezes the target, WHISTLE plays the whistle (positional for the
+        seeker). Our own events are ignored."""
+        if idx == self.state.my_index:
+            return
+        try:
+            if equip_id.startswith('CAUGHT:'):
+                # format CAUGHT:<target_index>
+                try:
+                    target_idx = int(equip_id.split(':', 1)[1])
+                except Exception:
+                    return
+                if target_idx == self.state.my_index:
+                    # if target is local player, freeze ourselves
+                    if not getattr(self.player, 'isSeeker', False):
+                        try:
+                            self.player.freeze()
+                        except Exception:
+                            self.player._frozen = True
+                            self.player.can_move = False
+                            try:
+                                self.player.unequip()
+                            except Exception:
+                                pass
+                elif hasattr(self, 'remote_map') and target_idx in self.remote_map:
+                    # freeze the targeted remote player
+                    rp = self.remote_map[target_idx]
+                    try:
+                        rp.freeze()
+                    except Exception:
+                        try:
+                            rp._frozen = True
+                            rp.can_move = False
+                            rp.unequip()
+                        except Exception:
+                            pass
+            elif equip_id == 'WHISTLE':
+                # someone emitted a whistle; if local is seeker, play positional
+                if getattr(self.player, 'isSeeker', False):
+                    self._play_whistle_at((x, y))
+                else:
+                    self._play_whistle_normal()
+        except Exception:
+            pass
+
     
 
+    def send_state(self):
+        """Send the local player's state (bin1 if negotiated, else JSON/CSV).
+
+        Nothing is sent while the state is unchanged, apart from a heartbeat
+        every SEND_HEARTBEAT_S (see net.sync.OutgoingTracker). Plain state may
+        travel over the UDP channel; updates carrying a whistle or catch are
+        always sent at once, over TCP.
+        """
+        try:
+            safe_name = (getattr(self.player, 'name', '') or '')
+        except Exception:
+            safe_name = ''
+        try:
+            if not self.outgoing.due(self.player, safe_name, self.state):
+                return
+        except Exception:
+            pass
+        try:
+            reliable = bool(self.state.whistle_emit) or self.state.caught_target is not None
+        except Exception:
+            reliable = True
+        try:
+            self.network.send_update(build_outgoing(self.player, safe_name, self.state, self.codec), reliable=reliable)
+        except Exception:
+            pass
+
     def run(self):
         while self.running:
 
@@ -412,61 +491,44 @@ class Game:
             for event in pygame.event.get():
                 self.input.handle_event(event)
 
+            # the connection failed or the server went away: back to the menu
+            if self.network.closed:
+                self.running = False
+                break
+
             # Send the player's hitbox center + animation state/frame so the
-            # remote client can show correct animation. We'll send a 4-part
-            # payload: x,y,state,frame
-            px, py = int(self.player.hitbox.centerx), int(self.player.hitbox.centery)
-            # build outgoing state and send (JSON preferred, CSV fallback)
-            try:
-                safe_name = (getattr(self.player, 'name', '') or '')
-            except Exception:
-                safe_name = ''
-            j, csv = build_outgoing_strings(self.player, safe_name, self.state)
-            try:
-                if j:
-                    self.network.send(j, wait_for_reply=False)
-                else:
-                    self.network.send(csv, wait_for_reply=False)
-            except Exception:
-                pass
-            # poll for any incoming server broadcast (non-blocking)
+            # remote client can show correct animation.
+            self.send_state()
+            # newest server snapshot, already decoded by the network's receive
+            # thread (None when nothing arrived since the last frame)
             try:
-                resp = self.network.get_latest()
+                tick = self.network.get_latest()
             except Exception:
-                resp = None
+                tick = None
             # Clear one-shot state flags after sending
             try:
                 self.state.whistle_emit = False
                 self.state.caught_target = None
             except Exception:
                 pass
-            if resp:
-                positions_list, round_start, winner = parse_tick(resp)
-                # Quick pass: if any remote hidder emitted a WHISTLE, ensure
-                # seeker clients play positional audio immediately. This
-                # guards against cases where the main per-entry loop may not
-                # trigger playback in time.
+            if tick is not None:
+                positions_list, round_start, winner = tick.positions, tick.round_start, tick.winner
+                if positions_list:
+                    # every slot as the server reported it last (HUD roster)
+                    self.roster = positions_list
+                # acknowledge what we decoded (sent with the next outgoing update)
+                self.state.ack_seq = tick.seq
+                self.state.resync = tick.resync
+                # server time of this snapshot (None from servers that do not stamp)
+                snap_ms = tick.time_ms
+                # reconcile our predicted position with the server's for the
+                # newest input it applied; replays later inputs on a mismatch
                 try:
-                    if getattr(self.player, 'isSeeker', False):
-                        for idx, p in enumerate(positions_list):
-                            try:
-                                # p may be a tuple (legacy CSV) or dict (JSON)
-                                equip = p[4] if not isinstance(p, dict) else p.get('equip')
-                            except Exception:
-                                equip = None
-                            try:
-                                if equip == 'WHISTLE' and idx != self.state.my_index:
-                                    # extract coordinates robustly
-                                    sx = p[0] if not isinstance(p, dict) else p.get('x')
-                                    sy = p[1] if not isinstance(p, dict) else p.get('y')
-                                    try:
-                                        self._play_whistle_at((sx, sy))
-                                    except Exception:
-                                        pass
-                                    break
-                            except Exception:
-                                pass
-                        
+                    me = positions_list[self.state.my_index]
+                    corrected = self.inputs.reconcile(me.input_seq, me.x, me.y, self.player.replay_input)
+                    if corrected is not None:
+                        self.player.hitbox.center = (round(corrected[0]), round(corrected[1]))
+                        self.player.rect.center = self.player.hitbox.center
                 except Exception:
                     pass
                 # update server-provided round start if a valid epoch ms is provided
@@ -518,30 +580,15 @@ class Game:
                 try:
                     # keep track of frozen hidders for win-condition
                     frozen_count = 0
-                    total_hidders = max(0, NUM_PLAYERS - 1)
                     for idx, p in enumerate(positions_list):
-                        # robustly extract fields and optional occupied flag
-                        try:
-                            if len(p) >= 8:
-                                x, y, state, frame, equip_id, equip_frame, pname, occupied = p
-                            elif len(p) == 7:
-                                x, y, state, frame, equip_id, equip_frame, pname = p
-                                occupied = True
-                            elif len(p) == 6:
-                                x, y, state, frame, equip_id, equip_frame = p
-                                pname = None
-                                occupied = True
-                            else:
-                                continue
-                        except Exception:
-                            continue
+                        x, y, equip_id, pname = p.x, p.y, p.equip, p.name
 
                         # If this entry is the local player, skip applying remote updates
                         if idx == self.state.my_index:
                             continue
 
                         # If slot is not occupied, remove any existing remote player
-                        if not occupied:
+                        if not p.occupied:
                             try:
                                 if hasattr(self, 'remote_map') and idx in self.remote_map:
                                     try:
@@ -578,7 +625,7 @@ class Game:
                         if hasattr(self, 'remote_map') and idx in self.remote_map:
                             rp = self.remote_map[idx]
                             try:
-                                rp.set_remote_state((x, y), state, frame, equip_frame)
+                                rp.set_remote_state((x, y), p.state, p.frame, p.equip_frame, server_ms=snap_ms)
                                 # update remote player's name if provided
                                 try:
                                     if pname:
@@ -590,95 +637,64 @@ class Game:
                                     rp.rect.center = (x, y)
                                 except Exception:
                                     pass
-                        # Handle special equip events embedded per-player
+                        # Apply equip/unequip for remote players; one-shot
+                        # events (WHISTLE / CAUGHT) are handled from
+                        # get_events() below
                         try:
-                            if isinstance(equip_id, str) and equip_id.startswith('CAUGHT:'):
-                                # format CAUGHT:<target_index>
-                                try:
-                                    target_idx = int(equip_id.split(':', 1)[1])
-                                except Exception:
-                                    target_idx = None
-                                if target_idx is not None:
-                                    # if target is local player, freeze ourselves
-                                    if target_idx == self.state.my_index:
-                                        if not getattr(self.player, 'isSeeker', False):
-                                            try:
-                                                self.player.freeze()
-                                            except Exception:
-                                                self.player._frozen = True
-                                                self.player.can_move = False
-                                                try:
-                                                    self.player.unequip()
-                                                except Exception:
-                                                    pass
+                            if not is_event_equip(equip_id) and hasattr(self, 'remote_map') and idx in self.remote_map:
+                                rp = self.remote_map[idx]
+                                if not getattr(rp, 'isSeeker', False):
+                                    if equip_id != 'None' and equip_id in self.object_map:
+                                        obj_sprite = self.object_map[equip_id]
+                                        rp.equip(obj_sprite.image)
+                                        rp._equipped_id = equip_id
                                     else:
-                                        # freeze the targeted remote player
-                                        if hasattr(self, 'remote_map') and target_idx in self.remote_map:
-                                            try:
-                                                self.remote_map[target_idx].freeze()
-                                            except Exception:
-                                                try:
-                                                    self.remote_map[target_idx]._frozen = True
-                                                    self.remote_map[target_idx].can_move = False
-                                                    try:
-                                                        self.remote_map[target_idx].unequip()
-                                                    except Exception:
-                                                        pass
-                                                except Exception:
-                                                    pass
-                            elif equip_id == 'WHISTLE':
-                                # someone emitted a whistle; if local is seeker, play positional
-                                try:
-                                    if getattr(self.player, 'isSeeker', False):
-                                        self._play_whistle_at((x, y))
-                                    else:
-                                        self._play_whistle_normal()
-                                except Exception:
-                                    pass
-                            else:
-                                # apply equip/unequip for remote players if appropriate
-                                if hasattr(self, 'remote_map') and idx in self.remote_map:
-                                    rp = self.remote_map[idx]
-                                    if not getattr(rp, 'isSeeker', False):
-                                        if equip_id != 'None' and equip_id in self.object_map:
-                                            obj_sprite = self.object_map[equip_id]
-                                            rp.equip(obj_sprite.image)
-                                            rp._equipped_id = equip_id
-                                        else:
-                                            rp.unequip()
-                                            if hasattr(rp, '_equipped_id'):
-                                                del rp._equipped_id
+                                        rp.unequip()
+                                        if hasattr(rp, '_equipped_id'):
+                                            del rp._equipped_id
                         except Exception:
                             pass
 
-                    # After processing all entries, if this client is a seeker check win
-                    try:
-                        if getattr(self.player, 'isSeeker', False):
-                            frozen_known = 0
-                            for idx, rp in (getattr(self, 'remote_map', {})).items():
-                                if not getattr(rp, 'isSeeker', False) and getattr(rp, '_frozen', False):
-                                    frozen_known += 1
-                            # include local hidders if any (unlikely when seeker)
-                            if frozen_known >= total_hidders:
-                                if not self.game_over:
-                                    self.game_over = True
-                                    self.game_over_start = pygame.time.get_ticks()
-                                    self.winner_text = "Seeker wins!"
-                                    self.round_stopped = True
-                                    self.round_stop_ms = int(time.time() * 1000)
-                                    # mirror into state
-                                    try:
-                                        self.state.game_over = True
-                                        self.state.winner_text = self.winner_text
-                                    except Exception:
-                                        pass
-                    except Exception:
-                        pass
                 except Exception:
                     pass
 
-            # update round timer and movement permission (use epoch ms from server)
-            now_ms = int(time.time() * 1000)
+            # one-shot events of every snapshot received, including snapshots
+            # a newer one replaced before this frame and late ones that never
+            # reach the mailbox; drained every frame so none wait for a tick
+            try:
+                for ev_idx, ev_equip, ev_x, ev_y in self.network.get_events():
+                    self._apply_event(ev_idx, ev_equip, ev_x, ev_y)
+            except Exception:
+                pass
+
+            # After applying snapshots and events, if this client is a seeker check win
+            try:
+                if getattr(self.player, 'isSeeker', False):
+                    total_hidders = max(0, NUM_PLAYERS - 1)
+                    frozen_known = 0
+                    for idx, rp in (getattr(self, 'remote_map', {})).items():
+                        if not getattr(rp, 'isSeeker', False) and getattr(rp, '_frozen', False):
+                            frozen_known += 1
+                    # include local hidders if any (unlikely when seeker)
+                    if frozen_known >= total_hidders:
+                        if not self.game_over:
+                            self.game_over = True
+                            self.game_over_start = pygame.time.get_ticks()
+                            self.winner_text = "Seeker wins!"
+                            self.round_stopped = True
+                            self.round_stop_ms = self.timer.now_ms()
+                            # mirror into state
+                            try:
+                                self.state.game_over = True
+                                self.state.winner_text = self.winner_text
+                            except Exception:
+                                pass
+            except Exception:
+                pass
+
+            # update round timer and movement permission (server clock, so
+            # hide phase, seeker unlock and whistle schedule match the server)
+            now_ms = self.timer.now_ms()
             timer_seconds = None
             try:
                 timer_seconds = self.timer.elapsed_seconds(now_ms)
@@ -722,8 +738,25 @@ class Game:
             except Exception:
                 pass
 
+            # place remote players at their interpolated positions
+            render_ms = self.render_clock.render_ms()
+            if render_ms is not None:
+                for rp in list(getattr(self, 'remote_map', {}).values()):
+                    try:
+                        rp.interpolate(render_ms)
+                    except Exception:
+                        pass
+
             # update
             self.all_sprites.update(dt)
+            # record the input that moved us this frame (sent as 'in')
+            try:
+                d = self.player.direction
+                if (d.x or d.y) and self.player.can_move and not getattr(self.player, '_frozen', False):
+                    self.state.input_seq = self.inputs.record(dt, d.x, d.y, self.player.hitbox.centerx,
+                                                              self.player.hitbox.centery)
+            except Exception:
+                pass
 
             # draw (render the world once, centered on the local player)
             self.display_surface.fill((30, 30, 30))
@@ -1081,15 +1114,18 @@ if __name__ == "__main__":
                         _smod.server = '127.0.0.1'
                         _smod.port = chosen_port
                         _smod.NUM_PLAYERS = chosen_players
+                        _smod.ROOM = None
                         globals()['server'] = '127.0.0.1'
                         globals()['port'] = chosen_port
                         globals()['NUM_PLAYERS'] = chosen_players
+                        globals()['ROOM'] = None
                         # store player name for use after Game constructed
                         globals()['PLAYER_NAME'] = chosen_name
                     except Exception:
                         globals()['server'] = '127.0.0.1'
                         globals()['port'] = chosen_port
                         globals()['NUM_PLAYERS'] = chosen_players
+                        globals()['ROOM'] = None
                         globals()['PLAYER_NAME'] = chosen_name
                 except Exception as e:
                     print('Failed to start server:', e)
@@ -1142,6 +1178,21 @@ if __name__ == "__main__":
                         clock.tick(30)
 
                 def _select_server(menu):
+                    # LAN discovery runs in the background while the list is
+                    # open; servers show up as they answer, nearest first
+                    discovery = None
+                    if netmod:
+                        try:
+                            discovery = netmod.DiscoveryService(DISCOVERY_PORT, port).start()
+                        except Exception:
+                            discovery = None
+                    try:
+                        return _server_list(menu, discovery)
+                    finally:
+                        if discovery is not None:
+                            discovery.stop()
+
+                def _server_list(menu, discovery):
                     disp = menu.display_surface
                     clock = menu.clock
                     font = menu.font
@@ -1157,15 +1208,12 @@ if __name__ == "__main__":
                     def _refresh():
                         nonlocal results
                         results = []
-                        if netmod:
-                            try:
-                                results = netmod.discover_servers(timeout=1.5)
-                            except Exception:
-                                results = []
-
-                    _refresh()
+                        if discovery is not None:
+                            discovery.refresh()
 
                     while True:
+                        if discovery is not None:
+                            results = discovery.results()
                         for event in pygame.event.get():
                             if event.type == pygame.QUIT:
                                 return None
@@ -1221,7 +1269,8 @@ if __name__ == "__main__":
                         # list results
                         y = 120
                         if not results:
-                            no_s = font.render('No servers discovered on LAN', True, (220,220,220))
+                            no_s = font.render('Searching for servers on LAN...' if discovery is not None
+                                               else 'No servers discovered on LAN', True, (220,220,220))
                             disp.blit(no_s, (WINDOW_WIDTH//2 - no_s.get_width()//2, y))
                         else:
                             item_h = 48
@@ -1233,6 +1282,12 @@ if __name__ == "__main__":
                                 host_name = r.get('name') or f"{r.get('ip')}"
                                 title = f"{host_name}'s Server"
                                 subtitle = f"{r.get('ip')}:{r.get('port')}"
+                                if r.get('room'):
+                                    subtitle += f"  room {r.get('room')}"
+                                if r.get('max'):
+                                    subtitle += f"  ({r.get('players')}/{r.get('max')} players)"
+                                if r.get('rtt_ms') is not None:
+                                    subtitle += f"  {r.get('rtt_ms'):.0f} ms"
                                 t = font.render(title, True, (255,255,255))
                                 st = font.render(subtitle, True, (200,200,200))
                                 disp.blit(t, (item_rect.x + 12, item_rect.y + 6))
@@ -1244,10 +1299,16 @@ if __name__ == "__main__":
                 # Run server selector
                 sel = _select_server(menu)
 
-                if sel:
-                    # sel is a dict with ip/port/name
+                chosen_room = None
+                if isinstance(sel, dict):
+                    # sel is a dict with ip/port/name/room
                     chosen_ip = sel.get('ip')
                     chosen_port = sel.get('port')
+                    chosen_room = sel.get('room')
+                elif sel:
+                    # manual IP entry: default port, any open room
+                    chosen_ip = sel
+                    chosen_port = port
 
                 # apply chosen server IP/port if available
                 if chosen_ip:
@@ -1255,11 +1316,14 @@ if __name__ == "__main__":
                         import settings as _smod
                         _smod.server = chosen_ip
                         _smod.port = chosen_port
+                        _smod.ROOM = chosen_room
                         globals()['server'] = chosen_ip
                         globals()['port'] = chosen_port
+                        globals()['ROOM'] = chosen_room
                     except Exception:
                         globals()['server'] = chosen_ip
                         globals()['port'] = chosen_port
+                        globals()['ROOM'] = chosen_room
 
             # start the game (client) after host/join selection
             game = Game()
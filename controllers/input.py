@@ -60,16 +60,7 @@ class InputHandler:
                 pass
             # send immediate broadcast using unified builder
             try:
-                from net.sync import build_outgoing_strings
-                safe_name = (getattr(g.player, 'name', '') or '')
-                j, csv = build_outgoing_strings(g.player, safe_name, g.state)
-                try:
-                    if j:
-                        g.network.send(j, wait_for_reply=False)
-                    else:
-                        g.network.send(csv, wait_for_reply=False)
-                except Exception:
-                    pass
+                g.send_state()
                 # Do NOT clear the transient whistle flag here — leave it set
                 # so the main game loop's regular outgoing update will include
                 # the WHISTLE equip as well. Clearing it immediately can cause
@@ -132,16 +123,7 @@ class InputHandler:
 
                 # Send immediate CAUGHT event
                 try:
-                    from net.sync import build_outgoing_strings
-                    safe_name = (getattr(g.player, 'name', '') or '')
-                    j, csv = build_outgoing_strings(g.player, safe_name, g.state)
-                    try:
-                        if j:
-                            g.network.send(j, wait_for_reply=False)
-                        else:
-                            g.network.send(csv, wait_for_reply=False)
-                    except Exception:
-                        pass
+                    g.send_state()
                     # clear one-shot caught flag after immediate send
                     g.state.caught_target = None
                 except Exception:
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Protocol, Optional, Tuple, Sequence, Dict, Any
+from typing import Protocol, Optional, Tuple, Sequence, Dict, Any, List, Union
 
 
 @dataclass(frozen=True)
@@ -13,16 +13,42 @@ class GameConfig:
     num_players: int
 
 
-@dataclass
 class PlayerSnapshot:
-    x: int
-    y: int
-    state: str
-    frame: int
-    equip: str = "None"
-    equip_frame: int = 0
-    name: Optional[str] = None
-    occupied: bool = True
+    """One player's state as the server last reported it.
+
+    Decoded by net.sync (parse_initial / parse_tick) and treated as
+    immutable: a snapshot is shared by every tick in which the player did
+    not change, and replace() makes a changed copy. input_seq is the
+    player's newest input the server applied ('in'), None if unknown.
+    """
+
+    __slots__ = ('x', 'y', 'state', 'frame', 'equip', 'equip_frame', 'name', 'occupied', 'input_seq')
+
+    def __init__(self, x: int = 0, y: int = 0, state: str = 'down', frame: int = 0, equip: str = "None",
+                 equip_frame: int = 0, name: Optional[str] = None, occupied: bool = True,
+                 input_seq: Optional[int] = None) -> None:
+        self.x = x
+        self.y = y
+        self.state = state
+        self.frame = frame
+        self.equip = equip
+        self.equip_frame = equip_frame
+        self.name = name
+        self.occupied = occupied
+        self.input_seq = input_seq
+
+    def replace(self, **changes: Any) -> 'PlayerSnapshot':
+        values = {k: getattr(self, k) for k in self.__slots__}
+        values.update(changes)
+        return PlayerSnapshot(**values)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PlayerSnapshot):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self) -> str:
+        return 'PlayerSnapshot(%s)' % ', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__)
 
 
 @dataclass
@@ -34,12 +60,18 @@ class GameState:
     - winner_text: UI-friendly winner message
     - whistle_emit: transient flag to emit a whistle in next outgoing payload
     - caught_target: transient target index for a CAUGHT event in next payload
+    - ack_seq: newest server snapshot decoded, echoed so the server can send deltas
+    - resync: ask the server for a full keyframe (delta baseline was lost)
+    - input_seq: newest local input applied (client prediction), sent as 'in'
     """
     my_index: int = 0
     game_over: bool = False
     winner_text: str = ""
     whistle_emit: bool = False
     caught_target: Optional[int] = None
+    ack_seq: Optional[int] = None
+    resync: bool = False
+    input_seq: Optional[int] = None
 
 
 class INetworkClient(Protocol):
@@ -48,10 +80,36 @@ class INetworkClient(Protocol):
     def get_initial(self) -> Optional[str]:
         ...
 
-    def send(self, data: str, wait_for_reply: bool = False) -> Optional[str]:
+    def send(self, data: Union[str, bytes], wait_for_reply: bool = False) -> Optional[str]:
+        ...
+
+    def send_update(self, data: Union[str, bytes], reliable: bool = False) -> None:
+        """Send a state update; may use an unreliable channel unless reliable."""
+        ...
+
+    def get_latest(self) -> Optional[Any]:
+        """Newest server snapshot not taken yet, decoded off the caller's
+        thread (a net.sync.Tick), or None."""
+        ...
+
+    def get_events(self) -> List[Tuple[int, str, int, int]]:
+        """One-shot events (WHISTLE / CAUGHT:<idx>) received since the last
+        call, oldest first, as (player index, equip, x, y)."""
+        ...
+
+    def server_now_ms(self) -> int:
+        """Estimated server clock in epoch ms (synchronized in the background)."""
+        ...
+
+    def send_stats(self) -> Dict[str, Any]:
+        """Outbound queue counters: sends never block the caller, this reports
+        how long queued frames waited (latency_ms_avg / _max / _last)."""
         ...
 
-    def get_latest(self) -> Optional[str]:
+    @property
+    def closed(self) -> bool:
+        """True once the connection is gone (closed, or lost to a failed send
+        or the server hanging up)."""
         ...
 
     def close(self) -> None:
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import math
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Headless movement/collision rules, no pygame import. Mirrors Player.move /
+# Player.collision, Player.equip and InputHandler._seeker_try_catch so the
+# server and bots can run the same geometry the client does. Boxes are
+# (x, y, w, h) in integer pixels with pygame Rect semantics: assigning a float
+# coordinate truncates it, and boxes overlap only when they share area.
+Box = Tuple[int, int, int, int]
+
+PLAYER_SPEED = 500
+# player sprites are 128x128 and the hitbox is inflate(-60, -60) of that
+PLAYER_HITBOX = 68
+# speed multiplier while a hidder is disguised as an object
+EQUIP_SPEED_FACTOR = 0.75
+# seeker catch probe: a 24x24 box 16 px in front of the hitbox
+CATCH_PROBE = 24
+CATCH_REACH = 16
+# object pickup probe (Player.get_object_in_front)
+INTERACT_PROBE = 16
+INTERACT_REACH = 16
+DEFAULT_STEP_HZ = 60
+
+WORLD_TMX = os.path.join('data', 'maps', 'world.tmx')
+
+
+def overlaps(a: Box, b: Box) -> bool:
+    """pygame.Rect.colliderect: true only when a and b share some area."""
+    return (a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+            and a[2] > 0 and a[3] > 0 and b[2] > 0 and b[3] > 0)
+
+
+def box_at(center, w: int = PLAYER_HITBOX, h: int = PLAYER_HITBOX) -> Box:
+    """Box of size w x h centered on center (pygame's Rect.center setter)."""
+    return int(center[0]) - w // 2, int(center[1]) - h // 2, w, h
+
+
+def center_of(box: Box) -> Tuple[int, int]:
+    return box[0] + box[2] // 2, box[1] + box[3] // 2
+
+
+def equipped_box(center, obj: Box) -> Box:
+    """Hitbox of a hidder disguised as obj (Player.equip): the object's size
+    centered on the player, shrunk by 20% (at least 2 px) each way."""
+    w, h = obj[2], obj[3]
+    pad_w, pad_h = max(2, int(w * 0.2)), max(2, int(h * 0.2))
+    x, y, _, _ = box_at(center, w, h)
+    # Rect.inflate keeps the center; odd pads round the same way pygame does
+    return x + pad_w // 2, y + pad_h // 2, w - pad_w, h - pad_h
+
+
+def probe(box: Box, facing: str, size: int = CATCH_PROBE, reach: int = CATCH_REACH) -> Box:
+    """The square just in front of box in facing direction."""
+    x, y, w, h = box
+    cx, cy = x + w // 2, y + h // 2
+    if facing == 'up':
+        return cx - size // 2, y - reach - size, size, size
+    if facing == 'down':
+        return cx - size // 2, y + h + reach, size, size
+    if facing == 'left':
+        return x - reach - size, cy - size // 2, size, size
+    return x + w + reach, cy - size // 2, size, size
+
+
+def catch_target(seeker: Box, facing: str, others: Mapping[int, Box], slack: int = 0) -> Optional[int]:
+    """First player in others (index -> hitbox) the seeker's catch probe
+    touches, as InputHandler._seeker_try_catch decides it. slack grows the
+    probe on every side (e.g. to absorb network latency on the server)."""
+    x, y, w, h = probe(seeker, facing)
+    area = (x - slack, y - slack, w + 2 * slack, h + 2 * slack)
+    for idx, box in others.items():
+        if overlaps(area, box):
+            return idx
+    return None
+
+
+class CollisionWorld:
+    """Static solids of the map with a uniform grid for broad-phase lookups.
+
+    solids are collision boxes in the order the client adds them to its
+    collision group (Objects layer, then Collisions); overlapping solids are
+    resolved in that order, as Player.collision does. objects maps the
+    interactive objects' ids ("<x>_<y>", as the client builds them) to their
+    boxes, for equip sizes and pickup probes.
+    """
+
+    def __init__(self, solids: Sequence[Box], objects: Optional[Mapping[str, Box]] = None,
+                 cell_size: int = 256) -> None:
+        self.solids: List[Box] = [tuple(int(v) for v in b) for b in solids]
+        self.objects: Dict[str, Box] = dict(objects or {})
+        self._object_ids = {box: oid for oid, box in self.objects.items()}
+        self.cell_size = max(16, int(cell_size))
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, box in enumerate(self.solids):
+            for cell in self._cells_of(box):
+                self._cells.setdefault(cell, []).append(i)
+
+    @classmethod
+    def from_tmx(cls, path: str = WORLD_TMX, cell_size: int = 256) -> 'CollisionWorld':
+        """Compile the Objects and Collisions layers of a Tiled map."""
+        root = ET.parse(path).getroot()
+        base = os.path.dirname(path)
+        # gid -> (width, height) of tile images, for tile objects
+        sizes: Dict[int, Tuple[int, int]] = {}
+        for ts in root.findall('tileset'):
+            first = int(ts.get('firstgid', 1))
+            node = ts
+            if ts.get('source'):
+                node = ET.parse(os.path.join(base, ts.get('source'))).getroot()
+            for tile in node.findall('tile'):
+                img = tile.find('image')
+                if img is not None and img.get('width'):
+                    sizes[first + int(tile.get('id'))] = (int(img.get('width')), int(img.get('height')))
+        layers = {g.get('name'): g for g in root.findall('objectgroup')}
+        solids: List[Box] = []
+        objects: Dict[str, Box] = {}
+        for obj in layers['Objects'].findall('object') if 'Objects' in layers else ():
+            x, y = float(obj.get('x', 0)), float(obj.get('y', 0))
+            h = float(obj.get('height', 0))
+            gid = int(obj.get('gid', 0)) & 0x0FFFFFFF
+            if gid:
+                # Tiled anchors tile objects at their bottom-left corner
+                y -= h
+            w_img, h_img = sizes.get(gid, (int(float(obj.get('width', 0))), int(h)))
+            box = (int(x), int(y), w_img, h_img)
+            solids.append(box)
+            objects[f'{int(x)}_{int(y)}'] = box
+        for obj in layers['Collisions'].findall('object') if 'Collisions' in layers else ():
+            solids.append((int(float(obj.get('x', 0))), int(float(obj.get('y', 0))),
+                           int(float(obj.get('width', 0))), int(float(obj.get('height', 0)))))
+        return cls(solids, objects, cell_size)
+
+    def _cells_of(self, box: Box) -> Iterable[Tuple[int, int]]:
+        c = self.cell_size
+        x0, y0 = box[0] // c, box[1] // c
+        x1, y1 = (box[0] + box[2]) // c, (box[1] + box[3]) // c
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield cx, cy
+
+    def near(self, box: Box) -> List[int]:
+        """Indices of solids that may overlap box, in collision order."""
+        cells = self._cells
+        found = set()
+        for cell in self._cells_of(box):
+            hit = cells.get(cell)
+            if hit:
+                found.update(hit)
+        return sorted(found)
+
+    def blocked(self, box: Box) -> bool:
+        solids = self.solids
+        return any(overlaps(box, solids[i]) for i in self.near(box))
+
+    def object_at(self, area: Box) -> Optional[str]:
+        """Id of the first interactive object overlapping area."""
+        solids = self.solids
+        for i in self.near(area):
+            oid = self._object_ids.get(solids[i])
+            if oid is not None and overlaps(area, solids[i]):
+                return oid
+        return None
+
+    def move(self, box: Box, dx: float, dy: float, distance: float) -> Box:
+        """Move box by distance along (dx, dy) (a unit or zero vector) and
+        resolve collisions axis by axis, as Player.move does."""
+        x, y, w, h = box
+        if dx:
+            x = self._resolve(x, int(x + dx * distance), y, w, h, dx > 0, 0)
+        if dy:
+            y = self._resolve(y, int(y + dy * distance), x, h, w, dy > 0, 1)
+        return x, y, w, h
+
+    def _resolve(self, start: int, pos: int, other: int, size: int, other_size: int, forward: bool,
+                 axis: int) -> int:
+        # Player.collision along one axis: every solid (in group order) the
+        # box overlaps pushes it back to that solid's near edge
+        solids = self.solids
+
+        def span(lo, hi):
+            return (lo, other, hi - lo + size, other_size) if axis == 0 else (other, lo, other_size, hi - lo + size)
+
+        lo, hi = min(start, pos), max(start, pos)
+        candidates = self.near(span(lo, hi))
+        i = 0
+        while i < len(candidates):
+            s = solids[candidates[i]]
+            box = (pos, other, size, other_size) if axis == 0 else (other, pos, other_size, size)
+            if overlaps(box, s):
+                pos = s[axis] - size if forward else s[axis] + s[axis + 2]
+                if pos < lo or pos > hi:
+                    # pushed outside the swept span: later solids there count too
+                    lo, hi = min(lo, pos), max(hi, pos)
+                    done = candidates[i]
+                    candidates = candidates[:i + 1] + [j for j in self.near(span(lo, hi)) if j > done]
+            i += 1
+        return pos
+
+
+class Body:
+    """A player as the simulation sees it: hitbox, facing and speed.
+
+    steer() sets the movement direction like Player.input (normalized, and
+    facing follows it like Player.animate); step() moves it one tick.
+    """
+
+    def __init__(self, center, w: int = PLAYER_HITBOX, h: int = PLAYER_HITBOX,
+                 speed: float = PLAYER_SPEED) -> None:
+        self.box: Box = box_at(center, w, h)
+        self.speed = speed
+        self.base_speed = speed
+        self.facing = 'down'
+        self.dx = 0.0
+        self.dy = 0.0
+        self.equip: Optional[str] = None
+        self._base_size = (w, h)
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return center_of(self.box)
+
+    @center.setter
+    def center(self, xy) -> None:
+        self.box = box_at(xy, self.box[2], self.box[3])
+
+    def steer(self, dx: float, dy: float) -> None:
+        n = math.hypot(dx, dy)
+        if n > 0:
+            dx, dy = dx / n, dy / n
+        self.dx, self.dy = dx, dy
+        if dx:
+            self.facing = 'right' if dx > 0 else 'left'
+        elif dy:
+            self.facing = 'down' if dy > 0 else 'up'
+
+    def step(self, world: Optional[CollisionWorld], dt: float) -> None:
+        if not (self.dx or self.dy):
+            return
+        if world is None:
+            x, y, w, h = self.box
+            self.box = (int(x + self.dx * self.speed * dt), int(y + self.dy * self.speed * dt), w, h)
+        else:
+            self.box = world.move(self.box, self.dx, self.dy, self.speed * dt)
+
+    def disguise(self, world: CollisionWorld, obj_id: Optional[str]) -> bool:
+        """Take the hitbox and speed of object obj_id (None = drop it)."""
+        center = self.center
+        if obj_id is None:
+            self.equip = None
+            self.box = box_at(center, *self._base_size)
+            self.speed = self.base_speed
+            return True
+        obj = world.objects.get(obj_id)
+        if obj is None:
+            return False
+        self.equip = obj_id
+        self.box = equipped_box(center, obj)
+        self.speed = self.base_speed * EQUIP_SPEED_FACTOR
+        return True
+
+
+class FixedStep:
+    """Fixed-timestep integrator: advance(elapsed) returns how many steps of
+    dt to run so simulation time tracks real time; leftover time carries
+    over, and at most max_steps run per call so a stall cannot snowball."""
+
+    def __init__(self, hz: float = DEFAULT_STEP_HZ, max_steps: int = 8) -> None:
+        self.dt = 1.0 / float(hz)
+        self.max_steps = max_steps
+        self._acc = 0.0
+
+    def advance(self, elapsed: float) -> int:
+        self._acc += max(0.0, elapsed)
+        steps = int(self._acc / self.dt)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self._acc = 0.0
+        else:
+            self._acc -= steps * self.dt
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """Fraction of a step left over (for rendering between steps)."""
+        return self._acc / self.dt
+
+
+def hitbox_of(world: Optional[CollisionWorld], center, equip: Optional[str]) -> Box:
+    """A player's hitbox from networked state: its center and equip id."""
+    obj = world.objects.get(equip) if world is not None and equip else None
+    return equipped_box(center, obj) if obj is not None else box_at(center)
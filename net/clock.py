@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import deque
+from typing import Optional
+
+
+def _local_ms() -> float:
+    # monotonic, so wall-clock adjustments on the client cannot move the estimate
+    return time.monotonic() * 1000.0
+
+
+class ClockSync:
+    """Estimates the server's clock from ping/pong exchanges (NTP style).
+
+    The client sends build_ping() (its local send time t0) over the game
+    connection; the server answers {'pong': t0, 't': server epoch ms}
+    (server_core.payloads.build_pong) and handle_pong() is called with the
+    local receive time t3. Each exchange gives
+
+        rtt    = t3 - t0
+        offset = t - (t0 + t3) / 2
+
+    Of the last `window` samples the one with the smallest round trip is
+    trusted (queueing delay only ever adds to rtt, so it carries the least
+    error). server_now_ms() is the local clock plus that offset; until the
+    first pong it falls back to the local wall clock.
+    """
+
+    def __init__(self, window: int = 8) -> None:
+        self._samples: deque = deque(maxlen=max(1, int(window)))
+        self.offset_ms: Optional[float] = None
+        self.rtt_ms: Optional[float] = None
+        self.exchanges = 0
+
+    @property
+    def synced(self) -> bool:
+        return self.offset_ms is not None
+
+    @staticmethod
+    def build_ping(now_ms: Optional[float] = None) -> str:
+        return json.dumps({'ping': round(_local_ms() if now_ms is None else now_ms, 3)})
+
+    @staticmethod
+    def is_pong(frame) -> bool:
+        """Cheap check on a raw frame (bytes or str) before decoding it."""
+        return frame[:8] in (b'{"pong":', '{"pong":')
+
+    def handle_pong(self, msg, now_ms: Optional[float] = None) -> bool:
+        """Feed a pong (raw frame or decoded dict); returns whether it was used."""
+        t3 = _local_ms() if now_ms is None else now_ms
+        try:
+            if not isinstance(msg, dict):
+                msg = json.loads(msg)
+            t0 = float(msg['pong'])
+            server_ms = float(msg['t'])
+        except Exception:
+            return False
+        rtt = t3 - t0
+        if rtt < 0:
+            return False
+        self._samples.append((rtt, server_ms - (t0 + t3) / 2.0))
+        self.rtt_ms, self.offset_ms = min(self._samples)
+        self.exchanges += 1
+        return True
+
+    def server_now_ms(self) -> int:
+        """Current server time in epoch ms (local wall clock before the first pong)."""
+        if self.offset_ms is None:
+            return int(time.time() * 1000)
+        return int(_local_ms() + self.offset_ms)
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import select
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+DISCOVER_MSG = b"DISCOVER_REQUEST"
+DISCOVER_RESP_PREFIX = b"DISCOVER_RESPONSE::"
+
+
+def parse_response(data: bytes, default_port: int) -> Optional[Dict[str, Any]]:
+    """One discovery reply as a result dict, or None if it is not one.
+
+    DISCOVER_RESPONSE::<ip>::<port>::<host name>::<room id>::<players>/<max>;
+    servers without rooms send the first three fields only ('room',
+    'players' and 'max' are None then).
+    """
+    if not data.startswith(DISCOVER_RESP_PREFIX):
+        return None
+    try:
+        parts = data[len(DISCOVER_RESP_PREFIX):].decode('utf-8').split('::')
+        ip = parts[0]
+        pport = int(parts[1]) if len(parts) > 1 else default_port
+    except Exception:
+        return None
+    players = max_players = None
+    if len(parts) > 4:
+        try:
+            players, max_players = (int(v) for v in parts[4].split('/', 1))
+        except Exception:
+            pass
+    return {'ip': ip, 'port': pport, 'name': parts[2] if len(parts) > 2 else None,
+            'room': parts[3] if len(parts) > 3 else None, 'players': players, 'max': max_players}
+
+
+class DiscoveryService:
+    """LAN server discovery running in the background.
+
+    A thread broadcasts a discovery request every `interval` seconds and, in
+    the same round, probes every server already found with a unicast request,
+    all from one socket so the probes run in parallel. Replies are merged
+    into the result list as they arrive: results() never blocks and returns
+    the open rooms ranked by round-trip time (full rooms last), each a dict
+    like discover_servers() returns plus 'rtt_ms'. version increases on
+    every change so a UI only has to re-read when it moved.
+
+    A server's rtt_ms is the smallest of its recent samples, each the time
+    from the latest request sent its way to a reply. Rooms not heard from
+    for `stale_after` seconds are dropped.
+    """
+
+    # replies kept per server for the rtt estimate
+    RTT_SAMPLES = 5
+
+    def __init__(self, port: int, default_port: int, interval: float = 1.0,
+                 stale_after: float = 3.5) -> None:
+        self.port = port
+        self.default_port = default_port
+        self.interval = interval
+        self.stale_after = stale_after
+        self.version = 0
+        self._lock = threading.Lock()
+        # (ip, port, room) -> result dict
+        self._rooms: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+        self._seen: Dict[Tuple[Any, ...], float] = {}
+        # reply source address -> recent rtt samples (ms)
+        self._rtt: Dict[Tuple[str, int], List[float]] = {}
+        self._sent_at: Dict[Tuple[str, int], float] = {}
+        self._broadcast_at = 0.0
+        self._ranked: List[Dict[str, Any]] = []
+        self._ranked_version = -1
+        self._stop = threading.Event()
+        self._kick = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'DiscoveryService':
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='discovery', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._kick.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def refresh(self) -> None:
+        """Forget the current results and broadcast again right away."""
+        with self._lock:
+            self._rooms.clear()
+            self._seen.clear()
+            self._rtt.clear()
+            self.version += 1
+        self._kick.set()
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Open rooms found so far, best first (copies; safe to keep)."""
+        with self._lock:
+            self._expire(time.monotonic())
+            if self._ranked_version != self.version:
+                def rank(r):
+                    full = r['max'] is not None and r['players'] is not None and r['players'] >= r['max']
+                    rtt = r['rtt_ms'] if r['rtt_ms'] is not None else float('inf')
+                    return full, rtt, str(r['name'] or r['ip']), str(r['room'] or '')
+                self._ranked = [dict(r) for r in sorted(self._rooms.values(), key=rank)]
+                self._ranked_version = self.version
+            return list(self._ranked)
+
+    def _expire(self, now: float) -> None:
+        # caller holds self._lock
+        stale = [k for k, seen in self._seen.items() if now - seen > self.stale_after]
+        for k in stale:
+            del self._rooms[k]
+            del self._seen[k]
+        if stale:
+            self.version += 1
+
+    def _probe(self, sock: socket.socket) -> None:
+        now = time.monotonic()
+        try:
+            sock.sendto(DISCOVER_MSG, ('<broadcast>', self.port))
+        except Exception:
+            # some platforms prefer the explicit broadcast address
+            try:
+                sock.sendto(DISCOVER_MSG, ('255.255.255.255', self.port))
+            except Exception:
+                pass
+        self._broadcast_at = now
+        with self._lock:
+            known = list(self._rtt)
+        for addr in known:
+            try:
+                sock.sendto(DISCOVER_MSG, addr)
+                self._sent_at[addr] = time.monotonic()
+            except Exception:
+                pass
+
+    def _handle(self, data: bytes, addr: Tuple[str, int]) -> None:
+        now = time.monotonic()
+        result = parse_response(data, self.default_port)
+        if result is None:
+            return
+        sent = max(self._broadcast_at, self._sent_at.get(addr, 0.0))
+        with self._lock:
+            samples = self._rtt.setdefault(addr, [])
+            samples.append((now - sent) * 1000.0)
+            del samples[:-self.RTT_SAMPLES]
+            result['addr'] = addr
+            result['rtt_ms'] = round(min(samples), 2)
+            key = (result['ip'], result['port'], result['room'])
+            self._seen[key] = now
+            old = self._rooms.get(key)
+            self._rooms[key] = result
+            if old is None or any(old[k] != result[k] for k in ('name', 'players', 'max', 'rtt_ms')):
+                self.version += 1
+
+    def _run(self) -> None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.setblocking(False)
+            next_probe = 0.0
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= next_probe or self._kick.is_set():
+                    self._kick.clear()
+                    self._probe(sock)
+                    next_probe = time.monotonic() + self.interval
+                # short waits so stop()/refresh() are picked up promptly
+                ready, _, _ = select.select([sock], [], [], min(0.1, max(0.0, next_probe - now)))
+                if not ready:
+                    continue
+                while True:
+                    try:
+                        data, addr = sock.recvfrom(1024)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        # e.g. ICMP unreachable from a probed server that went away
+                        break
+                    self._handle(data, addr)
+        finally:
+            try:
+                sock.close()
+            except Exception:
+                pass
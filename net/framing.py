@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import struct
+from typing import List, Optional, Tuple, Union
+
+# Every message on the game TCP stream is a 4-byte big-endian payload length
+# followed by the payload itself (UTF-8 JSON/CSV text today). TCP is a byte
+# stream, so a single recv() may contain several messages or only part of one;
+# the decoder below reassembles them regardless of how the kernel splits data.
+HEADER = struct.Struct('!I')
+HEADER_SIZE = HEADER.size
+# Upper bound for a single message; anything bigger is treated as a corrupt
+# stream rather than an allocation request.
+MAX_FRAME_SIZE = 1 << 20
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class FrameError(ValueError):
+    """Raised when the stream contains a length header that cannot be valid."""
+
+
+def encode_frame(payload: Union[str, bytes, bytearray]) -> bytes:
+    """Prefix payload with its length. Strings are encoded as UTF-8."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return HEADER.pack(len(payload)) + bytes(payload)
+
+
+class FrameDecoder:
+    """Streaming decoder for length-prefixed frames.
+
+    Incoming bytes are read straight into a reusable buffer with recv_into(),
+    and every complete frame in the buffer is returned from a single call, so
+    one syscall can yield many messages. Partial frames stay buffered until the
+    rest arrives; nothing is decoded until a frame is complete.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, max_frame_size: int = MAX_FRAME_SIZE) -> None:
+        self._buf = bytearray(max(buffer_size, HEADER_SIZE))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._backlog: List[bytes] = []
+        self.max_frame_size = max_frame_size
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes that do not yet form a complete frame."""
+        return self._end - self._start
+
+    def recv_frames(self, sock) -> Optional[List[bytes]]:
+        """Perform one recv_into() on sock and return the completed frames.
+
+        Returns an empty list when only a partial frame has arrived so far and
+        None when the peer closed the connection. Frames left over from an
+        earlier recv_frame() call are returned first, without a syscall.
+        """
+        if self._backlog:
+            frames, self._backlog = self._backlog, []
+            return frames
+        self._reserve()
+        n = sock.recv_into(self._view[self._end:])
+        if not n:
+            return None
+        self._end += n
+        return self._drain()
+
+    def recv_frame(self, sock) -> Optional[bytes]:
+        """Block until one frame is available on sock and return it.
+
+        Extra frames read by the same syscall are kept and handed out by the
+        next recv_frame()/recv_frames() call. Returns None on EOF.
+        """
+        while True:
+            frames = self.recv_frames(sock)
+            if frames is None:
+                return None
+            if frames:
+                self._backlog = frames[1:]
+                return frames[0]
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> List[bytes]:
+        """Append already-received bytes and return the completed frames."""
+        data = memoryview(data)
+        while len(data):
+            self._reserve()
+            room = len(self._buf) - self._end
+            chunk = data[:room]
+            self._view[self._end:self._end + len(chunk)] = chunk
+            self._end += len(chunk)
+            data = data[len(chunk):]
+        return self._drain()
+
+    def _reserve(self) -> None:
+        # Make room at the tail: first by discarding consumed bytes, then by
+        # growing the buffer when a single frame is larger than it.
+        if self._end < len(self._buf):
+            return
+        pending = self._end - self._start
+        if self._start:
+            self._view[:pending] = bytes(self._view[self._start:self._end])
+            self._start, self._end = 0, pending
+        if self._end == len(self._buf):
+            needed = len(self._buf) * 2
+            if pending >= HEADER_SIZE:
+                needed = max(needed, HEADER_SIZE + HEADER.unpack_from(self._buf, 0)[0])
+            self._view.release()
+            self._buf.extend(bytes(needed - len(self._buf)))
+            self._view = memoryview(self._buf)
+
+    def _drain(self) -> List[bytes]:
+        frames = []
+        buf = self._buf
+        start, end = self._start, self._end
+        while end - start >= HEADER_SIZE:
+            (length,) = HEADER.unpack_from(buf, start)
+            if length > self.max_frame_size:
+                raise FrameError(f'frame of {length} bytes exceeds limit of {self.max_frame_size}')
+            body = start + HEADER_SIZE
+            if end - body < length:
+                break
+            frames.append(bytes(self._view[body:body + length]))
+            start = body + length
+        if start == end:
+            start = end = 0
+        self._start, self._end = start, end
+        return frames
+
+
+
+# The optional UDP state channel carries one message per datagram, prefixed
+# with the connection's token (assigned in the TCP handshake) and a sequence
+# number that increases per sender, so receivers can drop duplicated or
+# reordered datagrams. Payloads are the same bytes a TCP frame would carry.
+DATAGRAM_HEADER = struct.Struct('!II')
+DATAGRAM_HEADER_SIZE = DATAGRAM_HEADER.size
+# Larger messages go over TCP instead of relying on IP fragmentation: 1200
+# bytes plus the header and IP/UDP headers fit the minimum IPv6 MTU (1280).
+MAX_DATAGRAM_PAYLOAD = 1200
+
+
+def encode_datagram(token: int, seq: int, payload: Union[str, bytes, bytearray] = b'') -> bytes:
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return DATAGRAM_HEADER.pack(token & 0xFFFFFFFF, seq & 0xFFFFFFFF) + bytes(payload)
+
+
+def decode_datagram(data: bytes) -> Optional[Tuple[int, int, bytes]]:
+    """Split a datagram into (token, seq, payload); None if too short."""
+    if len(data) < DATAGRAM_HEADER_SIZE:
+        return None
+    token, seq = DATAGRAM_HEADER.unpack_from(data, 0)
+    return token, seq, bytes(data[DATAGRAM_HEADER_SIZE:])
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+# Remote players are drawn this far (ms) behind the newest server snapshot so
+# there is normally a snapshot on either side of the render time.
+DEFAULT_DELAY_MS = 100
+# How far (ms) past the newest snapshot a remote player keeps moving along its
+# last velocity when snapshots are late, before it holds still.
+DEFAULT_MAX_EXTRAPOLATE_MS = 100
+
+
+class RenderClock:
+    """The server time remote players are drawn at.
+
+    clock returns the current time in epoch ms on the server's clock, the
+    same estimate the round timer uses (INetworkClient.server_now_ms, backed
+    by net.clock.ClockSync); it defaults to the local clock. render_ms() is
+    that time minus delay_ms, so it lines up with the snapshots' 't' stamps.
+    """
+
+    def __init__(self, delay_ms: float = DEFAULT_DELAY_MS, clock: Optional[Callable[[], float]] = None) -> None:
+        self.delay_ms = float(delay_ms)
+        self.clock = clock or (lambda: time.time() * 1000.0)
+
+    def render_ms(self, now_ms: Optional[float] = None) -> float:
+        return (self.clock() if now_ms is None else now_ms) - self.delay_ms
+
+
+class InterpolationBuffer:
+    """Time-indexed positions of one remote player.
+
+    push() adds (server_ms, x, y) from a snapshot; stale or duplicate
+    timestamps are ignored. sample(render_ms) interpolates linearly between
+    the two snapshots around render_ms, holds the oldest one before the
+    buffer starts, and past the newest one extrapolates along the last
+    velocity for at most max_extrapolate_ms.
+    """
+
+    def __init__(self, capacity: int = 32, max_extrapolate_ms: float = DEFAULT_MAX_EXTRAPOLATE_MS) -> None:
+        self.max_extrapolate_ms = float(max_extrapolate_ms)
+        self._samples: deque = deque(maxlen=max(2, int(capacity)))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+    def push(self, server_ms, x, y) -> bool:
+        try:
+            t = float(server_ms)
+        except (TypeError, ValueError):
+            return False
+        if self._samples and t <= self._samples[-1][0]:
+            return False
+        self._samples.append((t, float(x), float(y)))
+        return True
+
+    def sample(self, render_ms: Optional[float]) -> Optional[Tuple[float, float]]:
+        samples = self._samples
+        if not samples:
+            return None
+        if render_ms is None or len(samples) == 1:
+            return samples[-1][1], samples[-1][2]
+        if render_ms <= samples[0][0]:
+            return samples[0][1], samples[0][2]
+        t1, x1, y1 = samples[-1]
+        if render_ms >= t1:
+            t0, x0, y0 = samples[-2]
+            ahead = min(render_ms - t1, self.max_extrapolate_ms)
+            k = ahead / (t1 - t0)
+            return x1 + (x1 - x0) * k, y1 + (y1 - y0) * k
+        # newest first: render time is normally close to the end
+        for i in range(len(samples) - 1, 0, -1):
+            t0, x0, y0 = samples[i - 1]
+            if t0 <= render_ms:
+                t1, x1, y1 = samples[i]
+                k = (render_ms - t0) / (t1 - t0)
+                return x0 + (x1 - x0) * k, y0 + (y1 - y0) * k
+        return samples[0][1], samples[0][2]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+# Ordered frames (events, handshakes) queued before the connection is given up
+# as too slow. State updates never pile up: only the newest one is ever queued.
+DEFAULT_MAX_QUEUE = 64
+
+
+@dataclass
+class SendStats:
+    """Counters for the client's outbound queue. dropped counts state
+    updates replaced by a newer one before they went out. Latencies are the
+    time a frame waited in the queue before its send completed."""
+
+    queued: int = 0
+    sent: int = 0
+    dropped: int = 0
+    bytes_sent: int = 0
+    depth: int = 0
+    latency_ms_avg: float = 0.0
+    latency_ms_max: float = 0.0
+    latency_ms_last: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'bytes_sent': self.bytes_sent,
+            'depth': self.depth,
+            'latency_ms_avg': round(self.latency_ms_avg, 3),
+            'latency_ms_max': round(self.latency_ms_max, 3),
+            'latency_ms_last': round(self.latency_ms_last, 3),
+        }
+
+
+class UpdateWriter:
+    """Sends frames from its own thread so the caller never waits on the socket.
+
+    push(frame, state=True) queues a plain state update. Only the newest one
+    is kept: a queued update that has not gone out yet is dropped and the
+    new one goes to the back of the queue. push(frame, state=False) queues a
+    frame that must arrive (an event, a legacy message). These frames keep
+    their order, and a later state update never overtakes them; they are
+    never dropped. send(frame) is called on the writer thread; it should
+    hold whatever lock the socket shares with other senders. When it raises,
+    or when max_queue ordered frames are waiting (the connection cannot keep
+    up), the writer stops and calls on_error.
+    """
+
+    # weight of the newest sample in latency_ms_avg
+    LATENCY_EWMA = 0.1
+
+    def __init__(self, send: Callable[[bytes], None], max_queue: int = DEFAULT_MAX_QUEUE,
+                 on_error: Optional[Callable[[Exception], None]] = None, name: str = 'client') -> None:
+        self._send = send
+        self.max_queue = max(1, int(max_queue))
+        self.on_error = on_error
+        self.stats = SendStats()
+        # [frame, enqueue time, is_state]
+        self._queue: deque = deque()
+        self._state_entry: Optional[list] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f'writer-{name}', daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def push(self, frame: bytes, state: bool = True) -> bool:
+        """Queue frame; False once the writer has stopped."""
+        with self._cond:
+            if self._closed:
+                return False
+            full = False
+            if state and self._state_entry is not None:
+                self._queue.remove(self._state_entry)
+                self.stats.dropped += 1
+            elif len(self._queue) >= self.max_queue:
+                full = True
+            if not full:
+                entry = [frame, time.perf_counter(), state]
+                self._queue.append(entry)
+                if state:
+                    self._state_entry = entry
+                self.stats.queued += 1
+                self.stats.depth = len(self._queue)
+                self._cond.notify()
+        if full:
+            self._fail(ConnectionError('send queue full (%d frames)' % self.max_queue))
+            return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                entry = self._queue.popleft()
+                if entry is self._state_entry:
+                    self._state_entry = None
+                self.stats.depth = len(self._queue)
+            frame, queued_at, _state = entry
+            try:
+                self._send(frame)
+            except Exception as e:
+                self._fail(e)
+                return
+            waited = (time.perf_counter() - queued_at) * 1000.0
+            st = self.stats
+            st.sent += 1
+            st.bytes_sent += len(frame)
+            st.latency_ms_last = waited
+            st.latency_ms_avg = waited if st.sent == 1 else st.latency_ms_avg + self.LATENCY_EWMA * (waited - st.latency_ms_avg)
+            if waited > st.latency_ms_max:
+                st.latency_ms_max = waited
+
+    def _fail(self, e: Exception) -> None:
+        self.close()
+        if self.on_error is not None:
+            try:
+                self.on_error(e)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Stop the writer thread; queued frames are discarded."""
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._state_entry = None
+            self.stats.depth = 0
+            self._cond.notify_all()
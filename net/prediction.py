@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+# Predicted and authoritative positions closer than this (px) are treated as
+# equal; rounding alone must never trigger a replay.
+DEFAULT_TOLERANCE = 2
+
+
+class InputHistory:
+    """Local inputs the server has not acknowledged yet (client prediction).
+
+    The local player moves immediately; every frame that moved it is
+    recorded with an increasing sequence number, the movement input
+    (dt, direction) and the position it produced. Outgoing updates carry the
+    newest sequence number ('in'); the server stores it with the player's
+    state and snapshots echo it back with the authoritative position.
+
+    reconcile() drops the acknowledged inputs and compares the position the
+    server reports for that input with the one predicted. When they differ
+    the player is put at the server position and the remaining inputs are
+    replayed on top of it through replay(pos, dt, dx, dy) -> pos.
+    """
+
+    def __init__(self, capacity: int = 256, tolerance: float = DEFAULT_TOLERANCE) -> None:
+        self.tolerance = tolerance
+        self.seq = 0
+        self.corrections = 0
+        # (seq, dt, dx, dy, x, y), oldest first
+        self._pending: deque = deque(maxlen=max(2, int(capacity)))
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, dt: float, dx: float, dy: float, x: float, y: float) -> int:
+        """Record one applied input and the position it led to; returns its seq."""
+        self.seq += 1
+        self._pending.append((self.seq, dt, dx, dy, x, y))
+        return self.seq
+
+    def reconcile(self, ack, server_x, server_y,
+                  replay: Callable[[Tuple[float, float], float, float, float], Tuple[float, float]]
+                  ) -> Optional[Tuple[float, float]]:
+        """Apply the server's view of input ack; returns the corrected position,
+        or None when the prediction held (or ack is unknown/already handled)."""
+        try:
+            ack = int(ack)
+        except (TypeError, ValueError):
+            return None
+        pending = self._pending
+        predicted = None
+        while pending and pending[0][0] <= ack:
+            entry = pending.popleft()
+            if entry[0] == ack:
+                predicted = entry
+        if predicted is None:
+            return None
+        try:
+            sx, sy = float(server_x), float(server_y)
+        except (TypeError, ValueError):
+            return None
+        if abs(sx - predicted[4]) <= self.tolerance and abs(sy - predicted[5]) <= self.tolerance:
+            return None
+        self.corrections += 1
+        pos = (sx, sy)
+        replayed = deque(maxlen=pending.maxlen)
+        for seq, dt, dx, dy, _x, _y in pending:
+            pos = replay(pos, dt, dx, dy)
+            replayed.append((seq, dt, dx, dy, pos[0], pos[1]))
+        self._pending = replayed
+        return pos
@@ -1,230 +1,263 @@
 from __future__ import annotations
 
 import json
-from typing import List, Optional, Tuple
-from core.contracts import GameState
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from core.contracts import GameState, PlayerSnapshot
+from server_core.codecs import (JSON_CODEC, LEGACY, PROTOCOL_VERSION, Codec, decode_handshake, get_codec,
+                                handshake_codec)
+from server_core.protocol import BIN_CODEC, is_event_equip
 
 
-def parse_initial(resp: Optional[str]):
-    """Parse server's initial response.
+def _as_int(v, default: int = 0) -> int:
+    if type(v) is int:
+        return v
+    try:
+        return int(v)
+    except (TypeError, ValueError, OverflowError):
+        return default
 
-    Returns: (positions_list, player_index, role, round_start, winner)
-    positions_list entries are tuples: (x, y, state, frame, equip, equip_frame, name, occupied?)
+
+def _clean_name(name):
+    # names are free text; older senders could leave CSV metadata ('::') in them
+    if isinstance(name, str):
+        return name.split('::', 1)[0].strip()
+    return name
+
+
+_EMPTY = PlayerSnapshot()
+
+
+def snapshot_from(p: Dict[str, Any], base: Optional[PlayerSnapshot] = None) -> PlayerSnapshot:
+    """A player's wire fields (a JSON / bin1 row dict) as a PlayerSnapshot.
+
+    Fields p does not carry keep base's values (a delta row), or the
+    defaults without a base. One pass, no per-field exception handling.
     """
-    if resp is None:
-        return ([], None, None, None, None)
-    # Try JSON first
-    try:
-        j = json.loads(resp)
-        if isinstance(j, dict) and 'positions' in j:
-            positions = []
-            for p in j.get('positions', []):
-                try:
-                    x = int(p.get('x', 0))
-                except Exception:
-                    x = 0
-                try:
-                    y = int(p.get('y', 0))
-                except Exception:
-                    y = 0
-                state = p.get('state', 'down')
-                try:
-                    frame = int(p.get('frame', 0))
-                except Exception:
-                    frame = 0
-                equip = p.get('equip', 'None')
-                try:
-                    equip_frame = int(p.get('equip_frame', 0))
-                except Exception:
-                    equip_frame = 0
-                name = p.get('name')
-                occupied = p.get('occupied', True)
-                positions.append((x, y, state, frame, equip, equip_frame, name, occupied))
-            player_index = j.get('player_index')
-            role = j.get('role')
-            round_start = j.get('round_start')
-            winner = j.get('winner')
-            return (positions, player_index, role, round_start, winner)
-    except Exception:
-        pass
+    b = base if base is not None else _EMPTY
+    g = p.get
+    seq = g('in', b.input_seq)
+    return PlayerSnapshot(_as_int(g('x', b.x), b.x), _as_int(g('y', b.y), b.y), g('state', b.state),
+                          _as_int(g('frame', b.frame), b.frame), g('equip', b.equip),
+                          _as_int(g('equip_frame', b.equip_frame), b.equip_frame),
+                          _clean_name(g('name', b.name)), g('occupied', b.occupied),
+                          _as_int(seq, None) if seq is not None else None)
 
-    # CSV with trailing metadata separated by '::'
-    try:
-        parts = resp.rsplit('::', 4)
-    except Exception:
-        parts = [resp]
 
-    player_index = None
-    role = None
-    round_start = None
-    winner = None
+class SnapshotDecoder:
+    """Rebuilds full player state from the server's delta-compressed ticks.
 
-    if len(parts) == 5:
-        all_positions_str, player_idx_s, role_s, round_s, winner_s = parts
-        try:
-            player_index = int(player_idx_s)
-        except Exception:
-            player_index = None
-        role = role_s if role_s != 'None' else None
-        try:
-            round_start = int(round_s)
-        except Exception:
-            round_start = None
-        winner = winner_s if winner_s != 'None' else None
-    elif len(parts) == 4:
-        all_positions_str, role_s, round_s, winner_s = parts
-        role = role_s if role_s != 'None' else None
+    Keyframes ('key': true, with full 'positions') replace the state; deltas
+    patch the snapshot named by 'base'. Decoded snapshots are kept by sequence
+    number so deltas against any recently acknowledged baseline can be applied.
+    last_seq is what the client should send back as 'ack'. If a delta refers to
+    a baseline we no longer have, need_resync is set until a keyframe arrives.
+    Snapshots older than last_seq (reordered UDP datagrams, or a TCP tick
+    overtaken by a datagram) are not applied, but the one-shot events they
+    carry are kept in late_events for the caller to take. last_time_ms is the server
+    timestamp ('t') of the newest decoded snapshot, None from older servers.
+
+    States are lists of PlayerSnapshot; a delta only builds new snapshots for
+    the players it names and shares the others with its baseline.
+    """
+
+    def __init__(self, history: int = 64) -> None:
+        self.history = max(2, int(history))
+        self._states: 'OrderedDict[int, List[PlayerSnapshot]]' = OrderedDict()
+        self.last_seq: Optional[int] = None
+        self.last_time_ms: Optional[int] = None
+        self.need_resync = False
+        # (player index, equip, x, y) of events in the last tick that
+        # arrived after a newer one
+        self.late_events: List[Tuple[int, str, int, int]] = []
+
+    def apply(self, msg: Dict[str, Any]) -> Optional[List[PlayerSnapshot]]:
+        """Return the full positions list for msg, or None if undecodable."""
         try:
-            round_start = int(round_s)
+            seq = int(msg['seq'])
         except Exception:
-            round_start = None
-        winner = winner_s if winner_s != 'None' else None
-    else:
-        all_positions_str = parts[0]
+            return None
+        self.late_events = []
+        if self.last_seq is not None and seq <= self.last_seq:
+            # e.g. a TCP tick carrying a whistle, overtaken by the next tick
+            # sent as a datagram: too old to show, but its events still count
+            if seq not in self._states:
+                self.late_events = self._events_of(msg)
+            return None
+        if 'delta' not in msg:
+            state = [snapshot_from(p) for p in msg.get('positions', []) if isinstance(p, dict)]
+            self._store(seq, state, msg.get('t'))
+            self.need_resync = False
+            return state
+        base = self._states.get(msg.get('base'))
+        if base is None:
+            self.need_resync = True
+            return None
+        state = list(base)
+        changed = set()
+        for entry in msg.get('delta') or []:
+            try:
+                idx, fields = int(entry[0]), entry[1]
+            except Exception:
+                continue
+            while len(state) <= idx:
+                state.append(_EMPTY)
+            state[idx] = snapshot_from(fields, state[idx])
+            changed.add(idx)
+        self._store(seq, state, msg.get('t'))
+        # Events are one-shot: only report them on the tick that carried them,
+        # otherwise an unchanged baseline would replay a whistle every tick.
+        view = state
+        for idx, p in enumerate(state):
+            if idx not in changed and is_event_equip(p.equip):
+                if view is state:
+                    view = list(state)
+                view[idx] = p.replace(equip='None')
+        return view
 
-    positions = []
-    try:
-        if all_positions_str:
-            entries = all_positions_str.split('|')
-            for e in entries:
-                if not e:
-                    continue
-                parts_c = e.split(',')
+    def _events_of(self, msg: Dict[str, Any]) -> List[Tuple[int, str, int, int]]:
+        if 'delta' not in msg:
+            rows = [(i, snapshot_from(p)) for i, p in enumerate(msg.get('positions') or []) if isinstance(p, dict)]
+        else:
+            base = self._states.get(msg.get('base')) or []
+            rows = []
+            for entry in msg.get('delta') or []:
                 try:
-                    x = int(parts_c[0]); y = int(parts_c[1])
+                    idx, fields = int(entry[0]), entry[1]
                 except Exception:
                     continue
-                state = parts_c[2] if len(parts_c) >= 3 else 'down'
-                try:
-                    frame = int(parts_c[3]) if len(parts_c) >= 4 else 0
-                except Exception:
-                    frame = 0
-                equip_id = parts_c[4] if len(parts_c) >= 5 else 'None'
-                try:
-                    equip_frame = int(parts_c[5]) if len(parts_c) >= 6 else 0
-                except Exception:
-                    equip_frame = 0
-                name = parts_c[6] if len(parts_c) >= 7 else None
-                if isinstance(name, str):
-                    try:
-                        name = name.split('::')[0].strip()
-                    except Exception:
-                        name = name.strip()
-                positions.append((x, y, state, frame, equip_id, equip_frame, name))
+                rows.append((idx, snapshot_from(fields, base[idx] if idx < len(base) else None)))
+        return [(i, p.equip, p.x, p.y) for i, p in rows if is_event_equip(p.equip)]
+
+    def input_ack(self, player: int) -> Optional[int]:
+        """Input sequence number ('in') the newest snapshot reports for player."""
+        state = self._states.get(self.last_seq) if self.last_seq is not None else None
+        try:
+            return state[player].input_seq
+        except Exception:
+            return None
+
+    def _store(self, seq: int, state: List[PlayerSnapshot], time_ms=None) -> None:
+        self._states[seq] = state
+        while len(self._states) > self.history:
+            self._states.popitem(last=False)
+        if self.last_seq is None or seq > self.last_seq:
+            self.last_seq = seq
+            self.last_time_ms = time_ms
+
+
+def initial_codec(resp) -> Codec:
+    """The wire codec for the rest of the connection, from the server's
+    handshake (server_core.codecs.handshake_codec)."""
+    return handshake_codec(resp) if resp is not None else LEGACY
+
+
+def build_join_request(room: Optional[str] = None, create: Optional[Dict[str, Any]] = None,
+                       codecs: Optional[List[str]] = None) -> str:
+    """First message to a room-aware server: join room (None = any open room),
+    optionally creating it with create={'players': n, 'name': host}. It is
+    also the hello: codecs lists the wire formats this client speaks,
+    preferred first, and the server answers with the one it picked."""
+    msg: Dict[str, Any] = {'join': room, 'hello': PROTOCOL_VERSION, 'codecs': list(codecs or [BIN_CODEC, JSON_CODEC])}
+    if create:
+        msg['create'] = dict(create)
+    return json.dumps(msg)
+
+
+def initial_udp(resp: Optional[str]) -> Optional[Dict[str, int]]:
+    """The server's UDP state channel offer ({'port', 'token'}), if any."""
+    try:
+        j = json.loads(resp)
+        udp = j.get('udp') if isinstance(j, dict) else None
+        return {'port': int(udp['port']), 'token': int(udp['token'])} if isinstance(udp, dict) else None
     except Exception:
-        positions = []
-    return (positions, player_index, role, round_start, winner)
+        return None
+
+
+def parse_initial(resp: Optional[str]):
+    """Parse server's initial response.
+
+    Returns: (positions_list, player_index, role, round_start, winner)
+    positions_list entries are PlayerSnapshot objects.
+    """
+    j = decode_handshake(resp) if resp is not None else None
+    if j is None:
+        return ([], None, None, None, None)
+    positions = [snapshot_from(p) for p in j.get('positions') or [] if isinstance(p, dict)]
+    return (positions, j.get('player_index'), j.get('role'), j.get('round_start'), j.get('winner'))
 
 
-def parse_tick(resp: Optional[str]):
+def parse_tick(resp, decoder: Optional[SnapshotDecoder] = None, codec: Optional[Codec] = None):
     """Parse per-tick server broadcast.
 
     Returns: (positions_list, round_start, winner)
-    positions_list entries are tuples: (x, y, state, frame, equip, equip_frame, name, occupied?)
+    positions_list entries are PlayerSnapshot objects.
+
+    codec is the connection's wire codec (initial_codec); without one the
+    format is told from resp's first byte (JSON, bin1 bytes or legacy CSV).
+    Pass a SnapshotDecoder to accept delta-compressed ticks; a delta that
+    cannot be applied yields an empty positions list.
     """
     if resp is None:
         return ([], None, None)
-    try:
-        j = json.loads(resp)
-        if isinstance(j, dict) and 'positions' in j:
-            positions = []
-            for p in j.get('positions', []):
-                try:
-                    x = int(p.get('x', 0))
-                except Exception:
-                    x = 0
-                try:
-                    y = int(p.get('y', 0))
-                except Exception:
-                    y = 0
-                state = p.get('state', 'down')
-                try:
-                    frame = int(p.get('frame', 0))
-                except Exception:
-                    frame = 0
-                equip = p.get('equip', 'None')
-                try:
-                    equip_frame = int(p.get('equip_frame', 0))
-                except Exception:
-                    equip_frame = 0
-                name = p.get('name')
-                if isinstance(name, str):
-                    try:
-                        name = name.split('::')[0].strip()
-                    except Exception:
-                        name = name.strip()
-                occupied = p.get('occupied', True)
-                positions.append((x, y, state, frame, equip, equip_frame, name, occupied))
-            round_start = j.get('round_start')
-            winner = j.get('winner')
-            return (positions, round_start, winner)
-    except Exception:
-        pass
-
-    # CSV with metadata using '::'
-    try:
-        parts = resp.rsplit('::', 3)
-    except Exception:
-        parts = [resp]
-    round_start = None
-    winner = None
-    if len(parts) == 4:
-        all_positions_str, role_s, round_s, winner_s = parts
-        try:
-            round_start = int(round_s)
-        except Exception:
-            round_start = None
-        winner = winner_s if winner_s != 'None' else None
-    elif len(parts) == 3:
-        all_positions_str, round_s, winner_s = parts
-        try:
-            round_start = int(round_s)
-        except Exception:
-            round_start = None
-        winner = winner_s if winner_s != 'None' else None
+    j = (codec or LEGACY).decode_snapshot(resp)
+    if j is None:
+        return ([], None, None)
+    if decoder is not None and 'seq' in j:
+        positions = decoder.apply(j) or []
     else:
-        all_positions_str = parts[0]
-
-    positions = []
-    try:
-        if all_positions_str:
-            entries = all_positions_str.split('|')
-            for e in entries:
-                if not e:
-                    continue
-                parts_c = e.split(',')
-                try:
-                    x = int(parts_c[0]); y = int(parts_c[1])
-                except Exception:
-                    continue
-                state = parts_c[2] if len(parts_c) >= 3 else 'down'
-                try:
-                    frame = int(parts_c[3]) if len(parts_c) >= 4 else 0
-                except Exception:
-                    frame = 0
-                equip_id = parts_c[4] if len(parts_c) >= 5 else 'None'
-                try:
-                    equip_frame = int(parts_c[5]) if len(parts_c) >= 6 else 0
-                except Exception:
-                    equip_frame = 0
-                name = parts_c[6] if len(parts_c) >= 7 else None
-                if isinstance(name, str):
-                    try:
-                        name = name.split('::')[0].strip()
-                    except Exception:
-                        name = name.strip()
-                # assume occupied for legacy CSV responses
-                positions.append((x, y, state, frame, equip_id, equip_frame, name, True))
-    except Exception:
-        positions = []
-    return (positions, round_start, winner)
+        positions = [snapshot_from(p) for p in j.get('positions') or [] if isinstance(p, dict)]
+    return (positions, j.get('round_start'), j.get('winner'))
 
 
-def build_outgoing_strings(player, safe_name: str, state: Optional[GameState] = None) -> Tuple[str, str]:
-    """Build outgoing payload for a player's current state.
+class Tick:
+    """One server snapshot, parsed off the render thread (decode_tick).
 
-    Returns a tuple of (json_string, csv_fallback_string).
+    positions (PlayerSnapshot objects), round_start and winner are
+    parse_tick's result. seq and resync are what the client echoes back as
+    'ack' / 'resync' and time_ms is the server timestamp (None from servers
+    that do not stamp). events lists the one-shot WHISTLE / CAUGHT:<idx>
+    entries the snapshot carried, as (player index, equip, x, y). late is
+    true for a snapshot that arrived after a newer one: it carries only its
+    events (the decoder's late_events) and must not replace the newer state.
     """
+
+    __slots__ = ('positions', 'round_start', 'winner', 'seq', 'resync', 'time_ms', 'events', 'late')
+
+    def __init__(self, positions, round_start=None, winner=None, seq=None, resync=False, time_ms=None,
+                 events=(), late=False) -> None:
+        self.positions = positions
+        self.round_start = round_start
+        self.winner = winner
+        self.seq = seq
+        self.resync = resync
+        self.time_ms = time_ms
+        self.events = events
+        self.late = late
+
+
+def decode_tick(resp, decoder: Optional[SnapshotDecoder] = None, codec: Optional[Codec] = None) -> Optional[Tick]:
+    """parse_tick as a Tick; None when resp holds nothing new (a snapshot
+    older than one decoder already decoded, with no events)."""
+    if resp is None:
+        return None
+    before = decoder.last_seq if decoder is not None else None
+    positions, round_start, winner = parse_tick(resp, decoder, codec)
+    events = [(i, p.equip, p.x, p.y) for i, p in enumerate(positions) if is_event_equip(p.equip)]
+    if decoder is None:
+        return Tick(positions, round_start, winner, events=events)
+    if decoder.late_events:
+        late, decoder.late_events = decoder.late_events, []
+        return Tick([], events=late, late=True)
+    if not positions and before is not None and decoder.last_seq == before and not decoder.need_resync:
+        return None
+    return Tick(positions, round_start, winner, decoder.last_seq, decoder.need_resync, decoder.last_time_ms,
+                events)
+
+
+def _outgoing_fields(player, safe_name: str, state: Optional[GameState] = None) -> Dict[str, Any]:
+    """Collect the player's current state as an update dict (without acks)."""
     try:
         px, py = int(player.hitbox.centerx), int(player.hitbox.centery)
     except Exception:
@@ -259,7 +292,7 @@ def build_outgoing_strings(player, safe_name: str, state: Optional[GameState] =
     except Exception:
         frame = 0
 
-    payload_obj = {
+    return {
         'x': px,
         'y': py,
         'state': getattr(player, 'state', 'down'),
@@ -268,11 +301,80 @@ def build_outgoing_strings(player, safe_name: str, state: Optional[GameState] =
         'equip_frame': equip_frame,
         'name': safe_name or ''
     }
+
+
+class OutgoingTracker:
+    """Decides when the local player's state is worth sending.
+
+    An update is due when position, animation state/frame, equip or name
+    changed since the last one sent, when heartbeat_s has passed without a
+    send (so the server still receives acks and liveness from an idle
+    player), or at once for a one-shot event (caught_target / whistle_emit)
+    or a resync request. A heartbeat of 0 sends every frame, as before.
+    """
+
+    def __init__(self, heartbeat_s: float = 0.5) -> None:
+        self.heartbeat_s = max(0.0, float(heartbeat_s))
+        self._last_key: Optional[Tuple[Any, ...]] = None
+        self._last_sent = float('-inf')
+        self.sent = 0
+        self.skipped = 0
+
+    def due(self, player, safe_name: str, state: Optional[GameState] = None, now: Optional[float] = None) -> bool:
+        """True if an update should be sent now; records it as sent if so."""
+        if now is None:
+            now = time.monotonic()
+        f = _outgoing_fields(player, safe_name, state)
+        key = (f['x'], f['y'], f['state'], f['frame'], f['equip'], f['equip_frame'], f['name'])
+        urgent = is_event_equip(f['equip']) or (state is not None and state.resync)
+        if (not urgent and self.heartbeat_s and key == self._last_key
+                and now - self._last_sent < self.heartbeat_s):
+            self.skipped += 1
+            return False
+        self._last_key = key
+        self._last_sent = now
+        self.sent += 1
+        return True
+
+
+def build_outgoing_strings(player, safe_name: str, state: Optional[GameState] = None) -> Tuple[str, str]:
+    """Build outgoing payload for a player's current state.
+
+    Returns a tuple of (json_string, csv_fallback_string).
+    """
+    payload_obj = _outgoing_fields(player, safe_name, state)
+    # acknowledge the newest decoded snapshot so the server can send deltas
+    if state is not None and state.ack_seq is not None:
+        payload_obj['ack'] = state.ack_seq
+    if state is not None and state.resync:
+        payload_obj['resync'] = True
+    # newest input reflected in this state, echoed back in snapshots
+    if state is not None and state.input_seq is not None:
+        payload_obj['in'] = state.input_seq
     try:
         j = json.dumps(payload_obj)
     except Exception:
         j = ''
     # CSV fallback mirrors legacy format; strip commas from name
     csv_name = (safe_name or '').replace(',', '')
-    csv = f"{px},{py},{payload_obj['state']},{frame},{equip_id},{equip_frame},{csv_name}"
+    csv = f"{payload_obj['x']},{payload_obj['y']},{payload_obj['state']},{payload_obj['frame']},{payload_obj['equip']},{payload_obj['equip_frame']},{csv_name}"
     return j, csv
+
+
+def build_outgoing_binary(player, safe_name: str, state: Optional[GameState] = None) -> bytes:
+    """Build the bin1 encoding of the same update build_outgoing_strings makes.
+
+    Only send this to servers that advertised BIN_CODEC in their handshake.
+    """
+    return build_outgoing(player, safe_name, state, get_codec(BIN_CODEC))
+
+
+def build_outgoing(player, safe_name: str, state: Optional[GameState] = None, codec: Optional[Codec] = None):
+    """The player's update in the connection's wire codec (initial_codec):
+    a str for JSON / CSV, bytes for bin1. Without a codec it is JSON."""
+    fields = _outgoing_fields(player, safe_name, state)
+    if state is not None and state.input_seq is not None:
+        fields['in'] = state.input_seq
+    ack = state.ack_seq if state is not None else None
+    resync = bool(state.resync) if state is not None else False
+    return (codec or LEGACY).encode_update(fields, ack=ack, resync=resync)
@@ -1,47 +1,123 @@
+import logging
 import socket
 from settings import *
 import time
 import threading
-import queue
+from collections import deque
+from net.framing import FrameDecoder, FrameError, encode_frame, encode_datagram, decode_datagram
+from net.sync import initial_udp, initial_codec, build_join_request, SnapshotDecoder, decode_tick
+from net.clock import ClockSync
+from net.outbound import UpdateWriter
+from net.discovery import DiscoveryService, DISCOVER_MSG, DISCOVER_RESP_PREFIX
 
-DISCOVER_MSG = b"DISCOVER_REQUEST"
-DISCOVER_RESP_PREFIX = b"DISCOVER_RESPONSE::"
+logger = logging.getLogger(__name__)
 
 
 class Network:
     """Simple TCP client with a background receiver thread.
 
     - connect() performs the initial blocking handshake and returns the server's
-      initial reply.
+      initial reply. It first sends a join request for room (None = any open
+      room); servers without rooms ignore it. The request is also the hello
+      offering codecs (WIRE_CODECS by default): the server's reply names
+      the wire codec used for every later message both ways (self.codec,
+      see server_core/codecs.py).
+    - Messages are length-prefixed frames (see net/framing.py) so broadcasts
+      that TCP coalesces or splits are reassembled exactly.
     - After connecting, a background thread reads server broadcasts and
-      buffers them into an internal queue. Call get_latest() to poll the
-      most recent buffered message (non-blocking).
-    - send(data, wait_for_reply=False) will by default just send data and
-      return immediately. If wait_for_reply=True it will block and try to
-      read a reply (keeps compatibility with legacy behavior).
+      decodes each one (delta baselines included, see net.sync.decode_tick)
+      into a single-slot mailbox: get_latest() returns the newest Tick not
+      yet taken, or None (non-blocking), and never lets stale snapshots pile
+      up. The one-shot events (WHISTLE / CAUGHT) of every snapshot also go
+      into a bounded queue drained by get_events(), so taking only the
+      newest snapshot does not lose any.
+    - send(data, wait_for_reply=False) will by default queue data and
+      return immediately; a writer thread (net/outbound.py) does the
+      socket send, so a full send buffer never stalls the caller. Queued
+      plain state updates collapse to the newest, other frames keep their
+      order; send_stats() reports how long frames waited. If
+      wait_for_reply=True it sends directly and blocks to read a reply
+      (keeps compatibility with legacy behavior).
+    - If the handshake offers the UDP state channel, send_update() sends
+      state updates as datagrams once the server has been heard from over
+      UDP (until then they go over TCP with a periodic hello). Snapshots
+      received over UDP land in the same mailbox as TCP ones. Pass
+      reliable=True for updates carrying an event.
+    - A background thread pings the server over the TCP connection; the
+      receiver thread feeds the pongs to a ClockSync (net/clock.py) instead of
+      the inbox. server_now_ms() is the estimated server clock.
+    - When the server closes the connection or a send fails, the whole
+      connection is closed (writer, receivers, pinger) and closed turns
+      true, so the game can leave instead of running on a dead socket.
     """
-    def __init__(self, server_ip, server_port):
+    # seconds between UDP hellos while the channel is not confirmed yet
+    UDP_HELLO_INTERVAL = 0.5
+    # clock pings: a quick burst after connecting, then one every PING_INTERVAL s
+    PING_BURST = 5
+    PING_BURST_INTERVAL = 0.2
+    PING_INTERVAL = 2.0
+    # events kept for get_events(); the oldest go first if the game stalls
+    EVENT_QUEUE = 256
+
+    def __init__(self, server_ip, server_port, use_udp=True, room=None, create=None, codecs=None):
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            # small frames at frame rate; do not let Nagle hold them back
+            self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception:
+            pass
         self.server = server_ip
         self.port = server_port
+        self.room = room
+        self._create = create
+        self._codecs = list(codecs) if codecs else list(WIRE_CODECS)
         self.addr = (self.server, self.port)
+        self._decoder = FrameDecoder()
+        # the frame path and the clock pinger share the TCP socket
+        self._send_lock = threading.Lock()
+        self.clock = ClockSync()
+        self._closed = False
         # perform initial connect+handshake (blocking)
         self.pos = self.connect()
+        self.codec = initial_codec(self.pos)
+        self._writer = UpdateWriter(self._send_frame, on_error=self._send_failed)
 
-        # inbox for incoming server messages (strings)
-        self._inbox = queue.Queue()
+        # newest decoded snapshot not yet taken, and undelivered events; the
+        # TCP and UDP receive threads share the decoder under _decode_lock
+        self.snapshots = SnapshotDecoder()
+        self._decode_lock = threading.Lock()
+        self._mailbox = threading.Condition()
+        self._latest = None
+        self._latest_seq = None
+        self._events = deque(maxlen=self.EVENT_QUEUE)
+        self.events_dropped = 0
+        # snapshots decoded, whether or not get_latest() took them
+        self.ticks_decoded = 0
         self._recv_thread = threading.Thread(target=self._recv_loop, daemon=True)
         self._recv_thread_stop = threading.Event()
         self._recv_thread.start()
 
+        self._udp = None
+        self._udp_token = None
+        self._udp_ready = False
+        self._udp_send_seq = 0
+        self._udp_recv_seq = 0
+        self._udp_next_hello = 0.0
+        if use_udp:
+            self._open_udp(initial_udp(self.pos))
+        if self.pos is not None:
+            threading.Thread(target=self._clock_loop, daemon=True).start()
+
     def getPos(self):
         return self.pos
 
     def connect(self):
         try:
             self.client.connect(self.addr)
+            self.client.sendall(encode_frame(build_join_request(self.room, self._create, self._codecs)))
             # initial reply from server (blocking) — return to caller
-            return self.client.recv(2048).decode("utf-8")
+            frame = self._decoder.recv_frame(self.client)
+            return frame.decode("utf-8") if frame is not None else None
         except socket.error as e:
             print(str(e))
 
@@ -49,62 +125,210 @@ class Network:
         # background receive loop that buffers incoming messages
         while not self._recv_thread_stop.is_set():
             try:
-                data = self.client.recv(4096)
-                if not data:
+                # a single recv_into can complete several broadcasts
+                frames = self._decoder.recv_frames(self.client)
+                if frames is None:
                     # remote closed
                     break
-                try:
-                    s = data.decode('utf-8')
-                except Exception:
-                    s = None
-                if s is not None:
-                    # push into inbox (non-blocking)
-                    try:
-                        self._inbox.put_nowait(s)
-                    except Exception:
-                        # if queue full or other error, drop this message
-                        pass
+                for frame in frames:
+                    if ClockSync.is_pong(frame):
+                        self.clock.handle_pong(frame)
+                        continue
+                    self._deliver(frame)
+            except FrameError:
+                # stream is out of sync; nothing after this can be trusted
+                break
             except Exception:
                 # small sleep to avoid busy loop on persistent errors
                 time.sleep(0.01)
-        # ensure socket closed on exit
+        # the server is gone (or the stream is unusable): stop everything else
+        self.close()
+
+    def _open_udp(self, info):
+        if not info:
+            return
         try:
-            self.client.close()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect((self.server, info['port']))
         except Exception:
-            pass
+            return
+        self._udp = sock
+        self._udp_token = info['token']
+        t = threading.Thread(target=self._udp_recv_loop, daemon=True)
+        t.start()
 
-    def send(self, data, wait_for_reply=False):
-        try:
-            self.client.sendall(str.encode(data))
-            if wait_for_reply:
+    def _udp_recv_loop(self):
+        while not self._recv_thread_stop.is_set():
+            try:
+                data = self._udp.recv(65536)
+            except Exception:
+                if self._recv_thread_stop.is_set():
+                    break
+                time.sleep(0.01)
+                continue
+            decoded = decode_datagram(data)
+            if decoded is None:
+                continue
+            token, seq, payload = decoded
+            if token != self._udp_token:
+                continue
+            self._udp_ready = True
+            # drop datagrams that arrive after a newer one
+            if seq <= self._udp_recv_seq:
+                continue
+            self._udp_recv_seq = seq
+            self._deliver(payload)
+
+    def _deliver(self, msg):
+        # decode on the receive thread with the negotiated codec; the game
+        # only takes finished Ticks
+        with self._decode_lock:
+            try:
+                tick = decode_tick(msg, self.snapshots, self.codec)
+            except Exception:
+                return
+        if tick is None:
+            return
+        with self._mailbox:
+            self.ticks_decoded += 1
+            if tick.events:
+                free = self._events.maxlen - len(self._events)
+                if len(tick.events) > free:
+                    self.events_dropped += len(tick.events) - free
+                self._events.extend(tick.events)
+            # a late tick only adds its events; the TCP and UDP threads may
+            # also publish out of decode order
+            if tick.late:
+                return
+            if tick.seq is None or self._latest_seq is None or tick.seq >= self._latest_seq:
+                self._latest = tick
+                self._latest_seq = tick.seq
+                self._mailbox.notify()
+
+    def _clock_loop(self):
+        sent = 0
+        while not self._recv_thread_stop.is_set():
+            try:
+                with self._send_lock:
+                    self.client.sendall(encode_frame(ClockSync.build_ping()))
+            except Exception:
+                break
+            sent += 1
+            self._recv_thread_stop.wait(self.PING_BURST_INTERVAL if sent < self.PING_BURST else self.PING_INTERVAL)
+
+    def server_now_ms(self):
+        """Estimated server time in epoch ms (local clock until the first pong)."""
+        return self.clock.server_now_ms()
+
+    @property
+    def udp_ready(self):
+        """True once datagrams from the server have been received."""
+        return self._udp_ready
+
+    def send_update(self, data, reliable=False):
+        """Send a state update, over UDP when the channel is up.
+
+        Updates carrying an event must pass reliable=True so they stay on TCP.
+        """
+        if self._udp is not None:
+            if self._udp_ready and not reliable:
                 try:
-                    reply = self.client.recv(2048).decode("utf-8")
-                    return reply
+                    self._udp_send_seq += 1
+                    self._udp.send(encode_datagram(self._udp_token, self._udp_send_seq, data))
+                    return
                 except Exception:
-                    return None
+                    pass
+            elif not self._udp_ready:
+                now = time.monotonic()
+                if now >= self._udp_next_hello:
+                    self._udp_next_hello = now + self.UDP_HELLO_INTERVAL
+                    try:
+                        # seq 0 only registers our address with the server
+                        self._udp.send(encode_datagram(self._udp_token, 0))
+                    except Exception:
+                        pass
+        self._writer.push(encode_frame(data), state=not reliable)
+
+    def _send_frame(self, frame):
+        # writer thread
+        with self._send_lock:
+            self.client.sendall(frame)
+
+    def _send_failed(self, e):
+        # writer thread, which has already stopped
+        if not self._closed:
+            logger.warning("Send to %s:%s failed, closing the connection: %s", self.server, self.port, e)
+        self.close()
+
+    @property
+    def closed(self):
+        """True once the connection was closed, by close() or because it failed."""
+        return self._closed
+
+    def send_stats(self):
+        """Outbound queue counters, including how long frames waited (ms)."""
+        return self._writer.stats.as_dict()
+
+    def send(self, data, wait_for_reply=False):
+        if not wait_for_reply:
+            self._writer.push(encode_frame(data), state=False)
             return None
+        try:
+            with self._send_lock:
+                self.client.sendall(encode_frame(data))
+            try:
+                frame = self._decoder.recv_frame(self.client)
+                return frame.decode("utf-8") if frame is not None else None
+            except Exception:
+                return None
         except socket.error as e:
             print(str(e))
             return None
 
+    def recv(self, timeout=None):
+        """Block up to timeout seconds for the next snapshot (a Tick, None if none)."""
+        with self._mailbox:
+            if self._latest is None:
+                self._mailbox.wait(timeout)
+            tick, self._latest = self._latest, None
+        return tick
+
     def get_latest(self):
-        """Return the most recent buffered message or None if none available."""
-        last = None
-        try:
-            while True:
-                last = self._inbox.get_nowait()
-        except queue.Empty:
-            return last
+        """Newest decoded snapshot (a net.sync.Tick) not taken yet, or None."""
+        with self._mailbox:
+            tick, self._latest = self._latest, None
+        return tick
+
+    def get_events(self):
+        """One-shot events received since the last call, oldest first, as
+        (player index, equip, x, y)."""
+        with self._mailbox:
+            events = list(self._events)
+            self._events.clear()
+        return events
 
     def close(self):
+        self._closed = True
         try:
             self._recv_thread_stop.set()
         except Exception:
             pass
+        self._writer.close()
+        try:
+            # shutdown first: close() alone does not reach the server while the
+            # receiver thread is still blocked on the socket
+            self.client.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
         try:
             self.client.close()
         except Exception:
             pass
+        if self._udp is not None:
+            try:
+                self._udp.close()
+            except Exception:
+                pass
 
 
 if __name__ == "__main__":
@@ -114,50 +338,16 @@ if __name__ == "__main__":
 
 def discover_servers(timeout=2.0):
     """Broadcast a UDP discovery request on the LAN and collect responses.
-    Returns a list of dicts: [{'ip': ip, 'port': port}, ...]
+    Returns a list of dicts, one per open room, nearest server first:
+    [{'ip': ip, 'port': port, 'name': host, 'room': id, 'players': n, 'max': m, 'rtt_ms': ms}, ...]
+    ('room', 'players' and 'max' are None for servers without rooms).
+
+    Blocks for timeout seconds; UIs should run a DiscoveryService
+    (net/discovery.py) instead and read its results as they arrive.
     """
-    results = []
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    service = DiscoveryService(DISCOVERY_PORT, port).start()
     try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        sock.settimeout(0.5)
-        # send to broadcast address
-        try:
-            sock.sendto(DISCOVER_MSG, ('<broadcast>', DISCOVERY_PORT))
-        except Exception:
-            # some platforms prefer using empty string for broadcast
-            try:
-                sock.sendto(DISCOVER_MSG, ('255.255.255.255', DISCOVERY_PORT))
-            except Exception:
-                pass
-
-        end = time.time() + timeout
-        seen = set()
-        while time.time() < end:
-            try:
-                data, addr = sock.recvfrom(1024)
-                if data.startswith(DISCOVER_RESP_PREFIX):
-                    try:
-                        payload = data[len(DISCOVER_RESP_PREFIX):].decode('utf-8')
-                        parts = payload.split('::')
-                        ip = parts[0]
-                        pport = int(parts[1]) if len(parts) > 1 else port
-                        name = parts[2] if len(parts) > 2 else None
-                        key = (ip, pport)
-                        if key not in seen:
-                            seen.add(key)
-                            results.append({'ip': ip, 'port': pport, 'name': name, 'addr': addr})
-                    except Exception:
-                        # ignore malformed responses
-                        pass
-            except socket.timeout:
-                # loop until full timeout
-                continue
-            except Exception:
-                break
+        time.sleep(timeout)
+        return service.results()
     finally:
-        try:
-            sock.close()
-        except Exception:
-            pass
-    return results
\ No newline at end of file
+        service.stop()
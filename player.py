@@ -3,6 +3,7 @@ import pygame
 import os
 from os import walk
 from util.resource_path import resource_path
+from net.interpolation import InterpolationBuffer
 
 
 class Player(pygame.sprite.Sprite):
@@ -56,6 +57,9 @@ class Player(pygame.sprite.Sprite):
         except Exception:
             self._last_received_frame = None
             self._last_received_ts = 0
+        # timestamped network positions of a remote player; drawn with a small
+        # delay by interpolate() when the server stamps its snapshots
+        self._interp = InterpolationBuffer(max_extrapolate_ms=INTERP_MAX_EXTRAPOLATE_MS)
         self.speed = 500
         self.collision_sprites = collision_sprites
         # Whether this player is controlled locally (reads keyboard). Remote players
@@ -423,19 +427,48 @@ class Player(pygame.sprite.Sprite):
         except Exception:
             pass
 
-    def set_remote_state(self, pos, state, frame_index, equip_frame=0):
+    def replay_input(self, pos, dt, dx, dy):
+        """Re-apply one recorded input from pos (client reconciliation):
+        same move() and collisions as live input; returns the new center."""
+        saved = (self.direction.x, self.direction.y)
+        try:
+            self.hitbox.center = (round(pos[0]), round(pos[1]))
+            self.direction.x, self.direction.y = dx, dy
+            self.move(dt)
+        finally:
+            self.direction.x, self.direction.y = saved
+        return self.hitbox.center
+
+    def interpolate(self, render_ms):
+        """Place a remote player at its buffered position for render_ms
+        (server time, see net.interpolation.RenderClock)."""
+        xy = self._interp.sample(render_ms) if len(self._interp) else None
+        if xy is None:
+            return
+        try:
+            self.hitbox.center = (round(xy[0]), round(xy[1]))
+            self.rect.center = self.hitbox.center
+        except Exception:
+            pass
+
+    def set_remote_state(self, pos, state, frame_index, equip_frame=0, server_ms=None):
         """Apply remote player's position and animation state.
 
         pos: (x, y) tuple (center coordinates)
         state: animation state string ('up','down','left','right')
         frame_index: integer frame index (will be clamped)
+        server_ms: server timestamp of the snapshot; when given the position
+        is buffered and applied by interpolate() instead of snapped to
         """
         # Update position (prefer hitbox if available)
-        try:
-            self.hitbox.center = (int(pos[0]), int(pos[1]))
-            self.rect.center = self.hitbox.center
-        except Exception:
-            self.rect.center = (int(pos[0]), int(pos[1]))
+        if server_ms is not None:
+            self._interp.push(server_ms, pos[0], pos[1])
+        else:
+            try:
+                self.hitbox.center = (int(pos[0]), int(pos[1]))
+                self.rect.center = self.hitbox.center
+            except Exception:
+                self.rect.center = (int(pos[0]), int(pos[1]))
 
         # Update animation state/frame
         if state in self.frames:
@@ -174,10 +174,11 @@ class HUDRenderer:
         g = self.g
         try:
             if timer_seconds is None:
-                try:
+                roster = getattr(g, 'roster', None)
+                if roster:
+                    joined = sum(1 for p in roster if p.occupied)
+                else:
                     joined = 1 + len(getattr(g, 'remote_map', {}))
-                except Exception:
-                    joined = 1
                 text = f"Waiting for other players — {joined}/{NUM_PLAYERS}"
             else:
                 elapsed = float(timer_seconds)
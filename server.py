@@ -1,3 +1,4 @@
+import os
 import socket
 from _thread import *
 import sys
@@ -6,11 +7,24 @@ from settings import *
 import threading
 import logging
 import json
-import copy
-from server_core.protocol import read_pos, make_pos
-from server_core.broadcaster import broadcast_state
+from server_core.protocol import make_pos, parse_join
+from server_core.broadcaster import publish_session
+from server_core.ticker import TickScheduler
+from server_core.delta import DeltaEncoder
 from server_core.session import Session
-from server_core.rounds import manage_round
+from server_core.players import PlayerTable
+from server_core.rounds import RoundScheduler
+from server_core.handlers import apply_client_message
+from server_core.outbound import ConnectionWriter
+from server_core.udp_channel import UdpStateChannel
+from server_core.interest import InterestManager
+from server_core.rooms import RoomManager, DEFAULT_ROOM, JOIN_TIMEOUT
+from server_core.metrics import ServerMetrics
+from server_core.control import ControlServer
+from server_core.payloads import build_initial_payload, build_broadcast_payload
+from net.framing import FrameDecoder, encode_frame
+from core.simulation import CollisionWorld, WORLD_TMX
+from util.resource_path import resource_path
 
 # Server logger: by default we silence server-side logs. The client may enable
 # or display logs as needed. To enable server logging for debugging set a
@@ -43,6 +57,39 @@ try:
                 NUM_PLAYERS = int(sys.argv[i + 1])
             except Exception:
                 pass
+        if a == '--tick-hz' and i + 1 < len(sys.argv):
+            try:
+                SERVER_TICK_HZ = float(sys.argv[i + 1])
+            except Exception:
+                pass
+        if a == '--engine' and i + 1 < len(sys.argv):
+            ENGINE = sys.argv[i + 1]
+        if a == '--udp-port' and i + 1 < len(sys.argv):
+            try:
+                UDP_PORT = int(sys.argv[i + 1])
+            except Exception:
+                pass
+        if a == '--no-udp':
+            UDP_STATE_CHANNEL = False
+        if a == '--catch-check':
+            SERVER_CATCH_CHECK = True
+        if a == '--no-catch-check':
+            SERVER_CATCH_CHECK = False
+        if a == '--rooms' and i + 1 < len(sys.argv):
+            try:
+                EXTRA_ROOMS = max(0, int(sys.argv[i + 1]) - 1)
+            except Exception:
+                pass
+        if a == '--aoi-radius' and i + 1 < len(sys.argv):
+            try:
+                AOI_RADIUS = float(sys.argv[i + 1])
+            except Exception:
+                pass
+        if a == '--control-port' and i + 1 < len(sys.argv):
+            try:
+                CONTROL_PORT = int(sys.argv[i + 1])
+            except Exception:
+                pass
         if a == '--host-name' and i + 1 < len(sys.argv):
             try:
                 HOST_NAME = sys.argv[i + 1]
@@ -51,6 +98,25 @@ try:
 except Exception:
     pass
 
+# Server engine: 'threaded' (one thread per client, default) or 'asyncio'
+# (single event loop, see server_core/async_engine.py).
+try:
+    ENGINE
+except NameError:
+    ENGINE = 'threaded'
+
+# UDP state channel port; shares the TCP port number unless overridden.
+try:
+    UDP_PORT
+except NameError:
+    UDP_PORT = port
+
+# Rooms opened at start-up besides the default one (--rooms N opens N in total).
+try:
+    EXTRA_ROOMS
+except NameError:
+    EXTRA_ROOMS = 0
+
 # default host name if not provided
 try:
     HOST_NAME
@@ -93,9 +159,36 @@ def _get_local_ip():
     return ip
 
 
+# (time, host ip, replies) of the last _discovery_responses() call; clients
+# re-broadcast while their server list is open, so replies are reused briefly
+_discovery_cache = (0.0, None, [])
+DISCOVERY_CACHE_S = 0.25
+
+
+def _discovery_responses(host_ip=None):
+    """Discovery replies, one per open room:
+    DISCOVER_RESPONSE::<ip>::<port>::<host name>::<room id>::<players>/<max>.
+    Older clients read the first three fields only.
+    """
+    global _discovery_cache
+    if host_ip is None:
+        host_ip = server if server and server not in ('0.0.0.0', '') else _get_local_ip()
+    now = time.monotonic()
+    cached_at, cached_ip, cached = _discovery_cache
+    if cached_ip == host_ip and now - cached_at < DISCOVERY_CACHE_S:
+        return cached
+    # include host name in discovery response so clients can show it
+    out = []
+    for room in rooms.open_rooms():
+        name = room.host_name or HOST_NAME
+        out.append(f"DISCOVER_RESPONSE::{host_ip}::{port}::{name}::{room.room_id}::{room.players}/{room.session.num_players}".encode('utf-8'))
+    _discovery_cache = (now, host_ip, out)
+    return out
+
+
 def _start_discovery_responder():
     """Start a background UDP listener that replies to discovery broadcasts.
-    Responds with: DISCOVER_RESPONSE::<ip>::<port>
+    Responds with one DISCOVER_RESPONSE datagram per open room.
     """
     def _responder():
         try:
@@ -116,9 +209,8 @@ def _start_discovery_responder():
                         continue
                     try:
                         if data.strip() == b'DISCOVER_REQUEST':
-                            # include host name in discovery response so clients can show it
-                            resp = f"DISCOVER_RESPONSE::{host_ip}::{port}::{HOST_NAME}".encode('utf-8')
-                            dsock.sendto(resp, addr)
+                            for reply in _discovery_responses(host_ip):
+                                dsock.sendto(reply, addr)
                     except Exception:
                         continue
                 except Exception:
@@ -131,24 +223,6 @@ def _start_discovery_responder():
     t.start()
 
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-try:
-    s.bind((server, port))
-except socket.error as e:
-    logger.error(str(e))
-
-# Start discovery responder so clients can find this server via UDP broadcasts
-try:
-    _start_discovery_responder()
-except Exception:
-    pass
-
-
-# Listen for the configured number of players
-s.listen(NUM_PLAYERS)
-logger.info(f"Waiting for connections (expecting {NUM_PLAYERS})... Server Started")
-
 # Server round state is now encapsulated in a Session object.
 
 # default pos now represented as a dict (JSON-friendly)
@@ -165,196 +239,250 @@ default_pos = {
     'name': '',
     'occupied': False,
 }
-# create a list of default positions sized to NUM_PLAYERS. Each entry will be
+# Each room's positions list is sized to its player count. Each entry will be
 # replaced by the player's latest reported state (and marked occupied) when
 # data is received from a connected client.
-pos = [copy.deepcopy(default_pos) for _ in range(NUM_PLAYERS)]
-# track frozen state server-side (False == not frozen)
-frozen = [False for _ in range(NUM_PLAYERS)]
+def _new_session(num_players):
+    """Fresh authoritative state for one room."""
+    # every slot starts as default_pos; frozen state is tracked server-side
+    # in the same table (see server_core/players.py)
+    players = PlayerTable(num_players, default=default_pos)
+    # Snapshots are delta-compressed against what each client acknowledged.
+    # Clients that accept the UDP channel send updates and receive snapshots as
+    # datagrams; events and handshakes stay on TCP.
+    # With an AOI radius each client only receives players near it (plus frozen
+    # players and anyone in a recent event).
+    return Session(num_players=num_players, players=players, delta=DeltaEncoder(),
+                   udp=udp_channel,
+                   interest=InterestManager(AOI_RADIUS) if AOI_RADIUS > 0 else None,
+                   metrics=metrics, rounds=round_scheduler, world=collision_world,
+                   catch_slack=CATCH_SLACK_PX)
+
+
+# One UDP state channel serves every room.
+udp_channel = UdpStateChannel(logger=logger) if UDP_STATE_CHANNEL else None
+
+def _load_collision_world():
+    """The map's collision model (core/simulation.py), for catch checks."""
+    for path in (resource_path(WORLD_TMX), os.path.join(os.path.dirname(os.path.abspath(__file__)), WORLD_TMX)):
+        try:
+            return CollisionWorld.from_tmx(path)
+        except Exception:
+            continue
+    logger.warning('Could not load %s; catches are not checked', WORLD_TMX)
+    return None
+
+
+# Collision model of the map shared by every room; None = accept catches as
+# reported.
+collision_world = _load_collision_world() if SERVER_CATCH_CHECK else None
+
+# Traffic counters shared by every room, served on the control port.
+metrics = ServerMetrics()
+
+# Hide phase and catch windows of every room run as deadlines on one
+# scheduler; catches wake it directly and the final state is broadcast as
+# soon as a round has a winner.
+round_scheduler = RoundScheduler(logger, on_round_end=lambda s: publish_session(s, None, force=True))
+
+# Rooms: every match is its own Session behind this one port. The default room
+# keeps single-match behaviour for older clients; --rooms N opens extra rooms
+# and clients may create more from the join request (up to MAX_ROOMS).
+rooms = RoomManager(_new_session, NUM_PLAYERS, max_rooms=MAX_ROOMS, logger=logger)
+rooms.add(DEFAULT_ROOM, NUM_PLAYERS, HOST_NAME)
+for _n in range(1, EXTRA_ROOMS + 1):
+    rooms.add(f'room{_n}', NUM_PLAYERS, f'{HOST_NAME} #{_n + 1}')
+
+# Fixed-rate snapshot loop: one snapshot per tick per room fanned out to every
+# client, instead of a broadcast per received message. Disabled with --tick-hz 0.
+tick_scheduler = TickScheduler(SERVER_TICK_HZ, rooms.publish_all, logger,
+                               extra_stats=rooms.outbound_stats) if SERVER_TICK_HZ > 0 else None
+
+
+def _start_control_listener():
+    """Serve live metrics and profiler commands on 127.0.0.1:CONTROL_PORT
+    (see server_core/control.py). --control-port 0 disables it."""
+    if CONTROL_PORT <= 0:
+        return
+    try:
+        ControlServer(metrics, rooms, tick_scheduler, udp_channel,
+                      extra=lambda: {'engine': ENGINE}, logger=logger).start_thread('127.0.0.1', CONTROL_PORT)
+    except Exception as e:
+        logger.error("Control listener disabled: %s", e)
+
+
+def _read_join(conn, decoder):
+    """Wait briefly for a join request; older clients send nothing first.
+
+    Returns (request, frame): frame is a first message that was not a join
+    request and still has to be handled.
+    """
+    try:
+        conn.settimeout(JOIN_TIMEOUT)
+        frame = decoder.recv_frame(conn)
+    except Exception:
+        return None, None
+    finally:
+        try:
+            conn.settimeout(None)
+        except Exception:
+            pass
+    request = parse_join(frame) if frame is not None else None
+    return request, (frame if request is None else None)
 
-# Initialize session wrapper around authoritative state
-session = Session(num_players=NUM_PLAYERS, pos=pos, frozen=frozen)
 
-def threaded_client(conn, player, session: Session):
-    # send initial positions plus this client's index, role and round start:
+def threaded_client(conn):
+    decoder = FrameDecoder()
+    request, early = _read_join(conn, decoder)
+    room = rooms.choose(request)
+    player = room.claim_slot() if room is not None else None
+    if player is None:
+        try:
+            conn.sendall(encode_frame(json.dumps({'error': 'room full' if room is not None else 'no such room'})))
+        except Exception:
+            pass
+        conn.close()
+        return
+    session = room.session
     # first connected (player 0) is the seeker, all others are hidders
     role = 'seeker' if player == 0 else 'hidder'
-    # send initial state as JSON so clients can parse safely
+    # If this connection filled the room's last slot, start the round.
+    if player == session.num_players - 1:
+        start_ms = int(time.time() * 1000) + 30000
+        session.reset_for_new_round(start_ms)
+        logger.info(f"All {session.num_players} players connected to room {room.room_id} — starting round at {session.round_start_ms}")
+        # the round scheduler enforces the per-hidder timers
+        round_scheduler.start_round(session)
+    # broadcasts go through a per-connection writer thread with a bounded
+    # queue, so a slow client cannot block the tick or the other players;
+    # it is evicted (and this loop sees EOF) if it fails or stalls
+    writer = ConnectionWriter(conn, on_evict=session.remove_connection, name=f'{room.room_id}/{player}', logger=logger,
+                              player=player)
+    udp = None
+    if session.udp is not None and session.udp.port is not None:
+        writer.udp = session.udp.register(writer, player, role, session)
+        udp = session.udp.handshake_info(writer.udp)
+    # the wire codec for the rest of this connection, from the client's hello
+    codec = session.negotiate_codec(writer, request)
+    # send initial positions plus this client's index, role and round start
+    # as JSON so clients can parse safely
+    state = session.snapshot()
     try:
-        initial_payload = {
-            'positions': session.pos,
-            'player_index': player,
-            'role': role,
-            'round_start': session.round_start_ms,
-            'winner': session.winner_index
-        }
-        conn.send(json.dumps(initial_payload).encode('utf-8'))
+        initial_payload = build_initial_payload(state.positions, player, role, state.round_start_ms, state.winner_index,
+                                                session.codecs, udp, room.room_id, codec)
+        conn.sendall(encode_frame(json.dumps(initial_payload)))
     except Exception:
         try:
             # fallback to older CSV-style reply for compatibility
-            all_positions = "|".join([make_pos((p['x'], p['y'], p['state'], p['frame'], p['equip'], p['equip_frame'], p.get('name',''))) for p in session.pos])
-            initial = all_positions + "::" + str(player) + "::" + role + "::" + str(session.round_start_ms) + "::" + (str(session.winner_index) if session.winner_index is not None else 'None')
-            conn.send(str.encode(initial))
+            all_positions = "|".join([make_pos((p['x'], p['y'], p['state'], p['frame'], p['equip'], p['equip_frame'], p.get('name',''))) for p in state.positions])
+            initial = all_positions + "::" + str(player) + "::" + role + "::" + str(state.round_start_ms) + "::" + (str(state.winner_index) if state.winner_index is not None else 'None')
+            conn.sendall(encode_frame(initial))
         except Exception:
             pass
-    reply = "" 
+    session.connections.append(writer)
+    if early is not None:
+        _handle_message(writer, player, role, session, early)
     while True:
         try:
-            raw = conn.recv(2048).decode("utf-8")
-            # try to parse JSON update from client; fall back to CSV parser
-            data = None
-            try:
-                parsed = json.loads(raw)
-                if isinstance(parsed, dict) and 'x' in parsed:
-                    # expected JSON update
-                    # coerce types
-                    try:
-                        parsed['x'] = int(parsed.get('x', 0))
-                    except Exception:
-                        parsed['x'] = 0
-                    try:
-                        parsed['y'] = int(parsed.get('y', 0))
-                    except Exception:
-                        parsed['y'] = 0
-                    try:
-                        parsed['frame'] = int(parsed.get('frame', 0))
-                    except Exception:
-                        parsed['frame'] = 0
-                    parsed['equip'] = parsed.get('equip', 'None')
-                    parsed['equip_frame'] = int(parsed.get('equip_frame', 0)) if parsed.get('equip_frame') is not None else 0
-                    parsed['name'] = str(parsed.get('name', '') or '')
-                    data = parsed
-            except Exception:
-                data = None
-
-            if data is None:
-                # fallback to CSV-style message
-                data = read_pos(raw)
-
-            # store incoming data and mark this slot occupied
-            try:
-                # ensure we preserve keys and set occupied flag
-                if isinstance(data, dict):
-                    data['occupied'] = True
-                    session.pos[player] = data
-                else:
-                    # fallback for older CSV-style payloads: convert to dict
-                    p = data
-                    new = {'x': p.get('x', 0) if isinstance(p, dict) else p[0],
-                           'y': p.get('y', 0) if isinstance(p, dict) else p[1],
-                           'state': p.get('state', 'down') if isinstance(p, dict) else (p[2] if len(p) > 2 else 'down'),
-                           'frame': int(p.get('frame', 0)) if isinstance(p, dict) else (int(p[3]) if len(p) > 3 else 0),
-                           'equip': p.get('equip', 'None') if isinstance(p, dict) else (p[4] if len(p) > 4 else 'None'),
-                           'equip_frame': int(p.get('equip_frame', 0)) if isinstance(p, dict) else (int(p[5]) if len(p) > 5 else 0),
-                           'name': p.get('name','') if isinstance(p, dict) else (p[6] if len(p) > 6 else ''),
-                           'occupied': True}
-                    session.pos[player] = new
-            except Exception:
-                session.pos[player] = data
-            logger.debug("data=%s", data)
-            # If sender included a targeted CAUGHT event (format 'CAUGHT:<idx>')
-            # and the sender is allowed to catch (we treat player 0 as seeker),
-            # apply the caught state server-side so broadcasts are authoritative.
-            try:
-                equip_id = data.get('equip') if isinstance(data, dict) else None
-            except Exception:
-                equip_id = None
-            try:
-                if isinstance(equip_id, str) and equip_id.startswith('CAUGHT:'):
-                    # parse target index
-                    try:
-                        target_idx = int(equip_id.split(':', 1)[1])
-                    except Exception:
-                        target_idx = None
-                    # only process valid targets
-                    if target_idx is not None and 0 <= target_idx < NUM_PLAYERS:
-                        # Only accept CAUGHT from seeker role to avoid cheating
-                        # role variable is computed earlier for this connection
-                        if role == 'seeker' and not session.frozen[target_idx]:
-                            session.frozen[target_idx] = True
-                            logger.info("Player %s frozen by seeker %s", target_idx, player)
-                            # mark the target's pos equip field to CAUGHT:<target_idx> so clients will see who was caught
-                            try:
-                                # pos entries are dicts
-                                session.pos[target_idx]['equip'] = f'CAUGHT:{target_idx}'
-                            except Exception:
-                                try:
-                                    # fallback for older tuple entries
-                                    p = session.pos[target_idx]
-                                    session.pos[target_idx] = {'x': p[0], 'y': p[1], 'state': p[2], 'frame': p[3], 'equip': f'CAUGHT:{target_idx}', 'equip_frame': p[5], 'name': p[6] if len(p) >=7 else ''}
-                                except Exception:
-                                    pass
-                            # compute winner: if all non-seeker players frozen, record seeker as winner
-                            try:
-                                non_seekers = [i for i in range(session.num_players) if i != 0]
-                                if all(session.frozen[i] for i in non_seekers):
-                                    session.winner_index = 0
-                            except Exception:
-                                pass
-            except Exception:
-                pass
- 
-            if not data:
-                logger.info("Disconnected")
-                break
-            else:
-                # build the authoritative positions payload for all clients (JSON)
-                logger.debug("Broadcasting JSON state")
-                try:
-                    broadcast_state(session.connections, session.pos, role, session.round_start_ms, session.winner_index)
-                except Exception:
-                    # fallback: send to this connection only
-                    try:
-                        payload = {
-                            'positions': session.pos,
-                            'role': role,
-                            'round_start': session.round_start_ms,
-                            'winner': session.winner_index
-                        }
-                        conn.send(json.dumps(payload).encode('utf-8'))
-                    except Exception:
-                        pass
-        except:
+            # one recv_into may complete several frames (or none yet)
+            frames = decoder.recv_frames(conn)
+        except Exception:
             break
+        if frames is None:
+            logger.info("Disconnected")
+            break
+        for frame in frames:
+            _handle_message(writer, player, role, session, frame)
 
     logger.info("Lost connection")
+    session.remove_connection(writer)
+    writer.close()
     conn.close()
+    rooms.release(room)
+
 
+def _handle_message(conn, player, role, session: Session, raw):
+    """Apply one decoded client message to the session.
 
-def _round_manager_adapter():
-    # Delegate to extracted round manager with our session object
+    With a tick scheduler running the update is only staged and goes out with
+    the next tick's snapshot; otherwise it is broadcast immediately.
+    """
+    data = apply_client_message(session, player, role, raw, logger, conn=conn)
+    if not data or tick_scheduler is not None:
+        return
+    # build the authoritative positions payload for all clients (JSON)
+    logger.debug("Broadcasting JSON state")
     try:
-        manage_round(session, logger)
-        # broadcast final state so clients update promptly
+        publish_session(session, role, force=True)
+    except Exception:
+        # fallback: send to this connection only
         try:
-            broadcast_state(session.connections, session.pos, None, session.round_start_ms, session.winner_index)
+            state = session.published
+            payload = build_broadcast_payload(state.positions, role, state.round_start_ms, state.winner_index)
+            conn.sendall(encode_frame(json.dumps(payload)))
         except Exception:
             pass
-    except Exception:
-        logger.exception('Round manager failed')
 
-currentPlayer = 0
-while True:
-    conn, addr = s.accept()
-    logger.info("Connected to: %s:%s", addr[0], addr[1])
-    # keep a global list of connections to support broadcasting
+
+def _handle_datagram(ep, payload):
+    """UDP state channel handler: same path as a TCP frame from that client."""
+    _handle_message(ep.conn, ep.player, ep.role, ep.session, payload)
+
+
+def _serve_threaded():
+    """Legacy engine: blocking accept loop with one thread per client."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    try:
+        s.bind((server, port))
+    except socket.error as e:
+        logger.error(str(e))
+
+    # Start discovery responder so clients can find this server via UDP broadcasts
     try:
-        session.connections.append(conn)
+        _start_discovery_responder()
     except Exception:
-        session.connections = [conn]
-    # If we've now reached the configured number of players, start the round.
-    # Note: currentPlayer is 0-based; when it equals NUM_PLAYERS - 1 the most
-    # recent connection filled the expected slots.
-    if currentPlayer == (NUM_PLAYERS - 1):
-        start_ms = int(time.time() * 1000) + 30000
-        session.reset_for_new_round(start_ms)
-        # start the round manager thread that will enforce per-hidder timers
+        pass
+
+    if udp_channel is not None:
+        udp_channel.handler = _handle_datagram
         try:
-            t = threading.Thread(target=_round_manager_adapter, daemon=True)
-            t.start()
+            udp_channel.start_thread(server, UDP_PORT)
+        except Exception as e:
+            logger.error("UDP state channel disabled: %s", e)
+
+    if tick_scheduler is not None:
+        tick_scheduler.start_thread()
+    round_scheduler.start_thread()
+
+    # Listen for the configured number of players
+    s.listen(max(NUM_PLAYERS, 16))
+    logger.info(f"Waiting for connections ({len(rooms.rooms)} room(s) of {NUM_PLAYERS})... Server Started")
+
+    while True:
+        conn, addr = s.accept()
+        logger.info("Connected to: %s:%s", addr[0], addr[1])
+        try:
+            # snapshots are small frames; send each at once (asyncio streams
+            # already do this)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         except Exception:
             pass
-    logger.info(f"All {NUM_PLAYERS} players connected — starting round at {session.round_start_ms}")
+        # threaded_client reads the join request, claims a slot in the room
+        # and adds the connection to its session once the initial state is sent
+        start_new_thread(threaded_client, (conn,))
+
+
+_start_control_listener()
 
-    start_new_thread(threaded_client, (conn, currentPlayer, session))
-    currentPlayer += 1
\ No newline at end of file
+if ENGINE == 'asyncio':
+    from server_core.async_engine import AsyncGameServer
+    AsyncGameServer(rooms, server, port, logger,
+                    tick_scheduler=tick_scheduler,
+                    round_scheduler=round_scheduler,
+                    discovery_port=DISCOVERY_PORT,
+                    discovery_responses=_discovery_responses,
+                    udp_channel=udp_channel,
+                    udp_port=UDP_PORT).serve_forever()
+else:
+    _serve_threaded()
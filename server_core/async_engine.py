@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+from net.framing import FrameDecoder, FrameError, encode_frame
+from .broadcaster import publish_session
+from .handlers import apply_client_message
+from .outbound import DEFAULT_MAX_QUEUE, DEFAULT_STALL_TIMEOUT, OutboundStats
+from .payloads import build_initial_payload
+from .protocol import parse_join
+from .rooms import JOIN_TIMEOUT
+from .rounds import RoundScheduler
+
+
+class StreamConnection:
+    """Socket-like wrapper around an asyncio StreamWriter with a bounded queue.
+
+    The asyncio counterpart of server_core.outbound.ConnectionWriter:
+    sendall() queues the frame without blocking (a state=True snapshot
+    replaces a queued one, other frames are never dropped and a connection
+    that lets max_queue of them pile up is evicted), and a drain task writes
+    frames one at a time. A write that fails, or a drain that does not finish within
+    stall_timeout, evicts the connection (transport aborted, on_evict called).
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, max_queue: int = DEFAULT_MAX_QUEUE,
+                 stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+                 on_evict: Optional[Callable[['StreamConnection'], None]] = None, name: str = '', logger=None,
+                 player: Optional[int] = None) -> None:
+        self.writer = writer
+        self.max_queue = max(1, int(max_queue))
+        self.stall_timeout = stall_timeout
+        self.on_evict = on_evict
+        self.logger = logger
+        self.stats = OutboundStats(name=name)
+        # player index, used for area-of-interest filtering
+        self.player = player
+        # UdpEndpoint when the client joined the UDP state channel
+        self.udp = None
+        # wire codec picked in the hello (server_core.codecs); None = legacy detection
+        self.codec = None
+        # [frame, is_state]
+        self._queue: deque = deque()
+        self._state_entry: Optional[list] = None
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task = asyncio.get_running_loop().create_task(self._drain_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def sendall(self, data: bytes, state: bool = False) -> None:
+        if self._closed or self.writer.is_closing():
+            raise ConnectionError('connection closed')
+        if state and self._state_entry is not None:
+            self._queue.remove(self._state_entry)
+            self.stats.dropped += 1
+        elif len(self._queue) >= self.max_queue:
+            self.evict('outbound queue full (%d frames)' % self.max_queue)
+            raise ConnectionError('connection evicted')
+        entry = [data, state]
+        self._queue.append(entry)
+        if state:
+            self._state_entry = entry
+        self.stats.queued += 1
+        self.stats.depth = len(self._queue)
+        if self.stats.depth > self.stats.max_depth:
+            self.stats.max_depth = self.stats.depth
+        self._wakeup.set()
+
+    async def _drain_loop(self) -> None:
+        while not self._closed:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            entry = self._queue.popleft()
+            if entry is self._state_entry:
+                self._state_entry = None
+            data = entry[0]
+            self.stats.depth = len(self._queue)
+            try:
+                self.writer.write(data)
+                await asyncio.wait_for(self.writer.drain(), self.stall_timeout)
+            except asyncio.TimeoutError:
+                self.evict('send stalled for more than %.1fs' % self.stall_timeout)
+                return
+            except Exception as e:
+                self.evict('send failed: %s' % e)
+                return
+            self.stats.sent += 1
+            self.stats.bytes_sent += len(data)
+
+    def evict(self, reason: str = '') -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.stats.evicted = True
+        self._queue.clear()
+        self._state_entry = None
+        self.stats.depth = 0
+        self._wakeup.set()
+        if self.logger and reason:
+            self.logger.info("Evicting connection %s: %s", self.stats.name, reason)
+        try:
+            # abort so the reader coroutine sees EOF instead of waiting
+            self.writer.transport.abort()
+        except Exception:
+            pass
+        if self.on_evict is not None:
+            try:
+                self.on_evict(self)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self._closed = True
+        self._queue.clear()
+        self._state_entry = None
+        self.stats.depth = 0
+        self._wakeup.set()
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Answers LAN discovery broadcasts from the event loop."""
+
+    def __init__(self, request: bytes, responses: Callable[[], Iterable[bytes]]) -> None:
+        self.request = request
+        self.responses = responses
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data, addr) -> None:
+        try:
+            if data.strip() == self.request:
+                for reply in self.responses():
+                    self.transport.sendto(reply, addr)
+        except Exception:
+            pass
+
+
+class AsyncGameServer:
+    """Single event loop hosting every room: clients, round managers and discovery.
+
+    Each accepted connection gets a StreamReader/StreamWriter pair and a
+    coroutine instead of a dedicated thread; it is placed in a room of the
+    RoomManager from its join request (server_core.rooms). With a
+    tick_scheduler the snapshot fan-out runs as a loop task at the tick rate;
+    without one every batch of received frames is broadcast straight away.
+    A UDP state channel, if given, is served on the same loop (udp_port,
+    default the TCP port). Message handling and round rules are shared with
+    the threaded engine (server_core.handlers / rounds); the round_scheduler
+    runs as a loop task (one is created if not given).
+    """
+
+    def __init__(self, rooms, host: str, port: int, logger=None,
+                 tick_scheduler=None,
+                 round_scheduler: Optional[RoundScheduler] = None,
+                 discovery_port: Optional[int] = None,
+                 discovery_responses: Optional[Callable[[], Iterable[bytes]]] = None,
+                 udp_channel=None,
+                 udp_port: Optional[int] = None) -> None:
+        self.rooms = rooms
+        self.host = host
+        self.port = port
+        self.logger = logger
+        self.tick_scheduler = tick_scheduler
+        self.discovery_port = discovery_port
+        self.discovery_responses = discovery_responses
+        self.udp_channel = udp_channel
+        self.udp_port = port if udp_port is None else udp_port
+        self.round_scheduler = round_scheduler or RoundScheduler(
+            logger, on_round_end=lambda s: self._broadcast(s, None))
+
+    def serve_forever(self) -> None:
+        asyncio.run(self.run())
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.discovery_port is not None and self.discovery_responses is not None:
+            try:
+                dsock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                dsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                dsock.bind(('', self.discovery_port))
+                await loop.create_datagram_endpoint(
+                    lambda: _DiscoveryProtocol(b'DISCOVER_REQUEST', self.discovery_responses), sock=dsock)
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Discovery responder failed to start')
+        if self.udp_channel is not None:
+            self.udp_channel.handler = self._handle_datagram
+            try:
+                await self.udp_channel.start_async(self.host, self.udp_port)
+            except Exception:
+                if self.logger:
+                    self.logger.exception('UDP state channel failed to start')
+        if self.tick_scheduler is not None:
+            loop.create_task(self.tick_scheduler.run_async())
+        loop.create_task(self.round_scheduler.run_async())
+        server = await asyncio.start_server(self._handle_client, self.host or None, self.port,
+                                            backlog=max(16, self.rooms.default_players))
+        if self.logger:
+            self.logger.info("Waiting for connections (%s room(s) of %s)... Server Started (asyncio)",
+                             len(self.rooms.rooms), self.rooms.default_players)
+        async with server:
+            await server.serve_forever()
+
+    def _broadcast(self, session, role) -> None:
+        publish_session(session, role, force=True)
+
+    def _start_round(self, room) -> None:
+        s = room.session
+        s.reset_for_new_round(int(time.time() * 1000) + 30000)
+        if self.logger:
+            self.logger.info("All %s players connected to room %s — starting round at %s",
+                             s.num_players, room.room_id, s.round_start_ms)
+        self.round_scheduler.start_round(s)
+
+    def _handle_datagram(self, ep, payload: bytes) -> None:
+        if apply_client_message(ep.session, ep.player, ep.role, payload, self.logger, conn=ep.conn) is None:
+            return
+        if self.tick_scheduler is None:
+            self._broadcast(ep.session, ep.role)
+
+    async def _read_join(self, reader: asyncio.StreamReader, decoder: FrameDecoder):
+        """Wait briefly for a join request; older clients send nothing first.
+
+        Returns (request, frames): frames were read along with (or instead
+        of) the join request and still have to be handled.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + JOIN_TIMEOUT
+        frames = []
+        while not frames:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None, []
+            try:
+                data = await asyncio.wait_for(reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                return None, []
+            if not data:
+                raise ConnectionError('closed before joining')
+            frames = decoder.feed(data)
+        request = parse_join(frames[0])
+        return request, (frames[1:] if request is not None else frames)
+
+    def _apply_frames(self, session, player, role, conn, frames) -> None:
+        changed = False
+        for frame in frames:
+            if apply_client_message(session, player, role, frame, self.logger, conn=conn) is not None:
+                changed = True
+        # every frame read in this batch is applied before one broadcast
+        if changed and self.tick_scheduler is None:
+            try:
+                self._broadcast(session, role)
+            except Exception:
+                pass
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self.logger:
+            peer = writer.get_extra_info('peername') or ('?', '?')
+            self.logger.info("Connected to: %s:%s", peer[0], peer[1])
+        decoder = FrameDecoder()
+        try:
+            request, early = await self._read_join(reader, decoder)
+        except (ConnectionError, FrameError):
+            writer.close()
+            return
+        room = self.rooms.choose(request)
+        player = room.claim_slot() if room is not None else None
+        if player is None:
+            try:
+                writer.write(encode_frame(json.dumps({'error': 'room full' if room is not None else 'no such room'})))
+                writer.close()
+            except Exception:
+                pass
+            return
+        session = room.session
+        role = 'seeker' if player == 0 else 'hidder'
+        conn = StreamConnection(writer, on_evict=session.remove_connection, name=f'{room.room_id}/{player}',
+                                logger=self.logger, player=player)
+        if player == session.num_players - 1:
+            self._start_round(room)
+
+        udp = None
+        if self.udp_channel is not None and self.udp_channel.port is not None:
+            conn.udp = self.udp_channel.register(conn, player, role, session)
+            udp = self.udp_channel.handshake_info(conn.udp)
+        codec = session.negotiate_codec(conn, request)
+        try:
+            state = session.snapshot()
+            initial = build_initial_payload(state.positions, player, role, state.round_start_ms, state.winner_index,
+                                            session.codecs, udp, room.room_id, codec)
+            conn.sendall(encode_frame(json.dumps(initial)))
+        except Exception:
+            pass
+        # joined to the broadcast list only after the initial state is queued,
+        # so the handshake is always the first frame the client receives
+        session.connections.append(conn)
+
+        try:
+            if early:
+                self._apply_frames(session, player, role, conn, early)
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                self._apply_frames(session, player, role, conn, decoder.feed(data))
+        except (ConnectionError, FrameError):
+            pass
+        finally:
+            if self.logger:
+                self.logger.info("Lost connection")
+            session.remove_connection(conn)
+            conn.close()
+            self.rooms.release(room)
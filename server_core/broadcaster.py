@@ -1,24 +1,126 @@
 from __future__ import annotations
 
 import json
-from typing import List
+import time
+from typing import List, Tuple
+from .delta import row_dict
 from .payloads import build_broadcast_payload
+from .protocol import is_event_equip
+from net.framing import encode_frame
 
 
-def broadcast_state(connections, pos, role, round_start_ms, winner_index):
-    """Broadcast authoritative state to all connections (JSON)."""
+def broadcast_state(connections, pos, role, round_start_ms, winner_index, encoder=None, channel=None, interest=None):
+    """Broadcast authoritative state to all connections (JSON).
+
+    pos is the players as dicts or as rows in delta.FIELDS order
+    (PublishedState.rows).
+
+    With a DeltaEncoder each connection receives the snapshot relative to its
+    acknowledged baseline, in its negotiated format (JSON or bin1);
+    connections sharing both share one encoded frame.
+
+    Connections are ConnectionWriters (server_core.outbound) or
+    StreamConnections, so sendall() only queues the frame; a connection that
+    fails or stalls is evicted from the list by its writer rather than
+    retried here. Snapshots without events are queued with state=True, so a
+    newer one may replace them; event snapshots are never dropped. A
+    connection with a UDP endpoint (c.udp) gets the snapshot as a datagram
+    instead, unless the snapshot carries a one-shot event: those ticks go
+    over TCP so the event is not dropped with a datagram. The next tick's
+    datagram can still arrive first; the client then takes the events out of
+    the late TCP tick (net.sync.SnapshotDecoder.late_events).
+
+    interest, when given, maps a connection to the set of player indices it
+    should receive (None = everyone); see server_core.interest.
+
+    Returns (messages, bytes) handed to connections and the UDP channel.
+    """
+    if encoder is not None:
+        return _broadcast_deltas(connections, pos, role, round_start_ms, winner_index, encoder, channel, interest)
     try:
-        payload = build_broadcast_payload(pos, role, round_start_ms, winner_index)
+        positions = [row_dict(p) if type(p) is tuple else p for p in pos]
+        payload = build_broadcast_payload(positions, role, round_start_ms, winner_index)
+        payload['t'] = int(time.time() * 1000)
         bstr = json.dumps(payload)
+        state = not any(is_event_equip(p.get('equip')) for p in positions)
     except Exception:
         bstr = ''
     if not bstr:
-        return
+        return 0, 0
+    # encode and frame once; sendall so a short write cannot split a frame
+    frame = encode_frame(bstr)
+    sent = 0
     try:
-        for c in connections:
+        # iterate a copy: an evicted writer removes itself from the list
+        for c in list(connections):
             try:
-                c.send(bstr.encode('utf-8'))
+                c.sendall(frame, state=state)
+                sent += 1
             except Exception:
                 pass
     except Exception:
         pass
+    return sent, sent * len(frame)
+
+
+def _broadcast_deltas(connections, pos, role, round_start_ms, winner_index, encoder, channel=None,
+                      interest=None) -> Tuple[int, int]:
+    sent = nbytes = 0
+    with encoder.lock:
+        seq = encoder.push(pos)
+        events = any(is_event_equip(row[4]) for row in encoder.view_rows())
+        reliable = channel is None or events
+        payloads = {}
+        frames = {}
+        for c in list(connections):
+            base = encoder.baseline(c)
+            view = interest(c) if interest is not None else None
+            key = (c in encoder.binary_peers, base, view, encoder.view_at(c, base) if view is not None else None)
+            payload = payloads.get(key)
+            if payload is None:
+                binary, base, view, prev = key
+                try:
+                    if binary:
+                        payload = encoder.binary_payload(base, round_start_ms, winner_index, view, prev)
+                    else:
+                        payload = json.dumps(encoder.payload(base, role, round_start_ms, winner_index, view, prev)).encode('utf-8')
+                except Exception:
+                    continue
+                payloads[key] = payload
+            encoder.remember_view(c, seq, view)
+            if not reliable and channel.send(getattr(c, 'udp', None), payload):
+                sent += 1
+                nbytes += len(payload)
+                continue
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = encode_frame(payload)
+            try:
+                c.sendall(frame, state=not events)
+                sent += 1
+                nbytes += len(frame)
+            except Exception:
+                pass
+    return sent, nbytes
+
+
+def publish_session(session, role=None, force=False) -> bool:
+    """Build one snapshot of the session and fan it out to every connection.
+
+    Used once per server tick (and per message when ticking is disabled).
+    Does nothing unless the session changed since the last publish or force
+    is set. Returns whether a snapshot was sent. The snapshot is the
+    session's newly published, immutable state, so the fan-out never holds
+    the session lock or sees a half-applied update. The fan-out is timed and
+    counted in session.metrics when set.
+    """
+    state = session.claim_publish(force)
+    if state is None:
+        return False
+    start = time.perf_counter()
+    msgs, nbytes = broadcast_state(session.connections, state.rows, role, state.round_start_ms,
+                                   state.winner_index, encoder=session.delta, channel=session.udp,
+                                   interest=session.interest_view(state))
+    if session.metrics is not None:
+        session.metrics.record_fanout((time.perf_counter() - start) * 1000.0, msgs, nbytes)
+    return True
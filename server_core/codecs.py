@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Union
+
+from .protocol import BIN_CODEC, BIN_MAGIC, decode_snapshot, decode_update, encode_update, read_pos
+
+# Version of the hello exchange: a client's join request carries
+# {"hello": PROTOCOL_VERSION, "codecs": [names, preferred first]} and the
+# server's handshake answers with the same key and the one codec it picked
+# ("codec"). Both ends then use that codec for every message of the
+# connection. Clients that send no hello get LEGACY, which tells the formats
+# apart by their first byte as older servers did.
+PROTOCOL_VERSION = 1
+JSON_CODEC = 'json'
+CSV_CODEC = 'csv'
+
+_BRACE = ord('{')
+
+Frame = Union[str, bytes, bytearray]
+
+
+def _first(frame: Frame) -> Optional[int]:
+    if not frame:
+        return None
+    c = frame[0]
+    return c if type(c) is int else ord(c)
+
+
+def _text(frame: Frame) -> Optional[str]:
+    if isinstance(frame, str):
+        return frame
+    try:
+        return bytes(frame).decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def _json(frame: Frame) -> Optional[Dict[str, Any]]:
+    try:
+        msg = json.loads(frame)
+    except ValueError:
+        return None
+    return msg if isinstance(msg, dict) else None
+
+
+class Codec(Protocol):
+    """One wire format for the messages of a connection.
+
+    decode_update() turns a client frame into the dict the server stores (or
+    a control message such as a clock ping), encode_update() builds that
+    frame on the client, and decode_snapshot() turns a server tick into the
+    JSON tick shape net.sync.parse_tick reads. Control frames (pings, pongs,
+    errors) are JSON on every codec. Malformed frames decode to None; no
+    codec falls back to another format. binary is true when the server
+    sends this connection bin1 snapshots.
+    """
+
+    name: str
+    binary: bool
+
+    def decode_update(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        ...
+
+    def encode_update(self, fields: Dict[str, Any], ack: Optional[int] = None, resync: bool = False) -> Frame:
+        ...
+
+    def decode_snapshot(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        ...
+
+
+class JsonCodec(Codec):
+    """JSON objects both ways (the default)."""
+
+    name = JSON_CODEC
+    binary = False
+
+    def decode_update(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        return _json(frame)
+
+    def encode_update(self, fields: Dict[str, Any], ack: Optional[int] = None, resync: bool = False) -> str:
+        msg = dict(fields)
+        if ack is not None:
+            msg['ack'] = ack
+        if resync:
+            msg['resync'] = True
+        return json.dumps(msg)
+
+    def decode_snapshot(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        return _json(frame)
+
+
+class CsvCodec(Codec):
+    """The pre-JSON format: 'x,y,state,frame,equip,equip_frame,name' updates
+    and 'row|row|...::role::round_start::winner' ticks.
+
+    CSV carries no acks, input numbers or occupied flags. Servers answer
+    CSV clients with JSON ticks, so frames starting with '{' are JSON.
+    """
+
+    name = CSV_CODEC
+    binary = False
+
+    def decode_update(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        text = _text(frame)
+        if text is None:
+            return None
+        return _json(text) if text[:1] == '{' else read_pos(text)
+
+    def encode_update(self, fields: Dict[str, Any], ack: Optional[int] = None, resync: bool = False) -> str:
+        name = str(fields.get('name') or '').replace(',', '')
+        return (f"{fields.get('x', 0)},{fields.get('y', 0)},{fields.get('state', 'down')},{fields.get('frame', 0)},"
+                f"{fields.get('equip', 'None')},{fields.get('equip_frame', 0)},{name}")
+
+    def decode_snapshot(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        text = _text(frame)
+        if text is None:
+            return None
+        if text[:1] == '{':
+            return _json(text)
+        parts = text.rsplit('::', 3)
+        msg: Dict[str, Any] = {'round_start': None, 'winner': None}
+        if len(parts) >= 3:
+            # 'rows::role::round::winner', or 'rows::round::winner'
+            msg['round_start'] = _int_or_none(parts[-2])
+            msg['winner'] = parts[-1] if parts[-1] != 'None' else None
+        msg['positions'] = csv_rows(parts[0])
+        return msg
+
+
+class Bin1Codec(Codec):
+    """bin1 struct records (server_core.protocol), for clients that offer it."""
+
+    name = BIN_CODEC
+    binary = True
+
+    def decode_update(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        if _first(frame) == BIN_MAGIC:
+            return decode_update(frame)
+        return _json(frame)
+
+    def encode_update(self, fields: Dict[str, Any], ack: Optional[int] = None, resync: bool = False) -> bytes:
+        return encode_update(fields, ack=ack, resync=resync)
+
+    def decode_snapshot(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        if _first(frame) != BIN_MAGIC:
+            return _json(frame)
+        try:
+            return decode_snapshot(frame)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            return None
+
+
+class LegacyCodec(Codec):
+    """For peers that predate the hello: each frame's first byte picks the
+    format (bin1 magic, '{' for JSON, anything else is CSV). Updates are
+    sent as JSON."""
+
+    name = 'legacy'
+    binary = False
+
+    def _codec(self, frame: Frame) -> Codec:
+        c = _first(frame)
+        if c == BIN_MAGIC:
+            return BIN1
+        return JSON if c == _BRACE else CSV
+
+    def decode_update(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        return self._codec(frame).decode_update(frame)
+
+    def encode_update(self, fields: Dict[str, Any], ack: Optional[int] = None, resync: bool = False) -> str:
+        return JSON.encode_update(fields, ack, resync)
+
+    def decode_snapshot(self, frame: Frame) -> Optional[Dict[str, Any]]:
+        return self._codec(frame).decode_snapshot(frame)
+
+
+_REGISTRY: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> Codec:
+    """Make codec negotiable under codec.name (replacing one of that name)."""
+    _REGISTRY[codec.name] = codec
+    return codec
+
+
+def get_codec(name) -> Optional[Codec]:
+    return _REGISTRY.get(name) if isinstance(name, str) else None
+
+
+def codec_names() -> List[str]:
+    return list(_REGISTRY)
+
+
+JSON = register_codec(JsonCodec())
+CSV = register_codec(CsvCodec())
+BIN1 = register_codec(Bin1Codec())
+LEGACY = LegacyCodec()
+
+
+def negotiate(offered, available: Iterable[str]) -> Codec:
+    """The first codec in offered (the client's preference order) that is
+    also in available and registered; JSON when none is."""
+    allowed = set(available)
+    for name in offered if isinstance(offered, (list, tuple)) else ():
+        codec = get_codec(name)
+        if codec is not None and name in allowed:
+            return codec
+    return JSON
+
+
+def _int_or_none(v) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def csv_rows(text: str) -> List[Dict[str, Any]]:
+    """Rows of a CSV positions list ('row|row|...'); unparsable rows are skipped."""
+    rows = []
+    for entry in text.split('|') if text else ():
+        row = read_pos(entry) if entry else None
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def decode_handshake(frame: Frame) -> Optional[Dict[str, Any]]:
+    """A server's handshake reply, before any codec is chosen.
+
+    JSON from current servers; the oldest servers reply
+    'rows::player_index::role::round_start::winner' (or without the index),
+    returned here in the JSON handshake's shape.
+    """
+    text = _text(frame) if frame is not None else None
+    if text is None:
+        return None
+    if text[:1] == '{':
+        return _json(text)
+    parts = text.rsplit('::', 4)
+    msg: Dict[str, Any] = {'player_index': None, 'role': None, 'round_start': None, 'winner': None}
+    if len(parts) >= 4:
+        if len(parts) == 5:
+            msg['player_index'] = _int_or_none(parts[1])
+        msg['role'] = parts[-3] if parts[-3] != 'None' else None
+        msg['round_start'] = _int_or_none(parts[-2])
+        msg['winner'] = parts[-1] if parts[-1] != 'None' else None
+    msg['positions'] = csv_rows(parts[0])
+    return msg
+
+
+def handshake_codec(frame: Frame) -> Codec:
+    """The codec a client uses once it read the server's handshake: the one
+    the server picked from its hello, else what an older server accepts
+    (bin1 if it advertised it, JSON, or CSV for the oldest)."""
+    msg = decode_handshake(frame)
+    if msg is None:
+        return JSON
+    if 'codec' in msg:
+        return get_codec(msg['codec']) or JSON
+    if _first(frame) != _BRACE:
+        return CSV
+    offered = msg.get('codecs')
+    return BIN1 if isinstance(offered, list) and BIN_CODEC in offered else JSON
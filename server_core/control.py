@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import SamplingProfiler
+
+HELP = """commands (one per line):
+  stats               counters as 'name value' lines
+  json                the same counters as one JSON object
+  profile start [HZ]  start the sampling profiler (default 100 Hz)
+  profile stop [N]    stop it; top N functions as lines (default 20)
+  profile json [N]    stop it; top functions and collapsed stacks as JSON
+  help                this text
+  quit                close the connection
+every reply ends with an empty line"""
+
+
+def round_state(session) -> Dict[str, Any]:
+    """Phase and counters of one room's round, as last published."""
+    state = session.published
+    now_ms = int(time.time() * 1000)
+    if state.winner_index is not None:
+        phase = 'over'
+    elif state.round_start_ms is None:
+        phase = 'waiting'
+    elif now_ms < state.round_start_ms:
+        phase = 'hiding'
+    else:
+        phase = 'seeking'
+    return {'phase': phase, 'round_start_ms': state.round_start_ms, 'winner': state.winner_index,
+            'frozen': bin(state.frozen).count('1'), 'connections': len(session.connections)}
+
+
+def _flatten(prefix: str, value, out: List[str]) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f'{prefix}.{k}' if prefix else str(k), v, out)
+    elif isinstance(value, (list, tuple)):
+        for i, v in enumerate(value):
+            _flatten(f'{prefix}.{i}', v, out)
+    else:
+        out.append(f'{prefix} {"null" if value is None else value}')
+
+
+class ControlServer:
+    """Local admin listener (settings.CONTROL_PORT) serving live metrics.
+
+    Line-oriented: a client sends commands ('stats', 'json', 'profile
+    start|stop', see HELP) and reads the reply up to an empty line, e.g.
+    `echo stats | nc 127.0.0.1 5557`. snapshot() collects ServerMetrics
+    counters, tick stats, per-room round state and queue depths, the UDP
+    channel counters and the thread count. Served from its own daemon
+    thread for both engines, so it still answers when the game loop is busy.
+    """
+
+    def __init__(self, metrics, rooms=None, tick_scheduler=None, udp_channel=None,
+                 extra: Optional[Callable[[], Dict[str, Any]]] = None, logger=None) -> None:
+        self.metrics = metrics
+        self.rooms = rooms
+        self.tick_scheduler = tick_scheduler
+        self.udp_channel = udp_channel
+        self.extra = extra
+        self.logger = logger
+        self.port: Optional[int] = None
+        self._profiler: Optional[SamplingProfiler] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {'traffic': self.metrics.as_dict(), 'threads': threading.active_count()}
+        if self.tick_scheduler is not None:
+            out['tick'] = self.tick_scheduler.stats.as_dict()
+        if self.udp_channel is not None:
+            out['udp'] = self.udp_channel.stats()
+        if self.rooms is not None:
+            rooms = {}
+            for room_id, room in list(self.rooms.rooms.items()):
+                s = room.session
+                queues = s.outbound_stats()
+                rooms[room_id] = {'players': room.players, 'max': s.num_players, 'round': round_state(s),
+                                  'queue_depth': sum(q['depth'] for q in queues),
+                                  'queue_max_depth': max((q['max_depth'] for q in queues), default=0),
+                                  'dropped': sum(q['dropped'] for q in queues),
+                                  'connections': queues}
+            out['rooms'] = rooms
+        if self.extra is not None:
+            try:
+                out.update(self.extra())
+            except Exception:
+                pass
+        return out
+
+    def handle(self, line: str) -> str:
+        """Run one command and return its reply (without the trailing blank line)."""
+        parts = line.split()
+        if not parts:
+            return ''
+        cmd, args = parts[0].lower(), parts[1:]
+        if cmd == 'stats':
+            lines: List[str] = []
+            _flatten('', self.snapshot(), lines)
+            return '\n'.join(lines)
+        if cmd == 'json':
+            return json.dumps(self.snapshot())
+        if cmd == 'profile' and args:
+            return self._profile(args[0].lower(), args[1:])
+        if cmd == 'help':
+            return HELP
+        return f'error unknown command {cmd!r} (try help)'
+
+    def _profile(self, action: str, args: List[str]) -> str:
+        if action not in ('start', 'stop', 'json'):
+            return f'error unknown profile action {action!r}'
+        try:
+            num = float(args[0]) if args else None
+        except ValueError:
+            return f'error bad number {args[0]!r}'
+        with self._lock:
+            if action == 'start':
+                if self._profiler is not None and self._profiler.running:
+                    return 'error profiler already running'
+                self._profiler = SamplingProfiler(num or 100.0)
+                self._profiler.start()
+                if self.logger:
+                    self.logger.info("Profiler started at %s Hz", self._profiler.hz)
+                return f'ok profiler started hz={self._profiler.hz}'
+            if self._profiler is None:
+                return 'error profiler not running'
+            report = self._profiler.stop(int(num or 20))
+            self._profiler = None
+        if action == 'json':
+            return json.dumps(report)
+        lines = [f"samples {report['samples']} duration_s {report['duration_s']} hz {report['hz']}"]
+        lines += [f"{t['pct']:5.1f}% {t['samples']:6d} {t['function']}" for t in report['top']]
+        return '\n'.join(lines)
+
+    def _serve_client(self, conn: socket.socket) -> None:
+        try:
+            with conn, conn.makefile('rw', encoding='utf-8', newline='\n') as f:
+                for line in f:
+                    if line.strip().lower() == 'quit':
+                        break
+                    try:
+                        reply = self.handle(line)
+                    except Exception as e:
+                        reply = f'error {e}'
+                    f.write(reply + '\n\n')
+                    f.flush()
+        except Exception:
+            pass
+
+    def start_thread(self, host: str, port: int) -> threading.Thread:
+        """Bind the listener (normally on 127.0.0.1) and accept from a daemon thread."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(4)
+        self.port = sock.getsockname()[1]
+
+        def _accept():
+            while True:
+                try:
+                    conn, _addr = sock.accept()
+                except OSError:
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), name='control-client',
+                                 daemon=True).start()
+
+        t = threading.Thread(target=_accept, name='control', daemon=True)
+        t.start()
+        return t
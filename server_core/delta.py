@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .payloads import build_broadcast_payload
+from .protocol import encode_snapshot
+
+# Player fields in wire order. Snapshots are stored as tuples in this order so
+# comparing two snapshots of a player is a single tuple comparison. 'in' is the
+# sequence number of the player's last applied input (None from clients that
+# do not number their inputs); clients use their own to reconcile prediction.
+FIELDS = ('x', 'y', 'state', 'frame', 'equip', 'equip_frame', 'name', 'occupied', 'in')
+
+
+def _row(p) -> Tuple[Any, ...]:
+    if type(p) is tuple:
+        # already a row (PlayerTable / PublishedState.rows)
+        return p
+    try:
+        return tuple(p.get(f) for f in FIELDS)
+    except Exception:
+        return tuple(None for _ in FIELDS)
+
+
+def row_dict(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    """A row as the legacy per-player dict ('in' only when the player has one)."""
+    d = dict(zip(FIELDS[:8], row))
+    if len(row) > 8 and row[8] is not None:
+        d['in'] = row[8]
+    return d
+
+
+def _hidden(row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    # what a client receives for a player outside its interest: an unoccupied
+    # slot (clients drop the sprite) that keeps the name
+    return (0, 0, 'down', 0, 'None', 0, row[6], False, None)
+
+
+class DeltaEncoder:
+    """Delta-compresses snapshots against each client's acknowledged baseline.
+
+    Every published snapshot gets a sequence number and is kept in a short
+    history. Clients echo the newest sequence they decoded ('ack'); the next
+    snapshot sent to them carries only the fields that changed since that
+    baseline. Clients without a usable baseline (just joined, legacy clients
+    that never ack, an ack older than the history, or an explicit 'resync')
+    get a full keyframe, which is the legacy 'positions' payload plus 'seq'.
+
+    Because a delta is always relative to state the client confirmed having,
+    any individual snapshot can be dropped without breaking the next one.
+
+    Snapshots are encoded as JSON, or as bin1 records (server_core.protocol)
+    for connections listed in binary_peers.
+
+    With area-of-interest filtering each connection sees a view of the
+    snapshot in which players outside its interest set are unoccupied slots.
+    The interest set used for every sequence is remembered per connection,
+    so a delta is computed between the view the client acknowledged and the
+    current one, touching only players in either set.
+
+    Every snapshot is stamped with the server time it was taken ('t', epoch
+    ms) so clients can interpolate remote players between snapshots.
+    """
+
+    def __init__(self, history: int = 64) -> None:
+        self.history = max(2, int(history))
+        self.seq = 0
+        # epoch ms of the latest snapshot
+        self.time_ms: Optional[int] = None
+        self._snapshots: 'OrderedDict[int, List[Tuple[Any, ...]]]' = OrderedDict()
+        self._acks: Dict[Any, int] = {}
+        self.binary_peers = set()
+        self._record_cache: Dict[Any, bytes] = {}
+        self._views: Dict[Any, 'OrderedDict[int, FrozenSet[int]]'] = {}
+        # held by the broadcaster across push() + payload() so concurrent
+        # publishers (broadcast-per-message mode) cannot interleave
+        self.lock = threading.Lock()
+
+    def acknowledge(self, conn, ack: Optional[int] = None, resync: bool = False) -> None:
+        """Record what a connection has decoded (from its 'ack'/'resync' fields)."""
+        if resync:
+            self._acks.pop(conn, None)
+            return
+        try:
+            ack = int(ack)
+        except (TypeError, ValueError):
+            return
+        if ack in self._snapshots and ack > self._acks.get(conn, 0):
+            self._acks[conn] = ack
+
+    def forget(self, conn) -> None:
+        self._acks.pop(conn, None)
+        self._views.pop(conn, None)
+        self.binary_peers.discard(conn)
+
+    def remember_view(self, conn, seq: int, interest: Optional[FrozenSet[int]]) -> None:
+        """Record the interest set conn was sent for seq (None = everyone)."""
+        if interest is None:
+            return
+        views = self._views.get(conn)
+        if views is None:
+            views = self._views[conn] = OrderedDict()
+        views[seq] = interest
+        while len(views) > self.history:
+            views.popitem(last=False)
+
+    def view_at(self, conn, seq: Optional[int]) -> Optional[FrozenSet[int]]:
+        views = self._views.get(conn)
+        return views.get(seq) if views is not None and seq is not None else None
+
+    def baseline(self, conn) -> Optional[int]:
+        base = self._acks.get(conn)
+        return base if base in self._snapshots else None
+
+    def push(self, positions: List[Any], now_ms: Optional[int] = None) -> int:
+        """Record a new snapshot (player dicts or FIELDS-order rows) and return
+        its sequence number."""
+        self.time_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+        self.seq += 1
+        self._snapshots[self.seq] = [_row(p) for p in positions]
+        while len(self._snapshots) > self.history:
+            self._snapshots.popitem(last=False)
+        return self.seq
+
+    def view_rows(self, interest: Optional[FrozenSet[int]] = None) -> List[Tuple[Any, ...]]:
+        """Rows of the latest snapshot as seen with interest (None = everyone)."""
+        rows = self._snapshots.get(self.seq, [])
+        if interest is None:
+            return rows
+        return [row if idx in interest else _hidden(row) for idx, row in enumerate(rows)]
+
+    def changes(self, base: Optional[int], interest: Optional[FrozenSet[int]] = None,
+                prev_interest: Optional[FrozenSet[int]] = None):
+        """Changes in the latest snapshot relative to base.
+
+        Returns None when a keyframe is required, else a list of
+        (idx, row, changed_fields) for the players that differ. interest and
+        prev_interest are the views used now and at base (None = everyone).
+        """
+        rows = self._snapshots.get(self.seq)
+        old = self._snapshots.get(base) if base is not None else None
+        if rows is None or old is None:
+            return None
+        if interest is None or prev_interest is None:
+            candidates = range(len(rows))
+        else:
+            # players outside both views were hidden then and now
+            candidates = sorted(i for i in interest | prev_interest if i < len(rows))
+        out = []
+        for idx in candidates:
+            row = rows[idx]
+            if interest is not None and idx not in interest:
+                row = _hidden(row)
+            prev = old[idx] if idx < len(old) else None
+            if prev is not None and prev_interest is not None and idx not in prev_interest:
+                prev = _hidden(prev)
+            if row == prev:
+                continue
+            if prev is None:
+                changed = dict(zip(FIELDS, row))
+            else:
+                changed = {f: v for f, v, pv in zip(FIELDS, row, prev) if v != pv}
+            out.append((idx, row, changed))
+        return out
+
+    def payload(self, base: Optional[int], role, round_start_ms, winner_index,
+                interest: Optional[FrozenSet[int]] = None, prev_interest: Optional[FrozenSet[int]] = None,
+                positions: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """JSON payload for the latest snapshot relative to base (None = keyframe).
+
+        positions, if given, are the snapshot's player dicts, reused for
+        keyframes without interest filtering instead of rebuilding them.
+        """
+        changes = self.changes(base, interest, prev_interest)
+        if changes is None:
+            if interest is not None or positions is None:
+                positions = [row_dict(row) for row in self.view_rows(interest)]
+            payload = build_broadcast_payload(positions, role, round_start_ms, winner_index)
+            payload['seq'] = self.seq
+            payload['key'] = True
+            payload['t'] = self.time_ms
+            return payload
+        return {
+            'seq': self.seq,
+            't': self.time_ms,
+            'base': base,
+            'delta': [[idx, changed] for idx, _row, changed in changes],
+            'round_start': round_start_ms,
+            'winner': winner_index,
+        }
+
+    def binary_payload(self, base: Optional[int], round_start_ms, winner_index,
+                       interest: Optional[FrozenSet[int]] = None, prev_interest: Optional[FrozenSet[int]] = None) -> bytes:
+        """bin1 payload for the latest snapshot: whole records for changed
+        players, with the name only when it changed (always on keyframes)."""
+        changes = self.changes(base, interest, prev_interest)
+        if changes is None:
+            records = [(idx, row, True) for idx, row in enumerate(self.view_rows(interest))]
+            base = None
+        else:
+            records = [(idx, row, 'name' in changed) for idx, row, changed in changes]
+        return encode_snapshot(self.seq, base, records, round_start_ms, winner_index, cache=self._record_cache,
+                               server_ms=self.time_ms)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Optional
+
+from net.framing import encode_frame
+from .payloads import build_pong
+from .codecs import LEGACY
+from .protocol import is_binary
+
+
+def apply_client_message(session, player: int, role: str, raw, logger=None, conn=None) -> Optional[Dict[str, Any]]:
+    """Apply one decoded client message to the session.
+
+    raw is a frame as bytes or an already decoded str, in the wire codec
+    conn negotiated (conn.codec, see server_core.codecs). Shared by the
+    threaded and asyncio server engines. Stages the sender's latest state in
+    the session (marked occupied) and applies a targeted CAUGHT event when
+    the sender is the seeker. Snapshot acknowledgements ('ack'/'resync') are
+    handed to the session's delta encoder for conn and never stored. The
+    client's input sequence number ('in') is stored with its state, so every
+    snapshot tells the client which of its inputs the server has applied. A
+    clock ping ({'ping': t0}) is answered on conn with a pong and changes
+    nothing. Returns the parsed update, or None when the message could not
+    be parsed (nothing is changed then).
+    """
+    if session.metrics is not None:
+        session.metrics.record_in(len(raw))
+    # one known format per connection (negotiated in the hello); clients
+    # without a hello are told apart by each frame's first byte
+    codec = getattr(conn, 'codec', None) or LEGACY
+    data = codec.decode_update(raw)
+    if data is None:
+        return None
+    if 'x' not in data:
+        if 'ping' in data:
+            _answer_ping(conn, data['ping'])
+        return None
+    # a bin1 update from a legacy client means it can also decode bin1
+    # snapshots
+    if codec is LEGACY and is_binary(raw) and session.delta is not None and conn is not None:
+        session.delta.binary_peers.add(conn)
+    return _apply_update(session, player, role, data, logger, conn)
+
+
+def _answer_ping(conn, ping) -> None:
+    if conn is None:
+        return
+    try:
+        # a control frame: queued in order and never dropped like a
+        # superseded snapshot (server_core.outbound)
+        conn.sendall(encode_frame(json.dumps(build_pong(ping))), state=False)
+    except Exception:
+        pass
+
+
+def _apply_update(session, player: int, role: str, data, logger=None, conn=None):
+    if data is None:
+        # malformed message; framing keeps the stream aligned so skip it
+        return None
+
+    ack = data.pop('ack', None)
+    resync = bool(data.pop('resync', False))
+    if session.delta is not None and conn is not None and (ack is not None or resync):
+        session.delta.acknowledge(conn, ack, resync)
+
+    # store incoming data in the player's slot (marks it occupied)
+    session.stage_update(player, data)
+    if logger:
+        logger.debug("data=%s", data)
+
+    # If sender included a targeted CAUGHT event (format 'CAUGHT:<idx>')
+    # and the sender is allowed to catch (we treat player 0 as seeker),
+    # apply the caught state server-side so broadcasts are authoritative.
+    equip_id = data.get('equip')
+    try:
+        if isinstance(equip_id, str) and equip_id.startswith('CAUGHT:'):
+            # parse target index
+            try:
+                target_idx = int(equip_id.split(':', 1)[1])
+            except Exception:
+                target_idx = None
+            # only process valid targets
+            if target_idx is not None and 0 <= target_idx < session.num_players:
+                # Only accept CAUGHT from seeker role to avoid cheating, and
+                # only when the target is in front of the seeker (when the
+                # session has a collision world); catch() also settles the
+                # winner and wakes the round scheduler
+                if role == 'seeker' and not session.in_catch_reach(player, target_idx):
+                    if logger:
+                        logger.info("Rejected catch of player %s by seeker %s: out of reach", target_idx, player)
+                elif role == 'seeker' and session.catch(target_idx):
+                    if logger:
+                        logger.info("Player %s frozen by seeker %s", target_idx, player)
+    except Exception:
+        pass
+    return data
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+
+class SpatialGrid:
+    """Uniform grid of player positions for radius queries.
+
+    Each player lives in exactly one cell; move() only touches the two cells
+    involved, and query() only looks at the cells overlapping the radius, so
+    its cost follows local density rather than the lobby size.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = max(1.0, float(cell_size))
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._where: Dict[int, Tuple[int, int]] = {}
+        self._xy: Dict[int, Tuple[int, int]] = {}
+
+    def _cell(self, x, y) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def move(self, idx: int, x, y) -> None:
+        cell = self._cell(x, y)
+        old = self._where.get(idx)
+        if old != cell:
+            if old is not None:
+                members = self._cells.get(old)
+                if members is not None:
+                    members.discard(idx)
+                    if not members:
+                        del self._cells[old]
+            self._cells.setdefault(cell, set()).add(idx)
+            self._where[idx] = cell
+        self._xy[idx] = (x, y)
+
+    def remove(self, idx: int) -> None:
+        old = self._where.pop(idx, None)
+        self._xy.pop(idx, None)
+        if old is not None:
+            members = self._cells.get(old)
+            if members is not None:
+                members.discard(idx)
+                if not members:
+                    del self._cells[old]
+
+    def position(self, idx: int) -> Optional[Tuple[int, int]]:
+        return self._xy.get(idx)
+
+    def query(self, x, y, radius: float) -> Set[int]:
+        """Players within radius of (x, y)."""
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        r2 = radius * radius
+        out = set()
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for idx in self._cells.get((cx, cy), ()):
+                    px, py = self._xy[idx]
+                    if (px - x) * (px - x) + (py - y) * (py - y) <= r2:
+                        out.add(idx)
+        return out
+
+
+class InterestManager:
+    """Decides which players each client receives in its snapshots.
+
+    A client sees the players within radius of its own position, itself,
+    frozen players (they never move, so keeping them costs nothing and the
+    client never loses a catch) and anyone involved in an event during the
+    last event_ttl seconds (a whistle must be heard across the map).
+    Players outside that set are sent as unoccupied slots.
+    """
+
+    def __init__(self, radius: float, cell_size: Optional[float] = None, event_ttl: float = 2.0) -> None:
+        self.radius = float(radius)
+        self.event_ttl = event_ttl
+        self.grid = SpatialGrid(cell_size or radius)
+        self._events: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def move(self, idx: int, x, y) -> None:
+        try:
+            x, y = int(x), int(y)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self.grid.move(idx, x, y)
+
+    def remove(self, idx: int) -> None:
+        with self._lock:
+            self.grid.remove(idx)
+
+    def note_event(self, idx: int) -> None:
+        with self._lock:
+            self._events[idx] = time.monotonic() + self.event_ttl
+
+    def interest(self, viewer: int, always: Iterable[int] = ()) -> FrozenSet[int]:
+        """Players viewer should receive; always is added as is (frozen players)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._events:
+                for idx in [i for i, until in self._events.items() if until < now]:
+                    del self._events[idx]
+            xy = self.grid.position(viewer)
+            out = self.grid.query(xy[0], xy[1], self.radius) if xy is not None else set()
+            out.update(self._events)
+        out.add(viewer)
+        out.update(always)
+        return frozenset(out)
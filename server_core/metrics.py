@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds (ms) of the fan-out histogram buckets; the last one is +Inf.
+FANOUT_BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0)
+# Seconds of history the per-second rates are computed over.
+RATE_WINDOW_S = 5.0
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative counts, Prometheus style)."""
+
+    def __init__(self, bounds: Sequence[float] = FANOUT_BUCKETS_MS) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        else:
+            i = len(self.bounds)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = {}
+        running = 0
+        for bound, n in zip(self.bounds + ('+Inf',), self.counts):
+            running += n
+            buckets[str(bound)] = running
+        return {'count': self.count, 'sum': round(self.total, 3), 'max': round(self.max, 3),
+                'avg': round(self.total / self.count, 3) if self.count else 0.0, 'buckets': buckets}
+
+
+class ServerMetrics:
+    """Process-wide traffic counters shared by every room.
+
+    Sessions carry it (Session.metrics): apply_client_message counts each
+    received message, publish_session counts the frames and datagrams of
+    each fan-out and times it. Counters only grow; rates() turns them into
+    per-second values over the last few seconds, sampling lazily so no
+    extra thread is needed.
+    """
+
+    COUNTERS = ('msgs_in', 'bytes_in', 'msgs_out', 'bytes_out', 'fanouts')
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.msgs_in = 0
+        self.bytes_in = 0
+        self.msgs_out = 0
+        self.bytes_out = 0
+        self.fanouts = 0
+        self.fanout_ms = Histogram()
+        self._lock = threading.Lock()
+        # (monotonic time, totals) pairs; starts from zero so the first
+        # scrape already reports rates since start-up
+        self._samples: deque = deque([(time.monotonic(), dict.fromkeys(self.COUNTERS, 0))])
+
+    def record_in(self, nbytes: int) -> None:
+        with self._lock:
+            self.msgs_in += 1
+            self.bytes_in += nbytes
+
+    def record_fanout(self, elapsed_ms: float, msgs: int, nbytes: int) -> None:
+        with self._lock:
+            self.fanouts += 1
+            self.msgs_out += msgs
+            self.bytes_out += nbytes
+            self.fanout_ms.observe(elapsed_ms)
+
+    def totals(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def rates(self) -> Dict[str, float]:
+        """Per-second rate of each counter over the last RATE_WINDOW_S."""
+        now = time.monotonic()
+        with self._lock:
+            current = self.totals()
+            samples = self._samples
+            if not samples or now - samples[-1][0] >= 1.0:
+                samples.append((now, current))
+            while len(samples) > 1 and now - samples[1][0] >= RATE_WINDOW_S:
+                samples.popleft()
+            then, old = samples[0]
+        dt = now - then
+        if dt <= 0:
+            return {f'{name}_per_s': 0.0 for name in self.COUNTERS}
+        return {f'{name}_per_s': round((current[name] - old[name]) / dt, 1) for name in self.COUNTERS}
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {'uptime_s': round(time.time() - self.started, 1)}
+        out.update(self.totals())
+        out.update(self.rates())
+        with self._lock:
+            out['fanout_ms'] = self.fanout_ms.as_dict()
+        return out
+
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})'
+
+
+class SamplingProfiler:
+    """Statistical profiler over every thread of the process.
+
+    cProfile only sees the thread that enabled it, which is useless for a
+    server made of per-client threads (or one busy event loop); instead a
+    daemon thread samples sys._current_frames() at hz and counts stacks.
+    stop() returns the hottest functions and the collapsed stacks
+    ('a;b;c count', the flame graph input format).
+    """
+
+    def __init__(self, hz: float = 100.0, max_depth: int = 40) -> None:
+        self.hz = max(1.0, min(float(hz), 1000.0))
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._self: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        interval = 1.0 / self.hz
+        while not self._stop.wait(interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack: List[str] = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_key(frame))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                self._self[stack[0]] += 1
+                self._stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self, top: int = 20) -> Dict[str, Any]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        total = self.samples or 1
+        hottest: List[Tuple[str, int]] = self._self.most_common(top)
+        return {
+            'samples': self.samples,
+            'hz': self.hz,
+            'duration_s': round(time.time() - (self.started or time.time()), 2),
+            'top': [{'function': name, 'samples': n, 'pct': round(100.0 * n / total, 1)} for name, n in hottest],
+            'stacks': [f'{stack} {n}' for stack, n in self._stacks.most_common()],
+        }
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+# Frames queued per connection before it is evicted as too slow. Only the
+# newest plain state snapshot is ever queued (deltas are relative to the
+# client's acknowledged baseline), so the queue holds at most one snapshot
+# plus the event snapshots and control frames that must all arrive.
+DEFAULT_MAX_QUEUE = 8
+# A connection whose socket send has not completed for this long is evicted.
+DEFAULT_STALL_TIMEOUT = 5.0
+
+
+@dataclass
+class OutboundStats:
+    """Counters for one connection's outbound queue."""
+
+    name: str = ''
+    depth: int = 0
+    max_depth: int = 0
+    queued: int = 0
+    sent: int = 0
+    dropped: int = 0
+    bytes_sent: int = 0
+    evicted: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'queued': self.queued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'bytes_sent': self.bytes_sent,
+            'evicted': self.evicted,
+        }
+
+
+class ConnectionWriter:
+    """Socket-like sender with a bounded queue drained by its own thread.
+
+    sendall() never blocks the caller: it appends the frame to the queue.
+    sendall(frame, state=True) marks a plain state snapshot: it replaces a
+    queued state snapshot that has not gone out yet. Every other frame (event
+    snapshots, handshakes, pongs, errors) is sent in order and never dropped;
+    a connection that lets max_queue of them pile up is evicted instead. A
+    dedicated thread writes frames to the socket. If a send fails, or one send
+    has been stuck for longer than stall_timeout (checked whenever new data is
+    offered), the connection is evicted: the socket is shut down so the
+    reader sees EOF, and on_evict is called so the session forgets it.
+    """
+
+    def __init__(self, sock, max_queue: int = DEFAULT_MAX_QUEUE, stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+                 on_evict: Optional[Callable[['ConnectionWriter'], None]] = None, name: str = '', logger=None,
+                 player: Optional[int] = None) -> None:
+        self.sock = sock
+        self.max_queue = max(1, int(max_queue))
+        self.stall_timeout = stall_timeout
+        self.on_evict = on_evict
+        self.logger = logger
+        self.stats = OutboundStats(name=name)
+        # player index, used for area-of-interest filtering
+        self.player = player
+        # UdpEndpoint when the client joined the UDP state channel
+        self.udp = None
+        # wire codec picked in the hello (server_core.codecs); None = legacy detection
+        self.codec = None
+        # [frame, is_state]
+        self._queue: deque = deque()
+        self._state_entry: Optional[list] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sending_since: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name=f'writer-{name}', daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def sendall(self, frame: bytes, state: bool = False) -> None:
+        if self._closed:
+            raise ConnectionError('connection evicted')
+        since = self._sending_since
+        if since is not None and time.monotonic() - since > self.stall_timeout:
+            self.evict('send stalled for more than %.1fs' % self.stall_timeout)
+            raise ConnectionError('connection stalled')
+        with self._cond:
+            full = False
+            if state and self._state_entry is not None:
+                self._queue.remove(self._state_entry)
+                self.stats.dropped += 1
+            elif len(self._queue) >= self.max_queue:
+                full = True
+            if not full:
+                entry = [frame, state]
+                self._queue.append(entry)
+                if state:
+                    self._state_entry = entry
+                self.stats.queued += 1
+                self.stats.depth = len(self._queue)
+                if self.stats.depth > self.stats.max_depth:
+                    self.stats.max_depth = self.stats.depth
+                self._cond.notify()
+        if full:
+            self.evict('outbound queue full (%d frames)' % self.max_queue)
+            raise ConnectionError('connection evicted')
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                entry = self._queue.popleft()
+                if entry is self._state_entry:
+                    self._state_entry = None
+                frame = entry[0]
+                self.stats.depth = len(self._queue)
+            self._sending_since = time.monotonic()
+            try:
+                self.sock.sendall(frame)
+            except Exception as e:
+                self._sending_since = None
+                self.evict('send failed: %s' % e)
+                return
+            self._sending_since = None
+            self.stats.sent += 1
+            self.stats.bytes_sent += len(frame)
+
+    def evict(self, reason: str = '') -> None:
+        """Stop sending, drop queued data and shut the socket down."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self.stats.evicted = True
+            self._queue.clear()
+            self._state_entry = None
+            self.stats.depth = 0
+            self._cond.notify_all()
+        if self.logger and reason:
+            self.logger.info("Evicting connection %s: %s", self.stats.name, reason)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        if self.on_evict is not None:
+            try:
+                self.on_evict(self)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Stop the writer thread without reporting an eviction."""
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._state_entry = None
+            self.stats.depth = 0
+            self._cond.notify_all()
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import time
 from typing import Any, Dict, List, Optional
 
+from .codecs import PROTOCOL_VERSION
+
 
 def build_broadcast_payload(positions: List[Any], role: Optional[str], round_start_ms: Optional[int], winner_index: Optional[int]) -> Dict[str, Any]:
     """Construct the authoritative broadcast payload in a single place.
@@ -14,3 +17,37 @@ def build_broadcast_payload(positions: List[Any], role: Optional[str], round_sta
         'round_start': round_start_ms,
         'winner': winner_index,
     }
+
+
+def build_initial_payload(positions: List[Any], player_index: int, role: Optional[str], round_start_ms: Optional[int], winner_index: Optional[int], codecs: Optional[List[str]] = None, udp: Optional[Dict[str, int]] = None, room: Optional[str] = None, codec: Optional[str] = None) -> Dict[str, Any]:
+    """Construct the handshake payload sent to a client right after it connects.
+
+    codecs lists the optional wire formats the server accepts (e.g. 'bin1');
+    clients that understand one may switch to it, others ignore the key.
+    udp ({'port', 'token'}) offers the UDP state channel; room names the
+    room the client was placed in. codec answers the client's hello: the
+    format it picked for this connection, with the server's hello version.
+    """
+    payload = {
+        'positions': positions,
+        'player_index': player_index,
+        'role': role,
+        'round_start': round_start_ms,
+        'winner': winner_index,
+    }
+    if codecs:
+        payload['codecs'] = list(codecs)
+    if udp:
+        payload['udp'] = dict(udp)
+    if room is not None:
+        payload['room'] = room
+    if codec is not None:
+        payload['hello'] = PROTOCOL_VERSION
+        payload['codec'] = codec
+    return payload
+
+
+def build_pong(ping: Any, now_ms: Optional[int] = None) -> Dict[str, Any]:
+    """Reply to a client's clock ping: its send time echoed plus the server
+    time in epoch ms (see net.clock.ClockSync)."""
+    return {'pong': ping, 't': int(time.time() * 1000) if now_ms is None else now_ms}
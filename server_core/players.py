@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .protocol import STATE_CODES
+
+_INT_MIN, _INT_MAX = -(2 ** 31), 2 ** 31 - 1
+# 'in' column value for "no input sequence number"
+_NO_INPUT = -1
+
+
+def _int(v, default: int = 0) -> int:
+    if type(v) is int and _INT_MIN <= v <= _INT_MAX:
+        return v
+    try:
+        return min(_INT_MAX, max(_INT_MIN, int(v)))
+    except (TypeError, ValueError, OverflowError):
+        return default
+
+
+def bits(mask: int) -> Iterator[int]:
+    """Indices of the set bits of mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class _Codes:
+    """Interns short strings (states, equip ids) as small ints.
+
+    Codes are never reused: once limit names are interned, code() returns
+    the code of fallback (the first seed name) for any new name.
+    """
+
+    def __init__(self, seed=(), limit: int = 0xFFFF) -> None:
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.limit = limit
+        for name in seed:
+            self.code(name)
+        self.fallback = self.ids[self.names[0]] if self.names else 0
+
+    def code(self, name) -> int:
+        name = str(name)
+        code = self.ids.get(name)
+        if code is None:
+            if len(self.names) >= self.limit:
+                # a client flooding unique ids; should never happen in a game
+                return self.fallback
+            code = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class PlayerTable:
+    """Every player's latest state, one column per field (struct of arrays).
+
+    x, y, frame, equip_frame and the input sequence number ('in') are
+    array('i') / array('q') columns; state and equip are small-int codes into
+    interned string tables; occupied and frozen are int bitsets. write()
+    coerces and stores an update into a slot instead of keeping the client's
+    dict. Unknown states are stored as 'down'; once the equip table is full,
+    new equip values are stored as 'None' (codes already handed out stay
+    valid, since rows and published snapshots refer to them).
+
+    row(i) is the player's state as a tuple in server_core.delta.FIELDS
+    order. Rows are cached per slot and rebuilt only after the slot changed,
+    so rows() for a mostly idle lobby is a list copy.
+    """
+
+    def __init__(self, size: int, default: Optional[Dict[str, Any]] = None) -> None:
+        n = self.size = int(size)
+        self.x = array('i', bytes(4 * n))
+        self.y = array('i', bytes(4 * n))
+        self.frame = array('i', bytes(4 * n))
+        self.equip_frame = array('i', bytes(4 * n))
+        self.inputs = array('q', [_NO_INPUT]) * n
+        self.state = array('H', bytes(2 * n))
+        self.equip = array('H', bytes(2 * n))
+        self.names: List[str] = [''] * n
+        self.occupied = 0
+        self.frozen = 0
+        self.states = _Codes(STATE_CODES)
+        self.equips = _Codes(('None',))
+        self._rows: List[Optional[Tuple[Any, ...]]] = [None] * n
+        if default is not None:
+            for i in range(n):
+                self.write(i, default, occupied=bool(default.get('occupied', False)))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def write(self, i: int, data: Dict[str, Any], occupied: bool = True, keep_equip: bool = False) -> None:
+        """Store an update (the client's field dict) in slot i.
+
+        keep_equip leaves the slot's equip as it is (an unpublished event).
+        """
+        self.x[i] = _int(data.get('x'))
+        self.y[i] = _int(data.get('y'))
+        state = data.get('state')
+        self.state[i] = self.states.ids[state] if type(state) is str and state in STATE_CODES else self.states.fallback
+        self.frame[i] = _int(data.get('frame'))
+        if not keep_equip:
+            self.equip[i] = self.equips.code(data.get('equip', 'None') or 'None')
+        self.equip_frame[i] = _int(data.get('equip_frame'))
+        self.names[i] = str(data.get('name', '') or '')
+        seq = data.get('in')
+        self.inputs[i] = _int(seq, _NO_INPUT) if seq is not None else _NO_INPUT
+        if occupied:
+            self.occupied |= 1 << i
+        else:
+            self.occupied &= ~(1 << i)
+        self._rows[i] = None
+
+    def equip_of(self, i: int) -> str:
+        return self.equips.names[self.equip[i]]
+
+    def set_equip(self, i: int, equip: str) -> None:
+        self.equip[i] = self.equips.code(equip)
+        self._rows[i] = None
+
+    def is_frozen(self, i: int) -> bool:
+        return bool(self.frozen >> i & 1)
+
+    def set_frozen(self, i: int, frozen: bool = True) -> None:
+        if frozen:
+            self.frozen |= 1 << i
+        else:
+            self.frozen &= ~(1 << i)
+
+    def clear_frozen(self) -> None:
+        self.frozen = 0
+
+    def all_frozen(self, first: int = 1) -> bool:
+        """Whether players first..size-1 (the hidders) are all frozen."""
+        want = ((1 << self.size) - 1) & ~((1 << first) - 1)
+        return self.frozen & want == want
+
+    def row(self, i: int) -> Tuple[Any, ...]:
+        row = self._rows[i]
+        if row is None:
+            seq = self.inputs[i]
+            row = self._rows[i] = (self.x[i], self.y[i], self.states.names[self.state[i]], self.frame[i],
+                                   self.equips.names[self.equip[i]], self.equip_frame[i], self.names[i],
+                                   bool(self.occupied >> i & 1), None if seq == _NO_INPUT else seq)
+        return row
+
+    def rows(self) -> Tuple[Tuple[Any, ...], ...]:
+        if None in self._rows:
+            for i in range(self.size):
+                self.row(i)
+        return tuple(self._rows)
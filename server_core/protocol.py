@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+import json
+import struct
+from typing import Any, Dict, Optional
 
 
 def read_pos(data: str):
@@ -37,3 +39,286 @@ def make_pos(tup):
         return ",".join(map(str, tup))
     except Exception:
         return ""
+
+
+def is_event_equip(equip) -> bool:
+    """True for one-shot events carried in the equip field (WHISTLE, CAUGHT:<idx>)."""
+    return isinstance(equip, str) and (equip == 'WHISTLE' or equip.startswith('CAUGHT'))
+
+
+def parse_join(raw) -> Optional[Dict[str, Any]]:
+    """Parse a room join request, the first frame a room-aware client sends:
+    {"join": <room id or null>, "create": {"players": n, "name": host}?,
+    "hello": <protocol version>?, "codecs": [names]?}. 'hello' and 'codecs'
+    are None when the client predates the hello (server_core.codecs).
+    Returns None for anything else.
+    """
+    try:
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode('utf-8')
+        msg = json.loads(raw)
+    except Exception:
+        return None
+    if not isinstance(msg, dict) or 'join' not in msg:
+        return None
+    room = msg.get('join')
+    codecs = msg.get('codecs')
+    return {'join': str(room) if room is not None else None, 'create': msg.get('create'),
+            'hello': msg.get('hello'), 'codecs': [str(c) for c in codecs] if isinstance(codecs, list) else None}
+
+
+# ---------------------------------------------------------------------------
+# Binary wire codec ("bin1")
+#
+# Fixed-width struct records instead of JSON for clients that advertise it.
+# Every binary frame starts with BIN_MAGIC (never the first byte of a JSON or
+# CSV message) and a version byte, so receivers can tell formats apart from
+# the first byte. Coordinates are quantized to COORD_QUANTUM pixels in an
+# unsigned 16-bit field, 'state' is an enum and equip/event ids are coded as
+# (kind, a, b) integers. Names are the only variable-length part and follow the
+# fixed records, only for records flagged as carrying one. A snapshot may end
+# with the server time it was taken (_STAMP, epoch ms) followed by the input
+# sequence numbers of its records (_INPUTS); decoders that predate them stop
+# after the names and never read them. An update flagged FLAG_INPUT ends with
+# the client's input sequence number (_SEQ) after the name.
+# ---------------------------------------------------------------------------
+BIN_CODEC = 'bin1'
+BIN_MAGIC = 0xB1
+BIN_VERSION = 1
+MSG_UPDATE = 1
+MSG_SNAPSHOT = 2
+COORD_QUANTUM = 1
+
+STATE_CODES = {'down': 0, 'up': 1, 'left': 2, 'right': 3}
+STATE_NAMES = {v: k for k, v in STATE_CODES.items()}
+
+EQUIP_NONE = 0
+EQUIP_OBJECT = 1   # object id "<x>_<y>" -> a=x, b=y
+EQUIP_WHISTLE = 2
+EQUIP_CAUGHT = 3   # "CAUGHT:<idx>" -> a=idx ("CAUGHT" alone -> a=0xFFFF)
+
+FLAG_OCCUPIED = 0x01
+FLAG_NAME = 0x02
+# client update flags
+FLAG_ACK = 0x04
+FLAG_RESYNC = 0x08
+FLAG_INPUT = 0x10
+
+# magic, version, type
+_HEAD = struct.Struct('!BBB')
+# seq, base (0 = keyframe), round_start (-1 = None), winner (-1 = None), records
+_SNAP_HEAD = struct.Struct('!IIqhH')
+# idx, x, y, state, frame, equip kind, equip a, equip b, equip_frame, flags
+_RECORD = struct.Struct('!HHHBBBHHBB')
+# x, y, state, frame, equip kind, a, b, equip_frame, flags, ack
+_UPDATE = struct.Struct('!HHBBBHHBBI')
+# optional trailer of a snapshot: server time in epoch ms, then a count and
+# (idx, input seq) pairs
+_STAMP = struct.Struct('!q')
+_COUNT = struct.Struct('!H')
+_INPUT = struct.Struct('!HI')
+_SEQ = struct.Struct('!I')
+_NO_TARGET = 0xFFFF
+
+
+def is_binary(frame) -> bool:
+    return isinstance(frame, (bytes, bytearray, memoryview)) and len(frame) >= _HEAD.size and frame[0] == BIN_MAGIC
+
+
+def _u16(v) -> int:
+    try:
+        v = int(v)
+    except Exception:
+        return 0
+    return 0 if v < 0 else (0xFFFF if v > 0xFFFF else v)
+
+
+def _coord(v) -> int:
+    if type(v) is int and 0 <= v <= 0xFFFF and COORD_QUANTUM == 1:
+        return v
+    try:
+        return _u16(int(v) // COORD_QUANTUM)
+    except Exception:
+        return 0
+
+
+def _u8(v) -> int:
+    if type(v) is int:
+        return v & 0xFF
+    try:
+        return int(v) & 0xFF
+    except Exception:
+        return 0
+
+
+def encode_equip(equip):
+    """Map an equip/event id string to (kind, a, b)."""
+    if not equip or equip == 'None':
+        return EQUIP_NONE, 0, 0
+    if equip == 'WHISTLE':
+        return EQUIP_WHISTLE, 0, 0
+    if equip.startswith('CAUGHT'):
+        try:
+            return EQUIP_CAUGHT, _u16(equip.split(':', 1)[1]), 0
+        except Exception:
+            return EQUIP_CAUGHT, _NO_TARGET, 0
+    try:
+        a, b = equip.split('_', 1)
+        return EQUIP_OBJECT, _u16(a), _u16(b)
+    except Exception:
+        return EQUIP_NONE, 0, 0
+
+
+def decode_equip(kind: int, a: int, b: int) -> str:
+    if kind == EQUIP_OBJECT:
+        return f'{a}_{b}'
+    if kind == EQUIP_WHISTLE:
+        return 'WHISTLE'
+    if kind == EQUIP_CAUGHT:
+        return 'CAUGHT' if a == _NO_TARGET else f'CAUGHT:{a}'
+    return 'None'
+
+
+def _pack_name(name) -> bytes:
+    raw = str(name or '').encode('utf-8')[:255]
+    return bytes((len(raw),)) + raw
+
+
+def _unpack_name(buf, off):
+    n = buf[off]
+    return bytes(buf[off + 1:off + 1 + n]).decode('utf-8', 'replace'), off + 1 + n
+
+
+def _pack_record(idx, row, with_name) -> bytes:
+    x, y, state, frame, equip, equip_frame, name, occupied = row[:8]
+    kind, a, b = (EQUIP_NONE, 0, 0) if equip == 'None' else encode_equip(equip)
+    flags = (FLAG_OCCUPIED if occupied else 0) | (FLAG_NAME if with_name else 0)
+    return _RECORD.pack(idx, _coord(x), _coord(y), STATE_CODES.get(state, 0), _u8(frame),
+                        kind, a, b, _u8(equip_frame), flags)
+
+
+def encode_snapshot(seq: int, base: Optional[int], records, round_start_ms, winner_index, cache=None,
+                    server_ms: Optional[int] = None) -> bytes:
+    """Pack a snapshot. records: iterable of (idx, row, with_name) where row is
+    (x, y, state, frame, equip, equip_frame, name, occupied). base None = keyframe.
+    server_ms, if given, is appended as the snapshot's timestamp, followed by
+    the input sequence numbers of the records that have one (row[8]).
+
+    cache, if given, is a dict reused across calls that memoizes the packed
+    record of each unchanged (idx, row, with_name), so players that did not
+    change since the previous snapshot cost a dict lookup instead of a pack.
+    """
+    records = list(records)
+    parts = [_HEAD.pack(BIN_MAGIC, BIN_VERSION, MSG_SNAPSHOT),
+             _SNAP_HEAD.pack(seq & 0xFFFFFFFF, (base or 0) & 0xFFFFFFFF,
+                             int(round_start_ms) if round_start_ms is not None else -1,
+                             int(winner_index) if winner_index is not None else -1,
+                             len(records))]
+    names = []
+    for rec in records:
+        if cache is None:
+            packed = _pack_record(*rec)
+        else:
+            packed = cache.get(rec)
+            if packed is None:
+                if len(cache) > 4096:
+                    cache.clear()
+                packed = cache[rec] = _pack_record(*rec)
+        parts.append(packed)
+        if rec[2]:
+            names.append(_pack_name(rec[1][6]))
+    parts.extend(names)
+    if server_ms is not None:
+        parts.append(_STAMP.pack(int(server_ms)))
+        inputs = [(rec[0], rec[1][8]) for rec in records if len(rec[1]) > 8 and rec[1][8] is not None]
+        parts.append(_COUNT.pack(len(inputs)))
+        parts.extend(_INPUT.pack(idx, int(seq) & 0xFFFFFFFF) for idx, seq in inputs)
+    return b''.join(parts)
+
+
+def decode_snapshot(buf) -> Dict[str, Any]:
+    """Unpack a snapshot into the same dict shape as the JSON tick payloads.
+
+    Keyframes yield 'positions' (full list); deltas yield 'base' and 'delta'
+    as [[idx, fields], ...] with full records (name only when sent).
+    """
+    seq, base, round_start, winner, count = _SNAP_HEAD.unpack_from(buf, _HEAD.size)
+    off = _HEAD.size + _SNAP_HEAD.size
+    end = off + count * _RECORD.size
+    states, equip = STATE_NAMES, decode_equip
+    # fixed-width records are contiguous, so unpack them in one pass
+    entries = [(idx, {
+        'x': x * COORD_QUANTUM, 'y': y * COORD_QUANTUM,
+        'state': states.get(st, 'down'), 'frame': frame,
+        'equip': equip(kind, a, b) if kind else 'None', 'equip_frame': ef,
+        'occupied': bool(flags & FLAG_OCCUPIED),
+    }, flags & FLAG_NAME) for idx, x, y, st, frame, kind, a, b, ef, flags in _RECORD.iter_unpack(memoryview(buf)[off:end])]
+    off = end
+    for idx, fields, has_name in entries:
+        if has_name:
+            fields['name'], off = _unpack_name(buf, off)
+    msg = {'seq': seq,
+           'round_start': round_start if round_start >= 0 else None,
+           'winner': winner if winner >= 0 else None}
+    if len(buf) - off >= _STAMP.size:
+        msg['t'] = _STAMP.unpack_from(buf, off)[0]
+        off += _STAMP.size
+        if len(buf) - off >= _COUNT.size:
+            (n,) = _COUNT.unpack_from(buf, off)
+            off += _COUNT.size
+            by_idx = {idx: fields for idx, fields, _ in entries}
+            for idx, seq in _INPUT.iter_unpack(memoryview(buf)[off:off + n * _INPUT.size]):
+                if idx in by_idx:
+                    by_idx[idx]['in'] = seq
+    if base == 0:
+        positions = []
+        for idx, fields, _ in entries:
+            while len(positions) <= idx:
+                positions.append({})
+            positions[idx] = fields
+        msg['positions'] = positions
+        msg['key'] = True
+    else:
+        msg['base'] = base
+        msg['delta'] = [[idx, fields] for idx, fields, _ in entries]
+    return msg
+
+
+def encode_update(fields: Dict[str, Any], ack: Optional[int] = None, resync: bool = False) -> bytes:
+    """Pack a client state update (same keys as the JSON update, 'in' included)."""
+    kind, a, b = encode_equip(fields.get('equip', 'None'))
+    seq = fields.get('in')
+    flags = (FLAG_NAME | (FLAG_ACK if ack is not None else 0) | (FLAG_RESYNC if resync else 0)
+             | (FLAG_INPUT if seq is not None else 0))
+    return (_HEAD.pack(BIN_MAGIC, BIN_VERSION, MSG_UPDATE)
+            + _UPDATE.pack(_coord(fields.get('x', 0)), _coord(fields.get('y', 0)),
+                           STATE_CODES.get(fields.get('state'), 0), _u8(fields.get('frame', 0)),
+                           kind, a, b, _u8(fields.get('equip_frame', 0)), flags,
+                           (ack or 0) & 0xFFFFFFFF)
+            + _pack_name(fields.get('name', ''))
+            + (_SEQ.pack(int(seq) & 0xFFFFFFFF) if seq is not None else b''))
+
+
+def decode_update(buf) -> Optional[Dict[str, Any]]:
+    """Unpack a client update into the dict apply_client_message stores."""
+    try:
+        magic, version, mtype = _HEAD.unpack_from(buf, 0)
+        if magic != BIN_MAGIC or version != BIN_VERSION or mtype != MSG_UPDATE:
+            return None
+        x, y, st, frame, kind, a, b, ef, flags, ack = _UPDATE.unpack_from(buf, _HEAD.size)
+        name = ''
+        off = _HEAD.size + _UPDATE.size
+        if flags & FLAG_NAME:
+            name, off = _unpack_name(buf, off)
+        seq = _SEQ.unpack_from(buf, off)[0] if flags & FLAG_INPUT else None
+    except Exception:
+        return None
+    data = {'x': x * COORD_QUANTUM, 'y': y * COORD_QUANTUM, 'state': STATE_NAMES.get(st, 'down'),
+            'frame': frame, 'equip': decode_equip(kind, a, b), 'equip_frame': ef, 'name': name}
+    if flags & FLAG_ACK:
+        data['ack'] = ack
+    if flags & FLAG_RESYNC:
+        data['resync'] = True
+    if seq is not None:
+        data['in'] = seq
+    return data
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from .broadcaster import publish_session
+from .session import Session
+
+DEFAULT_ROOM = 'default'
+# Seconds the server waits for a join request before placing a client that
+# sent nothing (an older client) in the first open room.
+JOIN_TIMEOUT = 1.0
+
+
+class Room:
+    """One match hosted by the server: a Session and its player slots.
+
+    Slots are handed out in connection order (slot 0 is the seeker). When the
+    last slot is claimed the caller starts the round. Rooms created on demand
+    by a client are dropped once everybody left; the others are recycled with
+    a fresh Session.
+    """
+
+    def __init__(self, room_id: str, session: Session, host_name: str = '', created: bool = False) -> None:
+        self.room_id = room_id
+        self.session = session
+        self.host_name = host_name
+        self.created = created
+        self._next_player = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def players(self) -> int:
+        return self._next_player
+
+    @property
+    def is_open(self) -> bool:
+        return self._next_player < self.session.num_players
+
+    def claim_slot(self) -> Optional[int]:
+        """Next player index, or None when the room is full."""
+        with self._lock:
+            if self._next_player >= self.session.num_players:
+                return None
+            player = self._next_player
+            self._next_player += 1
+            self._active += 1
+            return player
+
+    def leave(self) -> int:
+        """A client holding a slot disconnected; returns how many remain."""
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            return self._active
+
+    def info(self) -> Dict[str, Any]:
+        return {'room': self.room_id, 'name': self.host_name, 'players': self.players,
+                'max': self.session.num_players}
+
+
+class RoomManager:
+    """Many Sessions behind one listening port.
+
+    session_factory(num_players) builds a fresh Session for a room. Clients
+    pick a room with a join request (server_core.protocol.parse_join); a
+    request naming an unknown room with 'create' opens it, up to max_rooms.
+    publish_all() is the shared tick callback: one scheduler drives every
+    room's snapshot fan-out.
+    """
+
+    def __init__(self, session_factory: Callable[[int], Session], default_players: int,
+                 max_rooms: int = 64, logger=None) -> None:
+        self.session_factory = session_factory
+        self.default_players = default_players
+        self.max_rooms = max(1, int(max_rooms))
+        self.logger = logger
+        self.rooms: 'OrderedDict[str, Room]' = OrderedDict()
+        self._lock = threading.RLock()
+
+    def add(self, room_id: str, num_players: Optional[int] = None, host_name: str = '', created: bool = False) -> Room:
+        room = Room(room_id, self.session_factory(num_players or self.default_players), host_name, created)
+        with self._lock:
+            self.rooms[room_id] = room
+        return room
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def open_rooms(self) -> List[Room]:
+        return [r for r in list(self.rooms.values()) if r.is_open]
+
+    def choose(self, request: Optional[Dict[str, Any]] = None) -> Optional[Room]:
+        """Resolve a join request (None = older client) to a room."""
+        room_id = request.get('join') if request else None
+        if room_id is None:
+            rooms = self.open_rooms()
+            return rooms[0] if rooms else None
+        create = request.get('create')
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is not None:
+                return room
+            if not isinstance(create, dict) or len(self.rooms) >= self.max_rooms:
+                return None
+            try:
+                num_players = max(2, int(create.get('players') or self.default_players))
+            except (TypeError, ValueError):
+                num_players = self.default_players
+            room = self.add(room_id, num_players, str(create.get('name') or ''), created=True)
+        if self.logger:
+            self.logger.info("Room %s created for %s players", room.room_id, num_players)
+        return room
+
+    def release(self, room: Room) -> None:
+        """Called when a client left its room: recycle or drop it once empty."""
+        if room.leave():
+            return
+        with self._lock:
+            if self.rooms.get(room.room_id) is not room:
+                return
+            if room.created:
+                del self.rooms[room.room_id]
+            else:
+                self.rooms[room.room_id] = Room(room.room_id, self.session_factory(room.session.num_players),
+                                                room.host_name)
+        if self.logger:
+            self.logger.info("Room %s %s", room.room_id, 'closed' if room.created else 'reset')
+
+    def publish_all(self) -> None:
+        for room in list(self.rooms.values()):
+            publish_session(room.session)
+
+    def outbound_stats(self) -> Dict[str, List[dict]]:
+        return {room_id: room.session.outbound_stats() for room_id, room in list(self.rooms.items())}
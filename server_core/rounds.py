@@ -1,60 +1,243 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
+import itertools
+import threading
 import time
-from typing import Optional
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
 
+# seconds the seeker gets to catch each hidder once the hide phase is over
+CATCH_WINDOW_S = 45
 
-def manage_round(session, logger=None):
-    """Background manager that enforces the hide/seek timing rules.
+
+class _Round:
+    """Hide/seek rules for one session's round, as deadline callbacks.
 
     Behavior:
     - Wait until session.round_start_ms (initial 30s hide phase already encoded)
     - For each hidder (players 1..N-1) give the seeker 45 seconds to catch that hidder.
       If not caught within 45s, that hidder becomes the winner and the round ends.
     - If the seeker catches all hidders within their allotted windows, the seeker wins.
+
+    A catch ends the current window at once (caught()) instead of being
+    noticed by polling; hidders already frozen when their window would start
+    are skipped.
     """
-    try:
-        if session.round_start_ms is None:
-            return
-        wait_ms = session.round_start_ms - int(time.time() * 1000)
-        if wait_ms > 0:
-            time.sleep(wait_ms / 1000.0)
-
-        # now the hide phase has ended; enforce 45s per hidder
-        hidders = [i for i in range(session.num_players) if i != 0]
-        for hid in hidders:
-            if session.winner_index is not None:
-                break
-            if session.frozen[hid]:
+
+    def __init__(self, scheduler: 'RoundScheduler', session) -> None:
+        self.scheduler = scheduler
+        self.session = session
+        self.hidders = deque(range(1, session.num_players))
+        self.started = False
+        self.current: Optional[int] = None
+        self.timeout: Optional[List[Any]] = None
+        self.done = False
+
+    def begin(self) -> None:
+        self.started = True
+        self._next_window()
+
+    def _next_window(self) -> None:
+        s = self.session
+        logger = self.scheduler.logger
+        while self.hidders and s.winner_index is None:
+            hid = self.hidders.popleft()
+            if s.is_frozen(hid):
                 if logger:
                     logger.info("Hidder %s already frozen at start of their window, skipping", hid)
                 continue
-
             if logger:
                 logger.info("Starting 45s catch window for hidder %s", hid)
-            start = time.time()
-            timed_out = True
-            while time.time() - start < 45:
-                if session.frozen[hid]:
-                    timed_out = False
-                    if logger:
-                        logger.info("Hidder %s was caught within 45s", hid)
-                    break
-                if session.winner_index is not None:
-                    timed_out = False
-                    break
-                time.sleep(0.25)
-
-            if timed_out:
-                session.winner_index = hid
-                if logger:
-                    logger.info("Hidder %s wins: not caught within 45s", hid)
-                break
+            self.current = hid
+            self.timeout = self.scheduler.call_later(CATCH_WINDOW_S, self._expire)
+            return
+        self.current = None
+        if s.declare_winner(0) and logger:
+            logger.info("Seeker wins: all hidders caught within allotted time")
+        self._finish()
 
-        if session.winner_index is None:
-            session.winner_index = 0
-            if logger:
-                logger.info("Seeker wins: all hidders caught within allotted time")
-    except Exception:
-        if logger:
-            logger.exception('Round manager failed')
+    def _expire(self) -> None:
+        self.timeout = None
+        if self.session.declare_winner(self.current):
+            if self.scheduler.logger:
+                self.scheduler.logger.info("Hidder %s wins: not caught within 45s", self.current)
+            self._finish()
+        else:
+            # caught (or the round decided) right at the deadline
+            self.caught()
+
+    def caught(self) -> None:
+        """A catch happened in this session; re-check the round state now."""
+        if self.done:
+            return
+        s = self.session
+        if s.winner_index is not None:
+            self.scheduler.cancel(self.timeout)
+            self._finish()
+            return
+        if not self.started or self.current is None or not s.is_frozen(self.current):
+            return
+        if self.scheduler.logger:
+            self.scheduler.logger.info("Hidder %s was caught within 45s", self.current)
+        self.scheduler.cancel(self.timeout)
+        self.timeout = None
+        self._next_window()
+
+    def _finish(self) -> None:
+        if self.done:
+            return
+        self.done = True
+        self.scheduler._round_over(self)
+
+
+class RoundScheduler:
+    """One deadline heap driving the round timing of every session.
+
+    start_round() schedules a session's hide phase end and, from there, each
+    hidder's catch window as deadline entries; signal() (Session.catch calls
+    it) wakes the scheduler so a catch ends a window, or the round, without
+    waiting for a deadline. run() serves it from one thread (threaded
+    engine), run_async() as a task on the asyncio engine's loop; either way
+    the round rules only ever run on that one thread.
+
+    on_round_end(session) is called once a round has a winner, e.g. to
+    broadcast the final state straight away.
+    """
+
+    def __init__(self, logger=None, on_round_end: Optional[Callable[[Any], None]] = None) -> None:
+        self.logger = logger
+        self.on_round_end = on_round_end
+        # [deadline (monotonic s), seq, callback]; a cancelled entry has callback None
+        self._heap: List[List[Any]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._rounds: Dict[int, _Round] = {}
+        self._signalled: set = set()
+        self._wake: Optional[Callable[[], None]] = None
+        self._stop = False
+
+    @property
+    def active_rounds(self) -> int:
+        return len(self._rounds)
+
+    def start_round(self, session) -> None:
+        """Run the round rules for session (round_start_ms already set).
+
+        A round still running in that session is abandoned.
+        """
+        if session.round_start_ms is None:
+            return
+        rnd = _Round(self, session)
+        with self._cond:
+            old = self._rounds.get(id(session))
+            if old is not None:
+                old.done = True
+                self.cancel(old.timeout)
+            self._rounds[id(session)] = rnd
+        wait_s = (session.round_start_ms - int(time.time() * 1000)) / 1000.0
+        self.call_later(max(0.0, wait_s), rnd.begin)
+
+    def call_later(self, delay_s: float, callback: Callable[[], None]) -> List[Any]:
+        entry = [time.monotonic() + delay_s, next(self._seq), callback]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry: Optional[List[Any]]) -> None:
+        if entry is not None:
+            entry[2] = None
+
+    def signal(self, session) -> None:
+        """Wake the scheduler: something changed in session's round (a catch)."""
+        with self._cond:
+            if id(session) in self._rounds:
+                self._signalled.add(id(session))
+                self._notify()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._notify()
+
+    def _notify(self) -> None:
+        # caller holds self._cond
+        self._cond.notify()
+        if self._wake is not None:
+            self._wake()
+
+    def _round_over(self, rnd: _Round) -> None:
+        with self._cond:
+            if self._rounds.get(id(rnd.session)) is rnd:
+                del self._rounds[id(rnd.session)]
+        if self.on_round_end is not None:
+            try:
+                self.on_round_end(rnd.session)
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Round end callback failed')
+
+    def _run_due(self) -> None:
+        """Handle signalled sessions, then every entry whose deadline passed."""
+        with self._cond:
+            signalled = [self._rounds[k] for k in self._signalled if k in self._rounds]
+            self._signalled.clear()
+            now = time.monotonic()
+            due = []
+            while self._heap and (self._heap[0][0] <= now or self._heap[0][2] is None):
+                callback = heapq.heappop(self._heap)[2]
+                if callback is not None:
+                    due.append(callback)
+        # callbacks run without the lock; they schedule new entries themselves
+        for callback in [r.caught for r in signalled] + due:
+            try:
+                callback()
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Round manager failed')
+
+    def _next_delay(self) -> Optional[float]:
+        # caller holds self._cond; 0 = work pending, None = nothing scheduled
+        if self._signalled:
+            return 0.0
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def run(self) -> None:
+        while True:
+            self._run_due()
+            with self._cond:
+                if self._stop:
+                    return
+                delay = self._next_delay()
+                if delay is None or delay > 0:
+                    self._cond.wait(delay)
+
+    async def run_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        self._wake = lambda: loop.call_soon_threadsafe(wakeup.set)
+        while True:
+            wakeup.clear()
+            self._run_due()
+            with self._cond:
+                if self._stop:
+                    return
+                delay = self._next_delay()
+            if delay == 0:
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start_thread(self) -> threading.Thread:
+        t = threading.Thread(target=self.run, name='rounds', daemon=True)
+        t.start()
+        return t
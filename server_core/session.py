@@ -1,7 +1,36 @@
 from __future__ import annotations
 
+import threading
 from dataclasses import dataclass, field
-from typing import List, Optional, Any
+from functools import cached_property
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from core.simulation import catch_target, hitbox_of
+
+from .codecs import CSV_CODEC, JSON_CODEC, negotiate
+from .delta import row_dict
+from .players import PlayerTable, bits
+from .protocol import BIN_CODEC, is_event_equip
+
+
+@dataclass(frozen=True)
+class PublishedState:
+    """Read-only view of a session as of one publish (Session.claim_publish).
+
+    rows are the players in server_core.delta.FIELDS order, as tuples;
+    frozen is a bitset of frozen players. positions builds the legacy
+    per-player dicts (JSON keyframes, the join handshake) on first use.
+    """
+
+    version: int
+    rows: Tuple[Tuple[Any, ...], ...]
+    frozen: int
+    round_start_ms: Optional[int]
+    winner_index: Optional[int]
+
+    @cached_property
+    def positions(self) -> List[Dict[str, Any]]:
+        return [row_dict(row) for row in self.rows]
 
 
 @dataclass
@@ -10,18 +39,228 @@ class Session:
 
     This is a light wrapper around existing server globals to improve testability
     and enable cleaner dependency injection across helpers.
+
+    Client updates are staged with stage_update(): only the latest update per
+    player is kept, but a one-shot event (WHISTLE / CAUGHT) survives later
+    updates until a broadcast has published it, so coalescing never loses one.
+
+    players (a PlayerTable) and the round fields are a write buffer guarded
+    by lock. claim_publish() takes the table's rows (cached per player, so
+    idle players cost a pointer copy) and swaps them into published as one
+    immutable PublishedState. Broadcasts read only published; the round
+    scheduler decides winners through catch() / declare_winner(), so a catch
+    racing a window's deadline has exactly one outcome.
     """
 
     num_players: int
-    pos: List[Any]
-    frozen: List[bool]
+    players: PlayerTable
     round_start_ms: Optional[int] = None
     winner_index: Optional[int] = None
     connections: List[Any] = field(default_factory=list)
+    # optional DeltaEncoder; when set broadcasts are delta-compressed per client
+    delta: Optional[Any] = None
+    # optional UdpStateChannel; snapshots go out as datagrams where possible
+    udp: Optional[Any] = None
+    # optional InterestManager; when set each client only receives nearby players
+    interest: Optional[Any] = None
+    # optional ServerMetrics shared by all rooms (traffic counters, fan-out time)
+    metrics: Optional[Any] = None
+    # optional RoundScheduler running this session's round; catch() signals it
+    rounds: Optional[Any] = None
+    # optional core.simulation.CollisionWorld; when set catches are checked
+    # against the players' positions (in_catch_reach)
+    world: Optional[Any] = None
+    # px the catch probe is grown by when checking, for the seeker's latency
+    catch_slack: int = 0
+    lock: Any = field(default_factory=threading.Lock, repr=False, compare=False)
+    # latest PublishedState (replaced as a whole, never modified)
+    published: Optional[PublishedState] = field(default=None, repr=False, compare=False)
+    # True when player/round state changed since the last published broadcast
+    dirty: bool = False
+    # a changed snapshot was published and has not been followed by an
+    # unchanged one yet (see claim_publish)
+    _settle: bool = False
+    _unpublished_events: Set[int] = field(default_factory=set)
+
+    def __post_init__(self) -> None:
+        if self.published is None:
+            self.published = self.snapshot()
+
+    def _state(self, version: int) -> PublishedState:
+        # caller holds self.lock
+        return PublishedState(version, self.players.rows(), self.players.frozen, self.round_start_ms,
+                              self.winner_index)
+
+    def snapshot(self) -> PublishedState:
+        """Consistent copy of the current buffer, without publishing it
+        (e.g. for a joining client's initial state)."""
+        with self.lock:
+            return self._state(self.published.version if self.published is not None else 0)
+
+    def is_frozen(self, player: int) -> bool:
+        return self.players.is_frozen(player)
+
+    def in_catch_reach(self, seeker: int, target: int) -> bool:
+        """Whether target's hitbox touches the seeker's catch probe (grown by
+        catch_slack) at their latest staged positions. Always True without a
+        world."""
+        if self.world is None:
+            return True
+        with self.lock:
+            p = self.players
+            box = hitbox_of(self.world, (p.x[seeker], p.y[seeker]), p.equip_of(seeker))
+            facing = p.states.names[p.state[seeker]]
+            other = hitbox_of(self.world, (p.x[target], p.y[target]), p.equip_of(target))
+        return catch_target(box, facing, {target: other}, self.catch_slack) is not None
 
     def reset_for_new_round(self, start_ms: int):
-        self.round_start_ms = start_ms
-        self.winner_index = None
-        # reset frozen flags in-place
-        for i in range(len(self.frozen)):
-            self.frozen[i] = False
+        with self.lock:
+            self.round_start_ms = start_ms
+            self.winner_index = None
+            self.players.clear_frozen()
+            self.dirty = True
+
+    def catch(self, target: int) -> bool:
+        """Freeze target (a seeker's catch); False if it was already frozen.
+
+        Once every hidder is frozen the seeker (player 0) wins, unless the
+        round was already decided. The round scheduler is signalled so it
+        reacts to the catch immediately.
+        """
+        with self.lock:
+            if self.players.is_frozen(target):
+                return False
+            self.players.set_frozen(target)
+            if self.winner_index is None and self.players.all_frozen():
+                self.winner_index = 0
+            # mark the target's equip field to CAUGHT:<target_idx> so clients will see who was caught
+            self._mark_event(target, f'CAUGHT:{target}')
+        if self.rounds is not None:
+            self.rounds.signal(self)
+        return True
+
+    def declare_winner(self, player: int) -> bool:
+        """Set the winner unless the round is decided or player was caught."""
+        with self.lock:
+            if self.winner_index is not None or (player != 0 and self.players.is_frozen(player)):
+                return False
+            self.winner_index = player
+            self.dirty = True
+        return True
+
+    def stage_update(self, player: int, data: dict) -> None:
+        """Record a player's latest state (marking the slot occupied),
+        keeping any unpublished event. data is copied into the player table."""
+        event = is_event_equip(data.get('equip'))
+        with self.lock:
+            self.players.write(player, data, keep_equip=player in self._unpublished_events and not event)
+            if event:
+                self._unpublished_events.add(player)
+                if self.interest is not None:
+                    self.interest.note_event(player)
+            if self.interest is not None:
+                self.interest.move(player, self.players.x[player], self.players.y[player])
+            self.dirty = True
+
+    def mark_event(self, player: int, equip: str) -> None:
+        """Set a server-originated event (e.g. CAUGHT on the target's slot)."""
+        with self.lock:
+            self._mark_event(player, equip)
+
+    def _mark_event(self, player: int, equip: str) -> None:
+        # caller holds self.lock
+        try:
+            self.players.set_equip(player, equip)
+        except Exception:
+            return
+        self._unpublished_events.add(player)
+        if self.interest is not None:
+            self.interest.note_event(player)
+        self.dirty = True
+
+    def claim_publish(self, force: bool = False) -> Optional[PublishedState]:
+        """Start a broadcast: publishes and returns a new PublishedState when
+        anything changed (or force is set), None otherwise, and clears the
+        change/event markers. An update staged concurrently is kept for the
+        next broadcast instead of lost.
+
+        The first tick after a burst of changes also publishes once, so
+        interpolating clients get a timestamped snapshot showing that
+        players stopped instead of extrapolating their last movement.
+        """
+        with self.lock:
+            dirty = self.dirty
+            settle = self._settle and not dirty
+            self._settle = dirty
+            if not (dirty or settle or force):
+                return None
+            self._unpublished_events.clear()
+            self.dirty = False
+            state = self._state(self.published.version + 1)
+            self.published = state
+        return state
+
+    def remove_connection(self, conn) -> None:
+        """Drop a connection from the broadcast list, the delta encoder, the
+        UDP channel and the area-of-interest grid.
+
+        Safe to call more than once (eviction and reader shutdown both do).
+        """
+        try:
+            self.connections.remove(conn)
+        except ValueError:
+            pass
+        if self.delta is not None:
+            self.delta.forget(conn)
+        if self.udp is not None:
+            self.udp.unregister(getattr(conn, 'udp', None))
+        player = getattr(conn, 'player', None)
+        if self.interest is not None and player is not None:
+            self.interest.remove(player)
+
+    def interest_view(self, state: Optional[PublishedState] = None):
+        """Per-connection interest function for the broadcaster, or None.
+
+        Frozen players (as of state, default the published one) are collected
+        once per broadcast and added to every client's set.
+        """
+        if self.interest is None:
+            return None
+        frozen = list(bits((state or self.published).frozen))
+
+        def view(conn):
+            player = getattr(conn, 'player', None)
+            if player is None:
+                return None
+            return self.interest.interest(player, frozen)
+        return view
+
+    def outbound_stats(self) -> List[dict]:
+        """Per-connection outbound queue counters (depth, sent, dropped)."""
+        out = []
+        for c in list(self.connections):
+            stats = getattr(c, 'stats', None)
+            if stats is not None:
+                out.append(stats.as_dict())
+        return out
+
+    @property
+    def codecs(self) -> List[str]:
+        """Optional wire formats advertised in the handshake."""
+        # bin1 snapshots are produced by the delta encoder
+        return [BIN_CODEC] if self.delta is not None else []
+
+    def negotiate_codec(self, conn, request: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Pick conn's wire codec from the hello in its join request.
+
+        Sets conn.codec (and marks bin1 connections for binary snapshots) and
+        returns the codec's name for the handshake; None when the client sent
+        no hello, which leaves conn on the legacy per-frame detection.
+        """
+        if not request or request.get('hello') is None:
+            return None
+        codec = negotiate(request.get('codecs'), self.codecs + [JSON_CODEC, CSV_CODEC])
+        conn.codec = codec
+        if codec.binary and self.delta is not None:
+            self.delta.binary_peers.add(conn)
+        return codec.name
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class TickStats:
+    """Timing counters for the server tick loop.
+
+    An overrun is a tick whose work took longer than the tick interval; the
+    scheduler then skips the deadlines it missed instead of bursting to catch
+    up. A rising overrun count means the configured rate is too high.
+    """
+
+    rate_hz: float
+    ticks: int = 0
+    overruns: int = 0
+    skipped: int = 0
+    last_ms: float = 0.0
+    max_ms: float = 0.0
+    total_ms: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.ticks if self.ticks else 0.0
+
+    def record(self, elapsed_ms: float, budget_ms: float) -> None:
+        self.ticks += 1
+        self.last_ms = elapsed_ms
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        if elapsed_ms > budget_ms:
+            self.overruns += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'rate_hz': self.rate_hz,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'last_ms': round(self.last_ms, 3),
+            'avg_ms': round(self.avg_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+        }
+
+
+class TickScheduler:
+    """Calls on_tick at a fixed rate against absolute deadlines.
+
+    Deadlines advance by a fixed interval from the start time, so the rate does
+    not drift with the cost of each tick. run() drives it from a thread (the
+    threaded engine); run_async() from the asyncio engine's loop.
+
+    extra_stats, when given, is called at each periodic report and its result
+    is logged alongside the tick counters (e.g. per-connection queue depths).
+    """
+
+    def __init__(self, rate_hz: float, on_tick: Callable[[], None], logger=None, report_every_s: float = 10.0,
+                 extra_stats: Optional[Callable[[], Any]] = None) -> None:
+        if rate_hz <= 0:
+            raise ValueError('tick rate must be positive')
+        self.interval = 1.0 / float(rate_hz)
+        self.on_tick = on_tick
+        self.logger = logger
+        self.report_every_s = report_every_s
+        self.stats = TickStats(rate_hz=float(rate_hz))
+        self.extra_stats = extra_stats
+        self._stop = threading.Event()
+        self._next_report = 0.0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _tick(self) -> None:
+        start = time.perf_counter()
+        try:
+            self.on_tick()
+        except Exception:
+            if self.logger:
+                self.logger.exception('Tick failed')
+        end = time.perf_counter()
+        self.stats.record((end - start) * 1000.0, self.interval * 1000.0)
+        if self.logger and self.report_every_s and end >= self._next_report:
+            if self._next_report:
+                self.logger.info("Tick stats: %s", self.stats.as_dict())
+                if self.extra_stats is not None:
+                    try:
+                        self.logger.info("Connection stats: %s", self.extra_stats())
+                    except Exception:
+                        pass
+            self._next_report = end + self.report_every_s
+
+    def _advance(self, deadline: float, now: float) -> float:
+        deadline += self.interval
+        if now > deadline:
+            # we fell behind by at least one full tick: drop the missed ones
+            missed = int((now - deadline) / self.interval) + 1
+            self.stats.skipped += missed
+            deadline += missed * self.interval
+        return deadline
+
+    def run(self) -> None:
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            self._tick()
+            deadline = self._advance(deadline, time.perf_counter())
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+
+    async def run_async(self) -> None:
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            self._tick()
+            deadline = self._advance(deadline, time.perf_counter())
+            await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+
+    def start_thread(self) -> threading.Thread:
+        t = threading.Thread(target=self.run, name='server-tick', daemon=True)
+        t.start()
+        return t
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import secrets
+import socket
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from net.framing import MAX_DATAGRAM_PAYLOAD, decode_datagram, encode_datagram
+
+
+class UdpEndpoint:
+    """One client's registration on the UDP state channel.
+
+    conn is the client's TCP connection (writer); it stays the identity used
+    for acks and events. session is the Session (room) the client plays in.
+    addr is learned from the first datagram carrying token, so clients behind
+    a blocked UDP path simply stay on TCP.
+    """
+
+    __slots__ = ('token', 'conn', 'player', 'role', 'session', 'addr', 'send_seq', 'recv_seq')
+
+    def __init__(self, token: int, conn, player: int, role: str, session=None) -> None:
+        self.token = token
+        self.conn = conn
+        self.player = player
+        self.role = role
+        self.session = session
+        self.addr = None
+        self.send_seq = 0
+        self.recv_seq = 0
+
+
+class _ChannelProtocol(asyncio.DatagramProtocol):
+    def __init__(self, channel: 'UdpStateChannel') -> None:
+        self.channel = channel
+
+    def connection_made(self, transport) -> None:
+        self.channel._sendto = transport.sendto
+
+    def datagram_received(self, data, addr) -> None:
+        self.channel.datagram_received(data, addr)
+
+
+class UdpStateChannel:
+    """Unreliable, sequence-numbered channel for player updates and snapshots.
+
+    Runs next to the TCP connections. Clients learn their token and the
+    channel port from the handshake and send state updates as datagrams;
+    handler(endpoint, payload) applies them exactly like a TCP frame. A
+    datagram older than the newest one seen from that client is dropped. The
+    broadcaster sends snapshots through send() when the client's address is
+    known; anything carrying a one-shot event still goes over TCP.
+    """
+
+    def __init__(self, handler: Optional[Callable[[UdpEndpoint, bytes], Any]] = None, logger=None) -> None:
+        self.handler = handler
+        self.logger = logger
+        self.port: Optional[int] = None
+        self._endpoints: Dict[int, UdpEndpoint] = {}
+        self._sendto = None
+        self._lock = threading.Lock()
+        self.received = 0
+        self.stale = 0
+        self.unknown = 0
+        self.sent = 0
+
+    def register(self, conn, player: int, role: str, session=None) -> UdpEndpoint:
+        with self._lock:
+            token = 0
+            while token == 0 or token in self._endpoints:
+                token = secrets.randbits(32)
+            ep = UdpEndpoint(token, conn, player, role, session)
+            self._endpoints[token] = ep
+        return ep
+
+    def unregister(self, ep: Optional[UdpEndpoint]) -> None:
+        if ep is None:
+            return
+        with self._lock:
+            self._endpoints.pop(ep.token, None)
+
+    def handshake_info(self, ep: UdpEndpoint) -> Dict[str, int]:
+        """The 'udp' entry of the initial payload for this client."""
+        return {'port': self.port, 'token': ep.token}
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        decoded = decode_datagram(data)
+        if decoded is None:
+            return
+        token, seq, payload = decoded
+        ep = self._endpoints.get(token)
+        if ep is None:
+            self.unknown += 1
+            return
+        ep.addr = addr
+        if seq <= ep.recv_seq:
+            # duplicate or reordered: a newer state was already applied
+            # (seq 0 is the hello that only registers the address)
+            if seq:
+                self.stale += 1
+            return
+        ep.recv_seq = seq
+        self.received += 1
+        if payload and self.handler is not None:
+            try:
+                self.handler(ep, payload)
+            except Exception:
+                if self.logger:
+                    self.logger.exception('UDP update failed')
+
+    def send(self, ep: Optional[UdpEndpoint], payload: bytes) -> bool:
+        """Send payload to ep as one datagram; False if it must go over TCP."""
+        sendto = self._sendto
+        if ep is None or ep.addr is None or sendto is None or len(payload) > MAX_DATAGRAM_PAYLOAD:
+            return False
+        ep.send_seq += 1
+        try:
+            sendto(encode_datagram(ep.token, ep.send_seq, payload), ep.addr)
+        except Exception:
+            return False
+        self.sent += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {'clients': len(self._endpoints), 'received': self.received, 'stale': self.stale,
+                'unknown': self.unknown, 'sent': self.sent}
+
+    def start_thread(self, host: str, port: int) -> threading.Thread:
+        """Bind the channel and serve it from a daemon thread (threaded engine)."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((host, port))
+        self.port = sock.getsockname()[1]
+        self._sendto = sock.sendto
+
+        def _serve():
+            while True:
+                try:
+                    data, addr = sock.recvfrom(65536)
+                except OSError:
+                    continue
+                self.datagram_received(data, addr)
+
+        t = threading.Thread(target=_serve, name='udp-state', daemon=True)
+        t.start()
+        return t
+
+    async def start_async(self, host: str, port: int) -> None:
+        """Bind the channel on the running event loop (asyncio engine)."""
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _ChannelProtocol(self),
+                                                           local_addr=(host or '0.0.0.0', port))
+        self.port = transport.get_extra_info('sockname')[1]
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from core.contracts import INetworkClient
 from network import Network as _LegacyNetwork
@@ -9,8 +10,8 @@ from network import Network as _LegacyNetwork
 class TcpNetworkClient(INetworkClient):
     """Adapter that wraps the existing Network class to satisfy INetworkClient."""
 
-    def __init__(self, host: str, port: int) -> None:
-        self._impl = _LegacyNetwork(host, port)
+    def __init__(self, host: str, port: int, room: Optional[str] = None) -> None:
+        self._impl = _LegacyNetwork(host, port, room=room)
 
     def get_initial(self) -> Optional[str]:
         try:
@@ -18,18 +19,49 @@ class TcpNetworkClient(INetworkClient):
         except Exception:
             return None
 
-    def send(self, data: str, wait_for_reply: bool = False) -> Optional[str]:
+    def send(self, data: Union[str, bytes], wait_for_reply: bool = False) -> Optional[str]:
         try:
             return self._impl.send(data, wait_for_reply=wait_for_reply)
         except Exception:
             return None
 
-    def get_latest(self) -> Optional[str]:
+    def send_update(self, data: Union[str, bytes], reliable: bool = False) -> None:
+        try:
+            self._impl.send_update(data, reliable=reliable)
+        except Exception:
+            pass
+
+    def get_latest(self) -> Optional[Any]:
         try:
             return self._impl.get_latest()
         except Exception:
             return None
 
+    def get_events(self) -> List[Tuple[int, str, int, int]]:
+        try:
+            return self._impl.get_events()
+        except Exception:
+            return []
+
+    def server_now_ms(self) -> int:
+        try:
+            return self._impl.server_now_ms()
+        except Exception:
+            return int(time.time() * 1000)
+
+    def send_stats(self) -> Dict[str, Any]:
+        try:
+            return self._impl.send_stats()
+        except Exception:
+            return {}
+
+    @property
+    def closed(self) -> bool:
+        try:
+            return bool(self._impl.closed)
+        except Exception:
+            return True
+
     def close(self) -> None:
         try:
             self._impl.close()
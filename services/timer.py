@@ -1,14 +1,20 @@
 from __future__ import annotations
 
-from typing import Optional
+import time
+from typing import Callable, Optional
 
 from core.contracts import ITimerService
 
 
 class RoundTimer(ITimerService):
-    """Round timer that tracks a server-provided epoch ms base and optional stop time."""
+    """Round timer that tracks a server-provided epoch ms base and optional stop time.
 
-    def __init__(self) -> None:
+    clock returns the current time in epoch ms on the server's clock (e.g.
+    INetworkClient.server_now_ms); it defaults to the local clock.
+    """
+
+    def __init__(self, clock: Optional[Callable[[], int]] = None) -> None:
+        self.clock = clock or (lambda: int(time.time() * 1000))
         self._round_base: Optional[int] = None
         self._stopped: bool = False
         self._stop_ms: Optional[int] = None
@@ -19,9 +25,8 @@ class RoundTimer(ITimerService):
         self._stop_ms = None
 
     def stop(self) -> None:
-        import time
         self._stopped = True
-        self._stop_ms = int(time.time() * 1000)
+        self._stop_ms = int(self.clock())
 
     def elapsed_seconds(self, now_epoch_ms: int) -> Optional[float]:
         if self._round_base is None or not isinstance(now_epoch_ms, (int, float)):
@@ -31,6 +36,9 @@ class RoundTimer(ITimerService):
             return (float(self._stop_ms) - base) / 1000.0
         return (float(now_epoch_ms) - base) / 1000.0
 
+    def now_ms(self) -> int:
+        return int(self.clock())
+
     # helpers to expose state if needed
     @property
     def is_running(self) -> bool:
@@ -15,5 +15,57 @@ NUM_PLAYERS = 2
 # server will respond with its reachable IP/port). Default is port+1.
 DISCOVERY_PORT = 5556
 
-# Local TCP control port for administrative commands (shutdown). Default is port+2.
-CONTROL_PORT = 5557
\ No newline at end of file
+# Local TCP control port (127.0.0.1 only) serving live server metrics and
+# profiler commands, see server_core/control.py. Default is port+2; 0 = off.
+CONTROL_PORT = 5557
+
+# Server snapshot rate (broadcasts per second). Client updates received between
+# ticks are coalesced to the latest per player. 0 = broadcast on every message.
+# Snapshots are timestamped and clients interpolate remote players between
+# them, so 10-20 Hz looks smooth.
+SERVER_TICK_HZ = 20
+
+# Remote players are drawn INTERP_DELAY_MS behind the newest snapshot,
+# interpolated between snapshots; when snapshots are late they keep moving for
+# at most INTERP_MAX_EXTRAPOLATE_MS before holding still. Keep the delay above
+# one tick interval (1000 / SERVER_TICK_HZ).
+INTERP_DELAY_MS = 100
+INTERP_MAX_EXTRAPOLATE_MS = 100
+
+# Clients send their state only when it changed, or after this many seconds
+# without a send (heartbeat). Whistles and catches always go out at once.
+# 0 = send every frame.
+SEND_HEARTBEAT_S = 0.5
+
+# Wire formats the client offers in its hello, preferred first; the server
+# picks one for the whole connection (see server_core/codecs.py).
+WIRE_CODECS = ['bin1', 'json']
+
+# Optional UDP channel for position snapshots and player updates (events stay
+# on TCP). Clients opt in from the handshake; disable with --no-udp.
+UDP_STATE_CHANNEL = True
+
+# Area-of-interest radius in pixels: when > 0 each client only receives the
+# players within this distance (plus frozen players and anyone involved in a
+# recent whistle/catch). Useful for large lobbies; the HUD roster then lists
+# nearby players only. 0 = send everyone. Override with --aoi-radius.
+AOI_RADIUS = 0
+
+# Server-side catch check: a seeker's CAUGHT event only freezes the target
+# when the target's hitbox touches the seeker's catch probe at their latest
+# reported positions (see core/simulation.py). The probe is grown by
+# CATCH_SLACK_PX on every side to absorb latency between the two players'
+# updates. Off by default: the seeker's client freezes its target and may
+# declare the round won before the server answers, and it has no way yet to
+# undo that when the server rejects the catch. Enable with --catch-check.
+SERVER_CATCH_CHECK = False
+CATCH_SLACK_PX = 96
+
+# Upper bound on concurrent rooms (matches) one server process hosts. Rooms
+# beyond the default one are opened with --rooms N or by a client's join
+# request.
+MAX_ROOMS = 64
+
+# Room to join on the selected server (None = any open room). Set by the join
+# screen from LAN discovery.
+ROOM = None